@@ -328,6 +328,11 @@ def get_profile_by_name(profile_name: str) -> Dict[str, Any]:
     return BROKER_PROFILES[profile_name]
 
 
+def get_profile_priority(profile_name: str) -> int:
+    """Scheduling priority of a profile; full sweeps (all_brokers) run at the lowest."""
+    return BROKER_PROFILES.get(profile_name, {}).get("priority", 1)
+
+
 def filter_brokers_by_profile(all_brokers: List[Dict], profile_name: str) -> List[Dict]:
     """Filter broker list by profile name, maintaining the order specified in the profile."""
     if profile_name == "all_brokers" or profile_name not in BROKER_PROFILES:
@@ -0,0 +1,102 @@
+"""
+Per-domain browser storage state (cookies and localStorage).
+
+Broker visits used to start from an empty profile, so cookie-consent banners
+came back on every query. After a clean visit the context's storage state is
+saved to `storage/browser_state/<domain>.json`. The next context opened for
+that domain starts from it, whether it belongs to a later query, another
+discovery job or a removal submission. Only state belonging to the broker's
+own domain is kept. Entries expire after BROWSER_STATE_TTL seconds and can be
+dropped with DELETE /browser-state.
+"""
+
+import json, os, time
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from .politeness import normalize_domain
+from .session_archive import SESSION_ARCHIVE
+from .store import STORE_DIR, load_json, save_json
+
+BROWSER_STATE_DIR = STORE_DIR / "browser_state"
+BROWSER_STATE_TTL = float(os.getenv("BROWSER_STATE_TTL", str(7 * 24 * 3600)))
+
+
+def _path(domain: str):
+    return BROWSER_STATE_DIR / f"{normalize_domain(domain)}.json"
+
+
+def _belongs(host: str, domain: str) -> bool:
+    host = (host or "").lstrip(".").lower()
+    return host == domain or host.endswith("." + domain) or domain.endswith("." + host)
+
+
+def load_state(domain: str) -> Optional[dict]:
+    """Playwright storage_state for the domain, or None if missing or expired"""
+    domain = normalize_domain(domain)
+    if not domain:
+        return None
+    entry = load_json(_path(domain), None)
+    if not entry or time.time() - entry.get("saved_at", 0) >= BROWSER_STATE_TTL:
+        return None
+    now = time.time()
+    cookies = [c for c in entry["state"].get("cookies", []) if c.get("expires", -1) < 0 or c["expires"] > now]
+    return {"cookies": cookies, "origins": entry["state"].get("origins", [])}
+
+
+def save_state(domain: str, state: dict):
+    """Keep the domain's own cookies and localStorage out of a context's storage_state()"""
+    domain = normalize_domain(domain)
+    if not domain or not state or SESSION_ARCHIVE.replaying:
+        return
+    kept = {
+        "cookies": [c for c in state.get("cookies", []) if _belongs(c.get("domain"), domain)],
+        "origins": [o for o in state.get("origins", [])
+                    if _belongs(urlparse(o.get("origin", "")).hostname, domain) and o.get("localStorage")],
+    }
+    if not kept["cookies"] and not kept["origins"]:
+        return
+    BROWSER_STATE_DIR.mkdir(parents=True, exist_ok=True)
+    save_json(_path(domain), {"domain": domain, "saved_at": time.time(), "state": kept})
+
+
+def reset_state(domain: Optional[str] = None) -> int:
+    """Forget one domain's state, or every domain's; returns how many were removed"""
+    paths = [_path(domain)] if domain else list(BROWSER_STATE_DIR.glob("*.json"))
+    removed = 0
+    for path in paths:
+        try:
+            path.unlink()
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def list_states() -> Dict[str, dict]:
+    summary = {}
+    for path in sorted(BROWSER_STATE_DIR.glob("*.json")):
+        entry = load_json(path, None)
+        if not entry:
+            continue
+        age = time.time() - entry.get("saved_at", 0)
+        summary[entry.get("domain", path.stem)] = {
+            "saved_at": entry.get("saved_at"),
+            "expired": age >= BROWSER_STATE_TTL,
+            "cookies": len(entry["state"].get("cookies", [])),
+            "origins": len(entry["state"].get("origins", [])),
+        }
+    return summary
+
+
+def local_storage_script(state: Optional[dict]) -> Optional[str]:
+    """
+    Init script that restores saved localStorage, for pooled contexts that
+    cannot be created with storage_state (cookies go through add_cookies).
+    """
+    origins = {o["origin"]: o["localStorage"] for o in (state or {}).get("origins", [])}
+    if not origins:
+        return None
+    return ("(() => { const saved = %s[location.origin]; if (!saved) return;"
+            " for (const {name, value} of saved) if (localStorage.getItem(name) === null) localStorage.setItem(name, value); })()"
+            % json.dumps(origins))
@@ -0,0 +1,105 @@
+"""
+Cooperative cancellation for discovery and removal jobs.
+
+Each running job has a CancelToken. Runners check it between brokers and
+queries; resources that can block for a long time (browsers, LLM
+subprocesses) register an abort callback with `on_cancel`, so cancelling a
+job tears them down immediately instead of waiting for the next check.
+"""
+
+import asyncio, threading, time
+from typing import Callable, Dict, Optional
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class CancelToken:
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = {}
+        self._next_id = 0
+        self.requested_at: Optional[float] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.requested_at = time.time()
+            self._event.set()
+            callbacks = list(self._callbacks.values())
+            self._callbacks.clear()
+        for cb in callbacks:
+            try:
+                cb()
+            except Exception as e:
+                print(f"⚠️ Cancel callback failed: {e}")
+
+    def on_cancel(self, cb: Callable[[], None]) -> Callable[[], None]:
+        """Run `cb` when cancelled (now, if already cancelled). Returns an unregister function."""
+        with self._lock:
+            if not self._event.is_set():
+                key = self._next_id
+                self._next_id += 1
+                self._callbacks[key] = cb
+                return lambda: self._callbacks.pop(key, None)
+        cb()
+        return lambda: None
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise JobCancelled()
+
+    def wait(self, timeout: float) -> bool:
+        """Sleep up to `timeout` seconds; True if cancelled meanwhile"""
+        return self._event.wait(timeout)
+
+
+_tokens: Dict[str, CancelToken] = {}
+_tokens_lock = threading.Lock()
+
+
+def token_for(job_id: str) -> CancelToken:
+    """The job's token, created on first use"""
+    with _tokens_lock:
+        token = _tokens.get(job_id)
+        if token is None:
+            token = _tokens[job_id] = CancelToken()
+        return token
+
+
+def cancel_job(job_id: str) -> bool:
+    """Cancel a job running in this process. False if it has no live token."""
+    with _tokens_lock:
+        token = _tokens.get(job_id)
+    if token is None:
+        return False
+    token.cancel()
+    return True
+
+
+def release(job_id: str):
+    with _tokens_lock:
+        _tokens.pop(job_id, None)
+
+
+def close_playwright_threadsafe(obj):
+    """
+    Close a sync-API Playwright browser or context from another thread.
+
+    Sync Playwright objects belong to the thread that created them, so the
+    close is scheduled on that thread's event loop instead of called directly;
+    whatever the owning thread is blocked on (goto, wait_for_load_state)
+    then fails fast with a "Target closed" error.
+    """
+    impl = getattr(obj, "_impl_obj", None)
+    loop = getattr(obj, "_loop", None)
+    if impl is None or loop is None or loop.is_closed():
+        return
+    asyncio.run_coroutine_threadsafe(impl.close(), loop)
@@ -0,0 +1,323 @@
+"""
+Headless batch runner for cron jobs and shell scripts.
+
+    python -m backend.app.cli discover --profile pii.json [--catalog brokers.json|.csv]
+        [--broker-profile quick_scan] [--scope 0 5 9] [--concurrency 3]
+        [--order yield] [--skip-barren] [--no-triage] [--fail-on-found]
+    python -m backend.app.cli remove --profile pii.json (--brokers 3 17 | --found-from results.jsonl)
+        [--catalog ...] [--no-batch-forms]
+    python -m backend.app.cli rescore (--jobs <job_id> ... | --all) [--profile pii.json]
+        [--reextract] [--apply] [--workers 8]
+    python -m backend.app.cli gc [--dry-run] [--max-age-days 90] [--keep-per-broker 3]
+        [--quota-mb 2000] [--compact-after-days 14] [--usage]
+
+Runs the same engine steps as the API's local jobs without starting the web
+app or writing job records. Each broker result is written to stdout as one
+JSON line as soon as it completes; progress logging goes to stderr. The PII
+profile file holds one profile object (names, emails, phones, addresses), or
+a list of them picked with --profile-id. `--found-from -` reads a discover
+run's output from stdin, so the two commands chain with a pipe. `rescore`
+re-scores stored discovery jobs from their page snapshots (see rescore.py)
+and writes one line per broker with its verdict before and after. `gc`
+applies the evidence retention policy (see retention.py) and writes its
+report as one line, or with --usage the storage usage report.
+
+Exit status: 0 all brokers processed, 2 bad arguments or input files,
+3 some brokers ended in an error, 4 something was found (--fail-on-found),
+130 interrupted.
+"""
+
+import argparse, csv, json, signal, sys, threading, time, uuid
+from pathlib import Path
+from typing import List, Optional
+
+from . import yield_index
+from .broker_profiles import filter_brokers_by_profile, get_broker_profiles, get_profile_priority
+from .cancellation import CancelToken
+from .engine import (
+    RATE_LIMIT_RETRIES, EMPTY_PROFILE, evidence_dir_for, discover_broker, remove_broker,
+    is_rate_limited, plan_discovery, is_form_broker, remove_form_brokers,
+)
+from .rescore import RESCORE_WORKERS, rescore_jobs
+from . import retention
+from .scheduler import FairScheduler
+from .store import BROKERS_JSON, FINDINGS_JSON, load_json
+
+EXIT_OK = 0
+EXIT_USAGE = 2
+EXIT_BROKER_ERRORS = 3
+EXIT_FOUND = 4
+EXIT_INTERRUPTED = 130
+
+CATALOG_COLUMNS = ['name', 'domain', 'search_url', 'optout_url', 'country', 'method', 'requirements', 'notes',
+                   'search_pattern', 'result_selector', 'detail_selector']
+
+
+class InputError(Exception):
+    pass
+
+
+def load_catalog(path: Path) -> List[dict]:
+    """Brokers from a JSON list (as in storage/brokers.json) or a normalized CSV"""
+    try:
+        if path.suffix.lower() == ".csv":
+            with open(path, newline="", encoding="utf-8") as fh:
+                return [{c: (row.get(c) or "") for c in CATALOG_COLUMNS} for row in csv.DictReader(fh)]
+        brokers = json.loads(path.read_text())
+    except (OSError, ValueError) as e:
+        raise InputError(f"cannot read catalog {path}: {e}")
+    if not isinstance(brokers, list):
+        raise InputError(f"catalog {path} is not a list of brokers")
+    return brokers
+
+
+def load_pii(path: Path, profile_id: Optional[str] = None) -> dict:
+    try:
+        data = json.loads(path.read_text())
+    except (OSError, ValueError) as e:
+        raise InputError(f"cannot read profile {path}: {e}")
+    if isinstance(data, list):
+        matches = [p for p in data if profile_id is None or p.get("id") == profile_id]
+        if len(matches) != 1:
+            raise InputError(f"{path} holds {len(data)} profiles; pick one with --profile-id")
+        data = matches[0]
+    if not isinstance(data, dict):
+        raise InputError(f"profile {path} is not a JSON object")
+    return {**EMPTY_PROFILE, **data}
+
+
+def found_broker_ids(source: str) -> List[int]:
+    """broker_ids of found results in a discover run's JSONL output ("-" for stdin)"""
+    fh = sys.stdin if source == "-" else open(source, encoding="utf-8")
+    try:
+        ids = []
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                raise InputError(f"bad JSON line in {source}: {e}")
+            if item.get("found") and not item.get("marked_false_positive"):
+                ids.append(item["broker_id"])
+        return ids
+    finally:
+        if fh is not sys.stdin:
+            fh.close()
+
+
+class ResultWriter:
+    """One JSON line per result on the real stdout, whole lines even from many threads"""
+
+    def __init__(self, out):
+        self.out = out
+        self._lock = threading.Lock()
+        self.counts = {"results": 0, "found": 0, "errors": 0}
+
+    def write(self, item: dict, error: bool):
+        with self._lock:
+            self.out.write(json.dumps(item, default=str) + "\n")
+            self.out.flush()
+            self.counts["results"] += 1
+            self.counts["found"] += 1 if item.get("found") else 0
+            self.counts["errors"] += 1 if error else 0
+
+
+def _discovery_error(item: dict) -> bool:
+    return bool(item.get("error")) and not item.get("skipped")
+
+
+def run_discover(args, writer: ResultWriter, token: CancelToken):
+    brokers = load_catalog(Path(args.catalog))
+    pii = load_pii(Path(args.profile), args.profile_id)
+    if args.broker_profile not in get_broker_profiles():
+        raise InputError(f"unknown broker profile {args.broker_profile!r}")
+    brokers = filter_brokers_by_profile(brokers, args.broker_profile)
+    if args.scope:
+        scope = set(args.scope)
+        brokers = [b for idx, b in enumerate(brokers) if idx in scope]
+    reachability = None
+    if args.triage:
+        from .triage import triage_brokers
+        try:
+            reachability = triage_brokers(brokers)
+        except Exception as e:
+            print(f"⚠️ Reachability triage failed, scanning every broker: {e}")
+    to_scan, skipped = plan_discovery(brokers, args.order, args.skip_barren, reachability)
+    print(f"🔍 Scanning {len(to_scan)} of {len(brokers)} brokers with {args.concurrency} workers "
+          f"({len(skipped)} skipped)")
+    for item in skipped:
+        writer.write(item, _discovery_error(item))
+        yield_index.record_scan(item)
+
+    run_id = f"cli-{uuid.uuid4()}"
+    evidence_dir = str(args.evidence_dir or evidence_dir_for(run_id))
+
+    def _scan(task):
+        i, b, retries = task
+        if token.cancelled:
+            return None
+        item = discover_broker(i, b, pii, evidence_dir, cancel=token)
+        if item.get("cancelled"):
+            return None
+        if is_rate_limited(item) and retries < RATE_LIMIT_RETRIES:
+            return (i, b, retries + 1)
+        writer.write(item, _discovery_error(item))
+        if not item.get("coalesced"):
+            yield_index.record_scan(item)
+        return None
+
+    scheduler = FairScheduler(args.concurrency)
+    job = scheduler.submit(run_id, [(i, b, 0) for i, b in to_scan], _scan,
+                           get_profile_priority(args.broker_profile), cancel=token)
+    while not job.done.wait(0.5):
+        pass
+
+
+def run_remove(args, writer: ResultWriter, token: CancelToken):
+    catalog = load_catalog(Path(args.catalog))
+    pii = load_pii(Path(args.profile), args.profile_id)
+    broker_ids = list(args.brokers or []) + (found_broker_ids(args.found_from) if args.found_from else [])
+    selected = [(bid, catalog[bid]) for bid in dict.fromkeys(broker_ids) if 0 <= bid < len(catalog)]
+    print(f"📨 Sending removals to {len(selected)} brokers")
+    is_error = lambda item: item.get("status") == "error"
+
+    done = set()
+    if args.batch_forms:
+        def _record(item):
+            done.add(item["broker_id"])
+            writer.write(item, is_error(item))
+        try:
+            remove_form_brokers([(bid, b) for bid, b in selected if is_form_broker(b)], pii, _record, cancel=token)
+        except Exception as e:
+            print(f"⚠️ Form batch failed, falling back to one browser per broker: {e}")
+
+    for broker_id, broker in selected:
+        if token.cancelled:
+            break
+        if broker_id in done:
+            continue
+        item = remove_broker(broker_id, broker, pii, cancel=token)
+        if token.cancelled:
+            break
+        writer.write(item, is_error(item))
+
+
+def run_rescore(args, writer: ResultWriter, token: CancelToken):
+    job_ids = args.jobs or list(load_json(FINDINGS_JSON, {}))
+    profile = load_pii(Path(args.profile), args.profile_id) if args.profile else None
+    print(f"🧮 Re-scoring {len(job_ids)} jobs from their snapshots")
+    for row in rescore_jobs(job_ids, profile, args.reextract, args.apply, args.workers):
+        if token.cancelled:
+            break
+        writer.write(row, bool(row.get("error")))
+
+
+def run_gc(args, writer: ResultWriter, token: CancelToken):
+    if args.usage:
+        writer.write(retention.usage(limit=0), False)
+        return
+    try:
+        report = retention.collect(args.dry_run, max_age_days=args.max_age_days,
+                                   keep_per_broker=args.keep_per_broker, keep_verified=args.keep_verified,
+                                   quota_mb=args.quota_mb, compact_after_days=args.compact_after_days)
+    except RuntimeError as e:
+        raise InputError(str(e))
+    print(f"🧹 {'Would free' if args.dry_run else 'Freed'} {report['freed_bytes'] / 1e6:.1f} MB, "
+          f"{report['compacted']['files']} screenshots in {report['compacted']['jobs']} jobs to compact")
+    writer.write(report, False)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m backend.app.cli", description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    base = argparse.ArgumentParser(add_help=False)
+    base.add_argument("--quiet", action="store_true", help="no progress logging on stderr")
+    base.add_argument("--profile-id", help="profile to use when the file holds a list")
+    common = argparse.ArgumentParser(add_help=False, parents=[base])
+    common.add_argument("--profile", required=True, help="PII profile JSON file")
+    common.add_argument("--catalog", default=str(BROKERS_JSON), help="broker catalog (.json or .csv)")
+
+    discover = sub.add_parser("discover", parents=[common], help="search brokers for the profile")
+    discover.add_argument("--broker-profile", default="all_brokers")
+    discover.add_argument("--scope", type=int, nargs="+", help="catalog indexes (after profile filtering)")
+    discover.add_argument("--concurrency", type=int, default=3)
+    discover.add_argument("--order", choices=["catalog", "yield"], default="catalog")
+    discover.add_argument("--skip-barren", action="store_true")
+    discover.add_argument("--no-triage", dest="triage", action="store_false")
+    discover.add_argument("--evidence-dir", help="where screenshots go (default storage/evidence/cli-<id>)")
+    discover.add_argument("--fail-on-found", action="store_true", help=f"exit {EXIT_FOUND} if anything was found")
+
+    remove = sub.add_parser("remove", parents=[common], help="send opt-out requests")
+    remove.add_argument("--brokers", type=int, nargs="+", help="catalog indexes")
+    remove.add_argument("--found-from", help="discover output (JSONL) whose found brokers to target; - for stdin")
+    remove.add_argument("--no-batch-forms", dest="batch_forms", action="store_false")
+
+    rescore = sub.add_parser("rescore", parents=[base], help="re-score past discovery jobs from page snapshots")
+    rescore.add_argument("--jobs", nargs="+", help="discovery job ids")
+    rescore.add_argument("--all", action="store_true", help="every discovery job")
+    rescore.add_argument("--profile", help="PII profile JSON file to score with instead of each job's")
+    rescore.add_argument("--reextract", action="store_true", help="rebuild page text from the stored HTML")
+    rescore.add_argument("--apply", action="store_true", help="write changed verdicts to the jobs' items")
+    rescore.add_argument("--workers", type=int, default=RESCORE_WORKERS, help="processes (0 = one per core)")
+
+    gc = sub.add_parser("gc", parents=[base], help="delete or compact old evidence per the retention policy")
+    gc.add_argument("--dry-run", action="store_true", help="report what would go without deleting anything")
+    gc.add_argument("--max-age-days", type=float)
+    gc.add_argument("--keep-per-broker", type=int)
+    gc.add_argument("--quota-mb", type=float)
+    gc.add_argument("--compact-after-days", type=float)
+    gc.add_argument("--no-keep-verified", dest="keep_verified", action="store_false", default=None,
+                    help="let policies delete evidence of verified results too")
+    gc.add_argument("--usage", action="store_true", help="only report storage usage per area, job and broker")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.command == "remove" and not (args.brokers or args.found_from):
+        print("remove needs --brokers or --found-from", file=sys.stderr)
+        return EXIT_USAGE
+    if args.command == "rescore" and not (args.jobs or args.all):
+        print("rescore needs --jobs or --all", file=sys.stderr)
+        return EXIT_USAGE
+    if getattr(args, "concurrency", 1) < 1:
+        print("--concurrency must be at least 1", file=sys.stderr)
+        return EXIT_USAGE
+
+    # Results own stdout; the engine's print() logging goes to stderr (or nowhere)
+    writer = ResultWriter(sys.stdout)
+    sys.stdout = open("/dev/null", "w") if args.quiet else sys.stderr
+
+    token = CancelToken()
+    def _interrupt(signum, frame):
+        print(f"🛑 Signal {signum}, cancelling")
+        token.cancel()
+    signal.signal(signal.SIGINT, _interrupt)
+    signal.signal(signal.SIGTERM, _interrupt)
+
+    started = time.monotonic()
+    try:
+        {"discover": run_discover, "remove": run_remove, "rescore": run_rescore,
+         "gc": run_gc}[args.command](args, writer, token)
+    except InputError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return EXIT_USAGE
+    finally:
+        yield_index.flush()
+
+    counts = writer.counts
+    print(f"🏁 {counts['results']} results, {counts['found']} found, {counts['errors']} errors "
+          f"in {time.monotonic() - started:.1f}s", file=sys.stderr)
+    if token.cancelled:
+        return EXIT_INTERRUPTED
+    if counts["errors"]:
+        return EXIT_BROKER_ERRORS
+    if getattr(args, "fail_on_found", False) and counts["found"]:
+        return EXIT_FOUND
+    return EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+Shared on-disk cache of static sub-resources for Playwright pages.
+
+Every broker search starts a fresh browser, so the broker's scripts,
+stylesheets, fonts and images would otherwise be downloaded again on every
+scan. AssetSession.handle is a page.route handler that answers those
+requests from `storage/asset_cache/`:
+
+  - fresh entries (within max-age/Expires, or ASSET_CACHE_DEFAULT_TTL when
+    the server sent neither) are served without touching the network
+  - stale entries with an ETag or Last-Modified are revalidated; a 304 is
+    served from disk
+  - everything else goes to the network, and cacheable 200s are stored
+
+Entries are keyed by URL and evicted least-recently-used once the cache
+exceeds ASSET_CACHE_MAX_MB.
+"""
+
+import hashlib, json, os, threading, time, uuid
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Optional, Tuple
+
+from ..store import STORE_DIR
+
+ASSET_CACHE_ENABLED = os.getenv("ASSET_CACHE", "1") != "0"
+ASSET_CACHE_DIR = Path(os.getenv("ASSET_CACHE_DIR") or STORE_DIR / "asset_cache")
+ASSET_CACHE_MAX_MB = float(os.getenv("ASSET_CACHE_MAX_MB", "500"))
+ASSET_CACHE_MAX_ITEM_MB = float(os.getenv("ASSET_CACHE_MAX_ITEM_MB", "10"))
+ASSET_CACHE_DEFAULT_TTL = float(os.getenv("ASSET_CACHE_DEFAULT_TTL", "3600"))
+
+STATIC_TYPES = {"script", "stylesheet", "font", "image"}
+# The body handed back is already decoded, and cookies must not be replayed
+DROP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "set-cookie"}
+
+
+def freshness(headers: dict) -> Tuple[bool, float]:
+    """(may be stored, seconds it stays fresh) from response headers"""
+    directives = {}
+    for part in headers.get("cache-control", "").lower().split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            directives[name] = value.strip('"')
+    if "no-store" in directives:
+        return False, 0.0
+    if "no-cache" in directives:
+        return True, 0.0
+    for name in ("s-maxage", "max-age"):
+        if directives.get(name, "").isdigit():
+            return True, float(directives[name])
+    if headers.get("expires"):
+        try:
+            expires = parsedate_to_datetime(headers["expires"]).timestamp()
+            return True, max(0.0, expires - time.time())
+        except (TypeError, ValueError):
+            return True, 0.0
+    return True, ASSET_CACHE_DEFAULT_TTL
+
+
+class AssetCache:
+    def __init__(self, root: Path = ASSET_CACHE_DIR, max_bytes: float = ASSET_CACHE_MAX_MB * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._lru = None  # key -> body size, least recently used first
+        self._total = 0
+
+    def _index(self) -> OrderedDict:
+        if self._lru is None:
+            self.root.mkdir(parents=True, exist_ok=True)
+            entries = []
+            for meta in self.root.glob("*.json"):
+                try:
+                    entries.append((meta.stat().st_mtime, meta.stem, json.loads(meta.read_text())["size"]))
+                except (OSError, ValueError, KeyError):
+                    continue
+            self._lru = OrderedDict((key, size) for _, key, size in sorted(entries))
+            self._total = sum(self._lru.values())
+        return self._lru
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[dict, bytes]]:
+        with self._lock:
+            if key not in self._index():
+                return None
+            self._lru.move_to_end(key)
+        try:
+            meta = json.loads((self.root / f"{key}.json").read_text())
+            body = (self.root / f"{key}.body").read_bytes()
+            os.utime(self.root / f"{key}.json")  # recency survives restarts
+            return meta, body
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, path: Path, data: bytes):
+        tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    def put(self, key: str, url: str, status: int, headers: dict, body: bytes, ttl: float):
+        meta = {"url": url, "status": status, "size": len(body), "stored_at": time.time(), "ttl": ttl,
+                "headers": {k: v for k, v in headers.items() if k.lower() not in DROP_HEADERS}}
+        with self._lock:
+            self._index()
+            self._write(self.root / f"{key}.body", body)
+            self._write(self.root / f"{key}.json", json.dumps(meta).encode())
+            self._total += len(body) - self._lru.pop(key, 0)
+            self._lru[key] = len(body)
+            while self._total > self.max_bytes and len(self._lru) > 1:
+                old, size = self._lru.popitem(last=False)
+                self._total -= size
+                for suffix in (".json", ".body"):
+                    try:
+                        (self.root / f"{old}{suffix}").unlink()
+                    except FileNotFoundError:
+                        pass
+
+    def refresh(self, key: str, meta: dict, headers: dict):
+        """Extend an entry's freshness after a 304"""
+        _, ttl = freshness(headers)
+        meta = {**meta, "stored_at": time.time(), "ttl": ttl}
+        self._write(self.root / f"{key}.json", json.dumps(meta).encode())
+
+    def session(self) -> "AssetSession":
+        return AssetSession(self)
+
+
+class AssetSession:
+    """Route handler plus hit/byte counters for one search"""
+
+    def __init__(self, cache: AssetCache):
+        self.cache = cache
+        self.stats = {"hits": 0, "revalidated": 0, "misses": 0, "bytes_saved": 0, "bytes_fetched": 0}
+
+    def handle(self, route, request):
+        if request.method != "GET" or request.resource_type not in STATIC_TYPES:
+            route.continue_()
+            return
+        try:
+            self._serve(route, request)
+        except Exception:
+            try:
+                route.continue_()
+            except Exception:
+                pass
+
+    def _serve(self, route, request):
+        key = self.cache.key(request.url)
+        cached = self.cache.get(key)
+        if cached:
+            meta, body = cached
+            if time.time() - meta["stored_at"] < meta["ttl"]:
+                route.fulfill(status=meta["status"], headers=meta["headers"], body=body)
+                self.stats["hits"] += 1
+                self.stats["bytes_saved"] += len(body)
+                return
+
+        headers = dict(request.headers)
+        if cached:
+            validators = {k.lower(): v for k, v in meta["headers"].items()}
+            if validators.get("etag"):
+                headers["if-none-match"] = validators["etag"]
+            if validators.get("last-modified"):
+                headers["if-modified-since"] = validators["last-modified"]
+        response = route.fetch(headers=headers)
+        if cached and response.status == 304:
+            self.cache.refresh(key, meta, response.headers)
+            route.fulfill(status=meta["status"], headers=meta["headers"], body=body)
+            self.stats["revalidated"] += 1
+            self.stats["bytes_saved"] += len(body)
+            return
+
+        body = response.body()
+        self.stats["misses"] += 1
+        self.stats["bytes_fetched"] += len(body)
+        storable, ttl = freshness(response.headers)
+        if response.status == 200 and storable and len(body) <= ASSET_CACHE_MAX_ITEM_MB * 1024 * 1024:
+            self.cache.put(key, request.url, response.status, response.headers, body, ttl)
+        route.fulfill(response=response, body=body)
+
+
+ASSET_CACHE = AssetCache()
+
+
+def add_stats(total: dict, stats: dict) -> dict:
+    """Sum per-search counters into a job total and derive its hit rate"""
+    total = {k: total.get(k, 0) + stats.get(k, 0) for k in ("hits", "revalidated", "misses", "bytes_saved", "bytes_fetched")}
+    served = total["hits"] + total["revalidated"]
+    requests = served + total["misses"]
+    total["hit_rate"] = round(served / requests, 3) if requests else 0.0
+    return total
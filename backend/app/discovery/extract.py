@@ -0,0 +1,156 @@
+"""
+Visible-text extraction for discovery pages.
+
+Instead of scoring the raw `page.content()` (scripts, inline JSON, CSS, SVG),
+pages are reduced to their visible text, tagged by page region:
+
+    {"title": ..., "main": ..., "nav": ..., "header": ..., "footer": ..., "resources": ...}
+
+`main` is everything outside navigation/header/footer landmarks and is what
+gets scored; the chrome regions are kept for debugging. `resources` lists
+script/iframe URLs so bot-check interstitials can still be recognised.
+
+`page_regions(page)` does the walk inside the browser in one evaluation;
+`extract_regions(html)` is a stdlib-parser fallback for stored HTML.
+"""
+
+from html.parser import HTMLParser
+
+REGIONS = ("main", "nav", "header", "footer")
+
+SKIP_TAGS = {"script", "style", "noscript", "svg", "template", "head", "iframe", "object", "canvas"}
+REGION_TAGS = {"nav": "nav", "aside": "nav", "header": "header", "footer": "footer"}
+REGION_ROLES = {"navigation": "nav", "complementary": "nav", "banner": "header", "contentinfo": "footer"}
+BLOCK_TAGS = {"p", "div", "li", "tr", "br", "h1", "h2", "h3", "h4", "h5", "h6",
+              "section", "article", "td", "th", "dd", "dt", "ul", "ol", "table", "form"}
+
+EXTRACT_JS = """
+() => {
+  const skip = new Set(["SCRIPT","STYLE","NOSCRIPT","SVG","TEMPLATE","IFRAME","OBJECT","CANVAS"]);
+  const regionOf = (el) => {
+    const c = el.closest("nav,aside,header,footer,[role=navigation],[role=complementary],[role=banner],[role=contentinfo]");
+    if (!c) return "main";
+    const role = c.getAttribute("role");
+    if (role === "navigation" || role === "complementary") return "nav";
+    if (role === "banner") return "header";
+    if (role === "contentinfo") return "footer";
+    const tag = c.tagName;
+    if (tag === "NAV" || tag === "ASIDE") return "nav";
+    return tag === "HEADER" ? "header" : "footer";
+  };
+  const out = {main: [], nav: [], header: [], footer: []};
+  const visible = new Map();
+  const walker = document.createTreeWalker(document.body || document.documentElement, NodeFilter.SHOW_TEXT);
+  for (let node = walker.nextNode(); node; node = walker.nextNode()) {
+    const text = node.nodeValue.trim();
+    const el = node.parentElement;
+    if (!text || !el || skip.has(el.tagName.toUpperCase()) || el.closest("svg,script,style,noscript,template")) continue;
+    let ok = visible.get(el);
+    if (ok === undefined) {
+      ok = el.checkVisibility ? el.checkVisibility({checkOpacity: true, checkVisibilityCSS: true})
+                              : !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length);
+      visible.set(el, ok);
+    }
+    if (ok) out[regionOf(el)].push(text);
+  }
+  const resources = Array.from(document.querySelectorAll("script[src],iframe[src]"), (e) => e.src).join(" ");
+  return {title: document.title || "", main: out.main.join("\\n"), nav: out.nav.join("\\n"),
+          header: out.header.join("\\n"), footer: out.footer.join("\\n"), resources};
+}
+"""
+
+
+class _RegionParser(HTMLParser):
+    """Collects text outside skipped tags, attributed to the innermost landmark"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = {region: [] for region in REGIONS}
+        self.title = []
+        self.resources = []
+        self._stack = []  # (tag, region or None, skipping)
+        self._in_title = False
+
+    def _region(self):
+        for _, region, _ in reversed(self._stack):
+            if region:
+                return region
+        return "main"
+
+    def _skipping(self):
+        return any(skipping for _, _, skipping in self._stack)
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag in ("script", "iframe") and attrs.get("src"):
+            self.resources.append(attrs["src"])
+        if tag == "title":
+            self._in_title = True
+        hidden = "hidden" in attrs or attrs.get("aria-hidden") == "true" or \
+            "display:none" in (attrs.get("style") or "").replace(" ", "")
+        region = REGION_ROLES.get(attrs.get("role") or "") or REGION_TAGS.get(tag)
+        if tag in ("br", "img", "input", "meta", "link", "hr", "source", "wbr"):
+            if tag == "br":
+                self.parts[self._region()].append("\n")
+            return
+        self._stack.append((tag, region, tag in SKIP_TAGS or hidden))
+        if tag in BLOCK_TAGS and not self._skipping():
+            self.parts[self._region()].append("\n")
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+        # Tolerate unclosed tags: pop back to the matching opener if there is one
+        for idx in range(len(self._stack) - 1, -1, -1):
+            if self._stack[idx][0] == tag:
+                del self._stack[idx:]
+                break
+        if tag in BLOCK_TAGS:
+            self.parts[self._region()].append("\n")
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title.append(data)
+            return
+        if not data.strip() or self._skipping():
+            return
+        self.parts[self._region()].append(data)
+
+
+def _squash(chunks) -> str:
+    lines = (" ".join(line.split()) for line in "".join(chunks).split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+def extract_regions(html: str) -> dict:
+    """Region-tagged visible text from an HTML string (no browser needed)"""
+    parser = _RegionParser()
+    try:
+        parser.feed(html or "")
+        parser.close()
+    except Exception:
+        pass
+    regions = {region: _squash(parser.parts[region]) for region in REGIONS}
+    regions["title"] = " ".join("".join(parser.title).split())
+    regions["resources"] = " ".join(parser.resources)
+    return regions
+
+
+def page_regions(page) -> dict:
+    """Region-tagged visible text of a live Playwright page, in one evaluation"""
+    try:
+        regions = page.evaluate(EXTRACT_JS)
+        if isinstance(regions, dict) and "main" in regions:
+            return regions
+    except Exception as e:
+        print(f"    ⚠️ In-page text extraction failed ({e}), parsing HTML instead")
+    return extract_regions(page.content())
+
+
+def block_check_text(regions: dict) -> str:
+    """The parts of a page that bot-check detection needs to see"""
+    return "\n".join((regions.get("title", ""), regions.get("resources", ""), regions.get("main", "")[:20000]))
+
+
+def scored_bytes(regions: dict) -> int:
+    return len(regions.get("main", "").encode("utf-8"))
@@ -0,0 +1,129 @@
+"""
+Pipelined navigation for a broker search's queries.
+
+Every query of a search starts by loading the broker's search page again.
+Run strictly in order, the browser sits idle while Python extracts and
+scores the previous results page and takes its screenshot, and Python then
+sits idle while that load waits on the network. With PIPELINE_LOOKAHEAD=N,
+up to N further pages of the search's browser context start loading the
+search URL for the next queries as soon as the current one has its page,
+so those loads overlap the current query's fill, submit, scoring and
+screenshot. A query then takes a page that is already loaded, or waits
+only for the rest of its load.
+
+A page is started with goto(wait_until="commit"), which returns once the
+response has started arriving, so a load that fails outright (DNS,
+connection refused, timeout) fails there and is dropped; the query then
+navigates normally and reports why. Pages loaded ahead get no Python route
+handlers: the sync API only runs those while the thread is inside a
+Playwright call, so a routed page would stall while Python scores the
+current one. The asset cache is attached once a page is taken.
+
+Loads started ahead take politeness tokens like any other navigation. One is
+only started when a token is free right away, so lookahead never makes a
+search wait longer for a cooling domain. Pages loaded for queries a strong
+match made unnecessary are counted as `wasted`.
+
+`stats` records how much navigation time was hidden behind other work:
+overlap_ratio = hidden_s / (hidden_s + exposed_s), 0 when nothing ran ahead.
+Waiting for a page's commit or for the rest of its load is exposed; the
+time between its commit and the browser's load event, up to when the page
+was taken, is hidden.
+"""
+
+import os, time
+from collections import deque
+from typing import Callable, Optional, Tuple
+
+from ..politeness import POLITENESS
+
+PIPELINE_LOOKAHEAD = int(os.getenv("PIPELINE_LOOKAHEAD", "0"))
+NAV_COUNTERS = ("navigations", "prefetched", "wasted", "hidden_s", "exposed_s")
+# When the page's load event ended, in epoch ms by the browser's clock (0 if it hasn't)
+LOAD_END_JS = ("() => { const n = performance.getEntriesByType('navigation')[0];"
+               " return n && n.loadEventEnd ? performance.timeOrigin + n.loadEventEnd : 0 }")
+
+
+def new_stats() -> dict:
+    return {key: 0 for key in NAV_COUNTERS}
+
+
+def add_nav_stats(total: dict, stats: dict) -> dict:
+    """Sum per-search navigation counters and derive the overlap ratio"""
+    total = {k: total.get(k, 0) + stats.get(k, 0) for k in NAV_COUNTERS}
+    for key in ("hidden_s", "exposed_s"):
+        total[key] = round(total[key], 3)
+    nav_s = total["hidden_s"] + total["exposed_s"]
+    total["overlap_ratio"] = round(total["hidden_s"] / nav_s, 3) if nav_s > 0 else 0.0
+    return total
+
+
+class PagePipeline:
+    """Search pages loading ahead in one browser context, handed out in order"""
+
+    def __init__(self, context, url: str, domain: str, new_page: Callable, lookahead: int = PIPELINE_LOOKAHEAD,
+                 stats: Optional[dict] = None):
+        self.context = context
+        self.url = url
+        self.domain = domain
+        self.new_page = new_page  # context -> page with no Python route handlers
+        self.lookahead = max(0, lookahead)
+        self.stats = stats if stats is not None else new_stats()
+        self._ahead = deque()  # (page, HTTP status, started, committed)
+
+    def fill(self, remaining: int):
+        """Start loading the search URL for up to `lookahead` of the `remaining` queries"""
+        while len(self._ahead) < min(self.lookahead, remaining):
+            if not POLITENESS.acquire(self.domain, max_wait=0):
+                return
+            page = self.new_page(self.context)
+            started = time.time()
+            try:
+                response = page.goto(self.url, wait_until="commit")
+            except Exception as e:
+                print(f"    ⚠️ Loading ahead failed: {e}")
+                page.close()
+                self.stats["wasted"] += 1
+                return
+            committed = time.time()
+            self.stats["exposed_s"] += committed - started
+            self._ahead.append((page, response.status if response else None, started, committed))
+
+    def take(self) -> Optional[Tuple[object, Optional[int], float]]:
+        """
+        The next page loaded ahead, once it is idle, as (page, HTTP status, load
+        seconds); None if none was started.
+        """
+        if not self._ahead:
+            return None
+        page, status, started, committed = self._ahead.popleft()
+        waited = time.time()
+        try:
+            page.wait_for_load_state("networkidle")
+        except Exception:
+            page.close()
+            raise
+        done = time.time()
+        try:
+            load_end = page.evaluate(LOAD_END_JS) / 1000 or done
+        except Exception:
+            load_end = done
+        self.stats["navigations"] += 1
+        self.stats["prefetched"] += 1
+        self.stats["hidden_s"] += max(0.0, min(waited, load_end) - committed)
+        self.stats["exposed_s"] += done - waited
+        return page, status, max(0.0, min(load_end, done) - started)
+
+    def observe(self, seconds: float):
+        """A navigation the query had to wait for in full"""
+        self.stats["navigations"] += 1
+        self.stats["exposed_s"] += seconds
+
+    def discard(self):
+        while self._ahead:
+            page = self._ahead.popleft()[0]
+            self.stats["wasted"] += 1
+            try:
+                page.close()
+            except Exception:
+                pass
@@ -0,0 +1,230 @@
+"""
+Page scoring for discovery results.
+
+Everything here is a pure function of (page text, url, pii) so it can run in
+a worker process: with SCORING_POOL_WORKERS > 0, `score_regions_pooled` ships a
+page's extracted regions to a bounded ProcessPoolExecutor instead of scanning it in the
+browser-driving thread, where the lowercase copies, regex context scans and
+substring counts would hold the GIL and starve the API and other workers.
+The calling thread still blocks until its page is scored; what moves out is
+the GIL-holding work.
+
+Children are started with "spawn": forking a process that runs Playwright,
+threadpools and background threads can copy a lock some other thread holds
+and deadlock the child. Keep this module free of Playwright and app imports;
+pool children import it.
+"""
+
+import multiprocessing, os, re, threading
+from concurrent.futures import ProcessPoolExecutor
+
+SCORING_POOL_WORKERS = int(os.getenv("SCORING_POOL_WORKERS", "0"))  # 0 scores in-thread
+MATCH_HITS = 2      # a match: the broker's search stops here
+POTENTIAL_HITS = 1  # a potential match: keep looking for a better page
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def token_hits(html: str, pii: dict, chrome_filtered: bool = False) -> int:
+    """
+    Calculate hits with improved logic to reduce false positives
+
+    With chrome_filtered=True the input is the extracted `main` text of a
+    page, so nav/footer noise is already gone and the context-window
+    heuristics for names are skipped.
+    """
+    html_low = html.lower()
+    hits = 0
+    
+    # Email matching - high value, exact match required
+    for e in pii.get("emails", []):
+        if e and e.lower() in html_low:
+            # Check if email appears in a meaningful context (not just in page source/scripts)
+            if re.search(rf'\b{re.escape(e.lower())}\b', html_low):
+                hits += 4
+    
+    # Phone matching - exact format required
+    for p in pii.get("phones", []):
+        if p:
+            # Clean phone number for matching
+            clean_phone = re.sub(r'[^\d]', '', p)
+            if len(clean_phone) >= 10:
+                # Look for phone in various formats
+                phone_patterns = [
+                    p,  # Original format
+                    clean_phone,  # Digits only
+                    f"({clean_phone[:3]}) {clean_phone[3:6]}-{clean_phone[6:]}" if len(clean_phone) == 10 else None,
+                    f"{clean_phone[:3]}-{clean_phone[3:6]}-{clean_phone[6:]}" if len(clean_phone) == 10 else None
+                ]
+                for pattern in phone_patterns:
+                    if pattern and pattern in html:
+                        hits += 3
+                        break
+    
+    # Name matching - more sophisticated but not overly restrictive
+    for n in pii.get("names", []):
+        if n and len(n.strip()) > 2:
+            name_parts = n.lower().split()
+            if len(name_parts) >= 2:  # Full name required
+                # Check for full name match
+                if n.lower() in html_low and chrome_filtered:
+                    hits += 2
+                elif n.lower() in html_low:
+                    # Verify it's not just in navigation/footer by checking context
+                    name_contexts = re.findall(rf'.{{0,50}}{re.escape(n.lower())}.{{0,50}}', html_low)
+                    meaningful_contexts = 0
+                    for context in name_contexts:
+                        # Skip if appears in common page elements
+                        if not any(skip_word in context for skip_word in 
+                                 ['nav', 'menu', 'footer', 'header', 'sidebar', 'copyright', 'terms', 'privacy']):
+                            meaningful_contexts += 1
+                    
+                    if meaningful_contexts > 0:
+                        hits += 2
+            elif len(name_parts) == 1 and len(n.strip()) > 4:  # Single names if long enough
+                # For single names, be more careful - only count if in meaningful context
+                if n.lower() in html_low:
+                    meaningful_contexts = 0
+                    # Only count if not in navigation elements and appears with other identifying info
+                    name_contexts = re.findall(rf'.{{0,100}}{re.escape(n.lower())}.{{0,100}}', html_low)
+                    for context in name_contexts:
+                        # Check if context contains other PII indicators
+                        if any(email.lower() in context for email in pii.get("emails", []) if email):
+                            hits += 1
+                            break
+                        elif any(phone in context for phone in pii.get("phones", []) if phone):
+                            hits += 1
+                            break
+                        if chrome_filtered or not any(skip_word in context for skip_word in 
+                                 ['nav', 'menu', 'footer', 'header', 'sidebar', 'copyright', 'terms', 'privacy']):
+                            meaningful_contexts += 1
+                    
+                    if meaningful_contexts > 0:
+                        hits += 2
+    
+    # Address matching - only count if multiple address components match
+    address_hits = 0
+    for adr in pii.get("addresses", []):
+        if not adr:
+            continue
+            
+        city = adr.get("city")
+        state = adr.get("state") 
+        zip_code = adr.get("zip") or adr.get("postal")
+        
+        temp_address_hits = 0
+        if city and len(city) > 3 and city.lower() in html_low:
+            temp_address_hits += 1
+        if state and state.lower() in html_low:
+            temp_address_hits += 1
+        if zip_code and zip_code in html:
+            temp_address_hits += 1
+            
+        # Only count address hits if multiple components match
+        if temp_address_hits >= 2:
+            address_hits += temp_address_hits
+    
+    hits += address_hits
+    return hits
+
+def is_meaningful_result_page(html: str, url: str) -> bool:
+    """
+    Check if the page appears to be showing search results rather than just a homepage
+    Made more permissive to reduce false negatives
+    """
+    html_low = html.lower()
+    
+    # Look for result indicators (expanded list)
+    result_indicators = [
+        'result', 'search result', 'found', 'record', 'profile', 'listing',
+        'directory', 'people', 'person', 'individual', 'contact', 'address',
+        'data', 'information', 'details', 'search', 'find', 'lookup'
+    ]
+    
+    # Look for "no results" indicators  
+    no_result_indicators = [
+        'no results found', 'not found', 'no matches', 'no records found', 
+        'try again', 'refine your search', 'no people found', 'no listings found', 
+        'no entries found', 'search returned 0', 'zero results'
+    ]
+    
+    # Count positive indicators
+    positive_score = sum(1 for indicator in result_indicators if indicator in html_low)
+    
+    # Count negative indicators (be more specific to avoid false positives)
+    negative_score = sum(1 for indicator in no_result_indicators if indicator in html_low)
+    
+    # If there are strong "no results" messages, it's not meaningful
+    if negative_score >= 2:  # Require multiple negative indicators
+        return False
+        
+    # Be more permissive - allow pages with any positive indicators or if it's clearly a search results page
+    if positive_score >= 1:  # Reduced from 2 to 1
+        return True
+    
+    # Also check URL patterns for search results pages
+    url_indicators = ['search', 'result', 'find', 'lookup', 'directory']
+    if any(indicator in url.lower() for indicator in url_indicators):
+        return True
+    
+    # If we can't determine, assume it's meaningful (be permissive)
+    return True
+
+
+def score_page(html: str, url: str, pii: dict) -> dict:
+    """Meaningfulness check and hit count for one captured page"""
+    if not is_meaningful_result_page(html, url):
+        return {"meaningful": False, "hits": 0}
+    return {"meaningful": True, "hits": token_hits(html, pii)}
+
+
+def match_confidence(hits: int) -> float:
+    """Confidence for a best page with this many hits (0.0 below POTENTIAL_HITS)"""
+    if hits >= MATCH_HITS:
+        return min(1.0, 0.4 + 0.1 * hits)
+    if hits >= POTENTIAL_HITS:
+        return min(0.5, 0.2 + 0.1 * hits)  # lower confidence for potential matches
+    return 0.0
+
+
+def score_regions(regions: dict, url: str, pii: dict) -> dict:
+    """`score_page` over the visible `main` text from discovery.extract"""
+    text = regions.get("main", "")
+    if not is_meaningful_result_page(text, url):
+        return {"meaningful": False, "hits": 0}
+    return {"meaningful": True, "hits": token_hits(text, pii, chrome_filtered=True)}
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=SCORING_POOL_WORKERS,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _run_scoring(fn, *args) -> dict:
+    # Run in the scoring process pool when one is configured; fall back to
+    # scoring in-thread if the pool is disabled or broken.
+    if SCORING_POOL_WORKERS <= 0:
+        return fn(*args)
+    try:
+        return _get_pool().submit(fn, *args).result()
+    except Exception as e:
+        print(f"    ⚠️ Scoring pool unavailable ({e}), scoring in-thread")
+        return fn(*args)
+
+
+def score_regions_pooled(regions: dict, url: str, pii: dict) -> dict:
+    """`score_regions`, in the scoring pool when enabled; blocks until scored"""
+    return _run_scoring(score_regions, regions, url, pii)
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
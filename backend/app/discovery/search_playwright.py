@@ -2,9 +2,23 @@
 from playwright.sync_api import sync_playwright
 from playwright.async_api import async_playwright
 from urllib.parse import urlparse, urlencode, quote_plus
-import os, re, time, hashlib, json
+import os, re, time, hashlib, json, uuid
 
-DEFAULT_TIMEOUT = 10000  # Reduced from 15s to 10s for even faster discovery
+from ..politeness import POLITENESS, POLITENESS_MAX_WAIT, normalize_domain
+from ..cancellation import close_playwright_threadsafe
+from ..browser_state import load_state, save_state
+from ..session_archive import SESSION_ARCHIVE
+from ..domain_health import DomainSession, summary as breaker_summary
+from ..memory_probe import BROWSER_RSS_LIMIT_MB, browser_pid, tree_rss_mb
+from .scoring import score_regions_pooled, match_confidence, MATCH_HITS, POTENTIAL_HITS
+from .extract import page_regions, block_check_text, scored_bytes
+from .asset_cache import ASSET_CACHE, ASSET_CACHE_ENABLED
+from .snapshots import SNAPSHOTS_ENABLED, record_page
+from .prefetch import PagePipeline, add_nav_stats, new_stats
+
+# Navigation errors that no later query will get past
+UNREACHABLE_ERRORS = {"ERR_NAME_NOT_RESOLVED": "dns", "ERR_CONNECTION_REFUSED": "connect",
+                      "ERR_ADDRESS_UNREACHABLE": "connect", "ERR_CERT_": "tls"}
 
 
 async def handle_overlays(page):
@@ -60,7 +74,8 @@ async def handle_overlays(page):
 
 
 def handle_overlays_sync(page):
-    """Sync version of overlay handler"""
+    """Sync version of overlay handler; returns how many overlays it dismissed"""
+    dismissed = 0
     overlay_selectors = [
         # Cookie consent
         '#ccc-overlay',
@@ -96,6 +111,7 @@ def handle_overlays_sync(page):
                     try:
                         element.click(timeout=2000, force=True)
                         print(f"    🍪 Dismissed overlay: {selector}")
+                        dismissed += 1
                         page.wait_for_timeout(1000)
                         break
                     except:
@@ -109,101 +125,7 @@ def handle_overlays_sync(page):
         page.wait_for_timeout(500)
     except:
         pass
-
-def token_hits(html: str, pii: dict) -> int:
-    """
-    Calculate hits with improved logic to reduce false positives
-    """
-    html_low = html.lower()
-    hits = 0
-    
-    # Email matching - high value, exact match required
-    for e in pii.get("emails", []):
-        if e and e.lower() in html_low:
-            # Check if email appears in a meaningful context (not just in page source/scripts)
-            if re.search(rf'\b{re.escape(e.lower())}\b', html_low):
-                hits += 4
-    
-    # Phone matching - exact format required
-    for p in pii.get("phones", []):
-        if p:
-            # Clean phone number for matching
-            clean_phone = re.sub(r'[^\d]', '', p)
-            if len(clean_phone) >= 10:
-                # Look for phone in various formats
-                phone_patterns = [
-                    p,  # Original format
-                    clean_phone,  # Digits only
-                    f"({clean_phone[:3]}) {clean_phone[3:6]}-{clean_phone[6:]}" if len(clean_phone) == 10 else None,
-                    f"{clean_phone[:3]}-{clean_phone[3:6]}-{clean_phone[6:]}" if len(clean_phone) == 10 else None
-                ]
-                for pattern in phone_patterns:
-                    if pattern and pattern in html:
-                        hits += 3
-                        break
-    
-    # Name matching - more sophisticated but not overly restrictive
-    for n in pii.get("names", []):
-        if n and len(n.strip()) > 2:
-            name_parts = n.lower().split()
-            if len(name_parts) >= 2:  # Full name required
-                # Check for full name match
-                if n.lower() in html_low:
-                    # Verify it's not just in navigation/footer by checking context
-                    name_contexts = re.findall(rf'.{{0,50}}{re.escape(n.lower())}.{{0,50}}', html_low)
-                    meaningful_contexts = 0
-                    for context in name_contexts:
-                        # Skip if appears in common page elements
-                        if not any(skip_word in context for skip_word in 
-                                 ['nav', 'menu', 'footer', 'header', 'sidebar', 'copyright', 'terms', 'privacy']):
-                            meaningful_contexts += 1
-                    
-                    if meaningful_contexts > 0:
-                        hits += 2
-            elif len(name_parts) == 1 and len(n.strip()) > 4:  # Single names if long enough
-                # For single names, be more careful - only count if in meaningful context
-                if n.lower() in html_low:
-                    # Only count if not in navigation elements and appears with other identifying info
-                    name_contexts = re.findall(rf'.{{0,100}}{re.escape(n.lower())}.{{0,100}}', html_low)
-                    for context in name_contexts:
-                        # Check if context contains other PII indicators
-                        if any(email.lower() in context for email in pii.get("emails", []) if email):
-                            hits += 1
-                            break
-                        elif any(phone in context for phone in pii.get("phones", []) if phone):
-                            hits += 1
-                            break
-                        if not any(skip_word in context for skip_word in 
-                                 ['nav', 'menu', 'footer', 'header', 'sidebar', 'copyright', 'terms', 'privacy']):
-                            meaningful_contexts += 1
-                    
-                    if meaningful_contexts > 0:
-                        hits += 2
-    
-    # Address matching - only count if multiple address components match
-    address_hits = 0
-    for adr in pii.get("addresses", []):
-        if not adr:
-            continue
-            
-        city = adr.get("city")
-        state = adr.get("state") 
-        zip_code = adr.get("zip") or adr.get("postal")
-        
-        temp_address_hits = 0
-        if city and len(city) > 3 and city.lower() in html_low:
-            temp_address_hits += 1
-        if state and state.lower() in html_low:
-            temp_address_hits += 1
-        if zip_code and zip_code in html:
-            temp_address_hits += 1
-            
-        # Only count address hits if multiple components match
-        if temp_address_hits >= 2:
-            address_hits += temp_address_hits
-    
-    hits += address_hits
-    return hits
+    return dismissed
 
 def build_queries(pii: dict):
     """
@@ -249,52 +171,10 @@ def build_queries(pii: dict):
     # Limit queries to prevent too many searches
     return queries[:8] or [""]  # Increased from 3 to 8 for better coverage
 
-def is_meaningful_result_page(html: str, url: str) -> bool:
-    """
-    Check if the page appears to be showing search results rather than just a homepage
-    Made more permissive to reduce false negatives
-    """
-    html_low = html.lower()
-    
-    # Look for result indicators (expanded list)
-    result_indicators = [
-        'result', 'search result', 'found', 'record', 'profile', 'listing',
-        'directory', 'people', 'person', 'individual', 'contact', 'address',
-        'data', 'information', 'details', 'search', 'find', 'lookup'
-    ]
-    
-    # Look for "no results" indicators  
-    no_result_indicators = [
-        'no results found', 'not found', 'no matches', 'no records found', 
-        'try again', 'refine your search', 'no people found', 'no listings found', 
-        'no entries found', 'search returned 0', 'zero results'
-    ]
-    
-    # Count positive indicators
-    positive_score = sum(1 for indicator in result_indicators if indicator in html_low)
-    
-    # Count negative indicators (be more specific to avoid false positives)
-    negative_score = sum(1 for indicator in no_result_indicators if indicator in html_low)
-    
-    # If there are strong "no results" messages, it's not meaningful
-    if negative_score >= 2:  # Require multiple negative indicators
-        return False
-        
-    # Be more permissive - allow pages with any positive indicators or if it's clearly a search results page
-    if positive_score >= 1:  # Reduced from 2 to 1
-        return True
-    
-    # Also check URL patterns for search results pages
-    url_indicators = ['search', 'result', 'find', 'lookup', 'directory']
-    if any(indicator in url.lower() for indicator in url_indicators):
-        return True
-    
-    # If we can't determine, assume it's meaningful (be permissive)
-    return True
-
-def search_broker(broker: dict, pii: dict, evidence_dir: str = "/tmp") -> dict:
+def search_broker(broker: dict, pii: dict, evidence_dir: str = "/tmp", cancel=None) -> dict:
     """
-    Enhanced search with better balance between precision and recall
+    Enhanced search with better balance between precision and recall.
+    Cancelling `cancel` closes the browser, aborting whatever query is in flight.
     """
     print(f"🔍 Searching {broker.get('domain', 'unknown')} for PII...")
     
@@ -313,20 +193,101 @@ def search_broker(broker: dict, pii: dict, evidence_dir: str = "/tmp") -> dict:
     confidence = 0.0
     evidence_url = ""
     best_url = ""
+    rate_limited = False
+    bytes_scored = 0
+    query_errors = 0
+    query_timeouts = 0
+    unreachable = None
+    cancelled = lambda: bool(cancel and cancel.cancelled)
+    unregister = lambda: None
+    domain = normalize_domain(broker.get("domain") or search_url)
+    assets = ASSET_CACHE.session()
+    health = DomainSession(domain)
+    if not health.allowed():
+        print(f"⛔ {domain} circuit is open after repeated failures, skipping")
+        return {"found": False, "confidence": 0.0, "error": "circuit_open", "circuit_open": True,
+                "breaker": breaker_summary(health.entry)}
+    stage = "nav"
+    browsers_recycled = 0
+    search_id = uuid.uuid4().hex[:12]  # groups this search's pages in the snapshot manifest
     
+    nav_stats = new_stats()
+
+    def _route_assets(page):
+        if ASSET_CACHE_ENABLED and not SESSION_ARCHIVE.mode:
+            page.route("**/*", assets.handle)
+
+    def _new_page(context, cached: bool = True):
+        page = context.new_page()
+        # Deadlines adapt to how fast this domain has been (10s until it has history)
+        page.set_default_timeout(health.nav_timeout_ms)
+        if cached:
+            _route_assets(page)
+        return page
+
+    def _open(p):
+        browser = p.chromium.launch(headless=True)
+        context = browser.new_context(**SESSION_ARCHIVE.context_options(domain, "search"))
+        SESSION_ARCHIVE.replay(context, domain, "search")
+        # Pages loaded ahead must not wait on a Python route handler while this thread scores
+        pipeline = PagePipeline(context, search_url, domain, lambda ctx: _new_page(ctx, cached=False), stats=nav_stats)
+        return browser, context, _new_page(context), pipeline, browser_pid(browser)
+
+    def _close(browser, context):
+        if SESSION_ARCHIVE.recording:
+            context.close()  # writes the session's HAR archive
+        browser.close()
+
     try:
         with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-            page.set_default_timeout(DEFAULT_TIMEOUT)
+            saved_state = load_state(domain)
+            browser, context, page, pipeline, pid = _open(p)
+            if cancel:
+                unregister = cancel.on_cancel(lambda: close_playwright_threadsafe(browser))
             
             for i, q in enumerate(queries):
+                if cancelled():
+                    break
+                # Chromium grows over a long run of queries; start a fresh one past the limit
+                rss = tree_rss_mb(pid) if i and pid else None
+                if rss and rss > BROWSER_RSS_LIMIT_MB:
+                    print(f"  ♻️ Browser at {rss:.0f} MB, recycling it")
+                    pipeline.discard()
+                    _close(browser, context)
+                    browser, context, page, pipeline, pid = _open(p)
+                    browsers_recycled += 1
                 print(f"  🔎 Trying query {i+1}/{len(queries)}: '{q[:50]}...'")
                 try:
-                    page.goto(search_url, wait_until="networkidle")
+                    stage = "nav"
+                    fetched = pipeline.take()
+                    if fetched:
+                        page.close()
+                        page, status, nav_s = fetched
+                        _route_assets(page)
+                    else:
+                        if not POLITENESS.acquire(domain, max_wait=POLITENESS_MAX_WAIT, should_stop=cancelled):
+                            if cancelled():
+                                break
+                            print(f"    🐢 {domain} is cooling down, handing broker back to the queue")
+                            rate_limited = True
+                            break
+                        nav_started = time.monotonic()
+                        response = page.goto(search_url, wait_until="networkidle")
+                        nav_s = time.monotonic() - nav_started
+                        pipeline.observe(nav_s)
+                        status = response.status if response else None
+                    health.observe("nav", nav_s)
+                    # Later queries' search pages load while this one is filled, submitted and scored
+                    pipeline.fill(len(queries) - i - 1)
+                    if POLITENESS.report(domain, status=status):
+                        rate_limited = True
+                        break
                     
-                    # Handle overlays and cookie consents
-                    handle_overlays_sync(page)
+                    # Handle overlays and cookie consents; consent given once is saved for the
+                    # domain so later queries, jobs and removals start past the banner
+                    if handle_overlays_sync(page) or saved_state is None:
+                        save_state(domain, context.storage_state())
+                        saved_state = saved_state or {}
                     
                     # Fill search form
                     search_filled = False
@@ -355,12 +316,16 @@ def search_broker(broker: dict, pii: dict, evidence_dir: str = "/tmp") -> dict:
                     if search_filled:
                         # Submit search - try Enter key first as it's most reliable
                         try:
+                            stage, settle_started = "settle", time.monotonic()
                             page.keyboard.press('Enter')
-                            page.wait_for_load_state("networkidle", timeout=10000)
+                            page.wait_for_load_state("networkidle", timeout=health.settle_timeout_ms)
+                            health.observe("settle", time.monotonic() - settle_started)
                             submitted = True
                             print(f"    🚀 Submitted search with Enter key")
                         except Exception as e:
                             print(f"    ⚠️ Failed to submit with Enter: {e}")
+                            if "Timeout" in type(e).__name__:
+                                health.observe("settle", health.settle_timeout_ms / 1000)
                             submitted = False
                             
                             # Fall back to button clicking
@@ -374,8 +339,8 @@ def search_broker(broker: dict, pii: dict, evidence_dir: str = "/tmp") -> dict:
                             for selector in submit_selectors:
                                 try:
                                     if page.locator(selector).count() > 0:
-                                        page.click(selector, force=True, timeout=10000)
-                                        page.wait_for_load_state("networkidle", timeout=10000)
+                                        page.click(selector, force=True, timeout=health.settle_timeout_ms)
+                                        page.wait_for_load_state("networkidle", timeout=health.settle_timeout_ms)
                                         submitted = True
                                         print(f"    🚀 Submitted search with: {selector}")
                                         break
@@ -386,17 +351,29 @@ def search_broker(broker: dict, pii: dict, evidence_dir: str = "/tmp") -> dict:
                         if not submitted:
                             print(f"    ❌ No submit method worked")
                     
-                    html = page.content()
+                    # Score visible text by region rather than the raw HTML
+                    regions = page_regions(page)
+                    pipeline.fill(len(queries) - i - 1)  # the browser is idle until the next query
+                    health.success()
+                    bytes_scored += scored_bytes(regions)
+                    if POLITENESS.report(domain, html=block_check_text(regions)):
+                        rate_limited = True
+                        break
+                    if SNAPSHOTS_ENABLED:
+                        record_page(evidence_dir, domain, search_id, page.url, page.content, regions)
                     
-                    # Check if this looks like a meaningful results page
-                    page_is_meaningful = is_meaningful_result_page(html, page.url)
+                    # Check if this looks like a meaningful results page and count hits,
+                    # off this thread when the scoring pool is enabled
+                    verdict = score_regions_pooled(regions, page.url, pii)
+                    del regions
+                    page_is_meaningful = verdict["meaningful"]
                     print(f"    📄 Page analysis: meaningful={page_is_meaningful}, URL={page.url[:100]}...")
                     
                     if not page_is_meaningful:
                         print(f"    ❌ Page doesn't appear to show search results")
                         continue
                     
-                    hits = token_hits(html, pii)
+                    hits = verdict["hits"]
                     print(f"    📊 Found {hits} hits on this page")
                     
                     if hits > max_hits:
@@ -404,9 +381,9 @@ def search_broker(broker: dict, pii: dict, evidence_dir: str = "/tmp") -> dict:
                         best_url = page.url
                         
                         # More permissive thresholds to get some results
-                        if hits >= 2:  # Lowered from 4 to 2 for primary threshold
+                        if hits >= MATCH_HITS:  # Lowered from 4 to 2 for primary threshold
                             found = True
-                            confidence = min(1.0, 0.4 + 0.1 * hits)
+                            confidence = match_confidence(hits)
                             evidence_url = page.url
                             
                             # Take screenshot of the best result
@@ -415,10 +392,10 @@ def search_broker(broker: dict, pii: dict, evidence_dir: str = "/tmp") -> dict:
                             page.screenshot(path=shot_path, full_page=True)
                             print(f"    ✅ MATCH FOUND! Hits: {hits}, Confidence: {confidence:.2f}")
                             break  # Found a good match, no need to continue
-                        elif hits >= 1:  # Even lower threshold for potential matches
+                        elif hits >= POTENTIAL_HITS:  # Even lower threshold for potential matches
                             # For 1+ hits, mark as potential but keep searching
                             found = True
-                            confidence = min(0.5, 0.2 + 0.1 * hits)  # Lower confidence
+                            confidence = match_confidence(hits)
                             evidence_url = page.url
                             
                             # Take screenshot but continue searching for better matches
@@ -430,15 +407,33 @@ def search_broker(broker: dict, pii: dict, evidence_dir: str = "/tmp") -> dict:
                             print(f"    📉 Hits below threshold: {hits} < 1")
                             
                 except Exception as e:
+                    if cancelled():
+                        break
+                    timed_out = "Timeout" in type(e).__name__
+                    health.failure(stage if timed_out else None)
+                    unreachable = next((reason for marker, reason in UNREACHABLE_ERRORS.items() if marker in str(e)), None)
+                    if unreachable:
+                        print(f"    🚫 {domain} is unreachable ({unreachable}), skipping remaining queries")
+                        break
                     # Log error but continue with next query
                     print(f"    ❌ Error with query '{q}': {e}")
+                    query_errors += 1
+                    if timed_out:
+                        query_timeouts += 1
+                    if health.tripped:
+                        print(f"    ⛔ {domain} keeps failing, skipping remaining queries")
+                        break
                     continue
                     
     except Exception as e:
-        print(f"❌ Browser error for {broker.get('domain', 'unknown')}: {e}")
+        if not cancelled():
+            print(f"❌ Browser error for {broker.get('domain', 'unknown')}: {e}")
     finally:
+        unregister()
+        health.save()
         try:
-            browser.close()
+            pipeline.discard()
+            _close(browser, context)
         except:
             pass
 
@@ -446,7 +441,7 @@ def search_broker(broker: dict, pii: dict, evidence_dir: str = "/tmp") -> dict:
     print(f"🏁 Search complete for {broker.get('domain', 'unknown')}: Found={found}, Max hits={max_hits}")
     
     # Add notes about the search quality
-    notes = f"max_hits: {max_hits}, queries_tried: {len(queries)}"
+    notes = f"max_hits: {max_hits}, queries_tried: {len(queries)}, bytes_scored: {bytes_scored}"
     if found:
         if max_hits >= 4:
             notes += f", confidence_reason: strong_match_found"
@@ -454,6 +449,8 @@ def search_broker(broker: dict, pii: dict, evidence_dir: str = "/tmp") -> dict:
             notes += f", confidence_reason: potential_match_found"
     else:
         notes += f", reason: threshold_not_met (need ≥2 hits, got {max_hits})"
+    if rate_limited:
+        notes += ", rate_limited: true"
     
     return {
         "found": found,
@@ -462,5 +459,16 @@ def search_broker(broker: dict, pii: dict, evidence_dir: str = "/tmp") -> dict:
         "best_url": best_url,
         "screenshot": os.path.join(evidence_dir, f"{broker.get('domain', 'unknown')}.png") if found else None,
         "notes": notes,
-        "debug_hits": max_hits
+        "debug_hits": max_hits,
+        "rate_limited": rate_limited,
+        "query_errors": query_errors,
+        "query_timeouts": query_timeouts,
+        "cancelled": cancelled(),
+        "unreachable": unreachable,
+        "asset_cache": assets.stats,
+        "navigation": add_nav_stats({}, nav_stats),
+        "browsers_recycled": browsers_recycled,
+        "circuit_open": health.tripped,
+        "breaker": breaker_summary(health.entry),
+        "retry_after": round(POLITENESS.ready_in(domain), 1) if rate_limited else 0
     }
@@ -0,0 +1,128 @@
+"""
+Compressed snapshots of scored discovery pages, for offline re-scoring.
+
+With SNAPSHOTS=1, search_broker keeps every page it scores, storing both the
+page's HTML and the region text it actually scored (see discovery.extract).
+Each is compressed (zstd when the `zstandard` package is installed, gzip
+otherwise) into a content-addressed blob under storage/snapshots/, so a page
+that many jobs or queries saw is stored once. The job's evidence directory
+gets a `snapshots.jsonl` manifest with one line per scored page.
+
+`rescore_pages` replays search_broker's decision over a search's pages with
+the current scoring code and thresholds, with no browser or network.
+Queries after a strong match were never run, so a stricter threshold can
+only be judged on the pages the search actually reached.
+
+Keep this module free of Playwright; re-scoring pool children import it.
+"""
+
+import gzip, hashlib, json, os, time
+from pathlib import Path
+from typing import Dict, List
+
+try:
+    import zstandard
+except ImportError:  # gzip only
+    zstandard = None
+
+from ..store import STORE_DIR
+from .extract import extract_regions
+from .scoring import MATCH_HITS, POTENTIAL_HITS, match_confidence, score_regions
+
+SNAPSHOTS_ENABLED = os.getenv("SNAPSHOTS", "0") == "1"
+SNAPSHOT_DIR = Path(os.getenv("SNAPSHOT_DIR", str(STORE_DIR / "snapshots")))
+MANIFEST = "snapshots.jsonl"
+
+
+def _blob_path(name: str) -> Path:
+    return SNAPSHOT_DIR / name[:2] / name
+
+
+def store_blob(data: bytes) -> str:
+    """Compress and store `data` once per content hash; returns the blob name"""
+    digest = hashlib.sha256(data).hexdigest()
+    for ext in ("zst", "gz"):
+        if _blob_path(f"{digest}.{ext}").exists():
+            return f"{digest}.{ext}"
+    if zstandard is not None:
+        name, packed = f"{digest}.zst", zstandard.ZstdCompressor(level=10).compress(data)
+    else:
+        name, packed = f"{digest}.gz", gzip.compress(data, compresslevel=6)
+    target = _blob_path(name)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_suffix(f".tmp{os.getpid()}")
+    tmp.write_bytes(packed)
+    os.replace(tmp, target)
+    return name
+
+
+def read_blob(name: str) -> bytes:
+    packed = _blob_path(name).read_bytes()
+    if name.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"snapshot {name} is zstd-compressed; install zstandard to read it")
+        return zstandard.ZstdDecompressor().decompress(packed)
+    return gzip.decompress(packed)
+
+
+def record_page(evidence_dir: str, domain: str, search_id: str, url: str, html, regions: dict):
+    """
+    Store one scored page and add it to the job's manifest. `html` is the
+    page's HTML or a callable returning it. Failures are logged, not raised,
+    so a full disk doesn't fail the search.
+    """
+    try:
+        entry = {
+            "domain": domain, "search": search_id, "url": url, "at": time.time(),
+            "html": store_blob((html() if callable(html) else html).encode("utf-8")),
+            "regions": store_blob(json.dumps(regions, sort_keys=True).encode("utf-8")),
+        }
+        os.makedirs(evidence_dir, exist_ok=True)
+        fd = os.open(os.path.join(evidence_dir, MANIFEST), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        try:
+            os.write(fd, (json.dumps(entry) + "\n").encode())
+        finally:
+            os.close(fd)
+    except Exception as e:
+        print(f"    ⚠️ Could not snapshot {url[:80]}: {e}")
+
+
+def load_manifest(evidence_dir) -> Dict[str, List[dict]]:
+    """domain -> pages of its latest search in this job, in the order they were scored"""
+    searches, latest = {}, {}
+    try:
+        with open(os.path.join(evidence_dir, MANIFEST), encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn last line
+                searches.setdefault(entry["search"], []).append(entry)
+                latest[entry["domain"]] = entry["search"]
+    except FileNotFoundError:
+        pass
+    return {domain: searches[search_id] for domain, search_id in latest.items()}
+
+
+def rescore_pages(pages: List[dict], pii: dict, reextract: bool = False) -> dict:
+    """
+    search_broker's verdict over stored pages: the best page's hits decide
+    found/confidence, and a strong match ends the search. reextract=True
+    re-derives the region text from the HTML instead of using what was scored.
+    """
+    found, confidence, max_hits, evidence_url = False, 0.0, 0, ""
+    for page in pages:
+        if reextract or not page.get("regions"):
+            regions = extract_regions(read_blob(page["html"]).decode("utf-8", "replace"))
+        else:
+            regions = json.loads(read_blob(page["regions"]))
+        verdict = score_regions(regions, page["url"], pii)
+        if not verdict["meaningful"] or verdict["hits"] <= max_hits:
+            continue
+        max_hits = verdict["hits"]
+        if max_hits >= POTENTIAL_HITS:
+            found, confidence, evidence_url = True, match_confidence(max_hits), page["url"]
+        if max_hits >= MATCH_HITS:
+            break
+    return {"found": found, "confidence": confidence, "max_hits": max_hits,
+            "evidence_url": evidence_url, "pages": len(pages)}
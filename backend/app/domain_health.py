@@ -0,0 +1,179 @@
+"""
+Adaptive per-domain deadlines and a circuit breaker for failing brokers.
+
+Every broker search records how long its navigations ("nav": page.goto until
+network idle) and post-submit waits ("settle") took, in per-domain latency
+histograms kept in `storage/domain_health.json`. Once a domain has
+MIN_SAMPLES observations its deadline becomes p95 x ADAPTIVE_TIMEOUT_FACTOR,
+clamped to [ADAPTIVE_TIMEOUT_MIN, ADAPTIVE_TIMEOUT_MAX]. Fast brokers stop
+waiting out the old fixed 10 s, and slow ones get enough time to finish.
+
+Queries that time out or error count against the domain's circuit breaker.
+BREAKER_THRESHOLD consecutive failures open it: the broker is skipped for
+BREAKER_COOLDOWN seconds, doubling on every re-trip. After the cooldown one
+trial search is let through (half-open). A success closes the breaker and a
+failure re-opens it.
+"""
+
+import os, time
+from typing import Dict, List, Optional
+
+from .politeness import normalize_domain
+from .session_archive import SESSION_ARCHIVE
+from .store import STORE_DIR, load_json, save_json, store_lock
+
+DOMAIN_HEALTH_JSON = STORE_DIR / "domain_health.json"
+
+DEFAULT_TIMEOUT_MS = 10000  # until a domain has enough samples
+TIMEOUT_MIN_MS = float(os.getenv("ADAPTIVE_TIMEOUT_MIN", "3")) * 1000
+TIMEOUT_MAX_MS = float(os.getenv("ADAPTIVE_TIMEOUT_MAX", "30")) * 1000
+TIMEOUT_FACTOR = float(os.getenv("ADAPTIVE_TIMEOUT_FACTOR", "2"))
+MIN_SAMPLES = 5
+BREAKER_THRESHOLD = int(os.getenv("BREAKER_THRESHOLD", "4"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "1800"))
+BREAKER_COOLDOWN_MAX = 24 * 3600
+
+# Upper bounds (ms) of the histogram buckets; the last one catches everything slower
+BUCKETS_MS = [250, 500, 1000, 2000, 3000, 5000, 7500, 10000, 15000, 20000, 30000, 60000]
+HISTOGRAM_CAP = 200  # counts are halved beyond this so the histogram follows recent behaviour
+KINDS = ("nav", "settle")
+
+
+def _empty() -> dict:
+    return {"nav": [0] * len(BUCKETS_MS), "settle": [0] * len(BUCKETS_MS),
+            "failures": 0, "trips": 0, "open_until": 0.0, "last_failure": None}
+
+
+def _observe(hist: List[int], ms: float):
+    idx = next((i for i, bound in enumerate(BUCKETS_MS) if ms <= bound), len(BUCKETS_MS) - 1)
+    hist[idx] += 1
+    if sum(hist) > HISTOGRAM_CAP:
+        hist[:] = [count // 2 for count in hist]
+
+
+def percentile(hist: List[int], q: float) -> Optional[float]:
+    total = sum(hist)
+    if not total:
+        return None
+    running = 0
+    for bound, count in zip(BUCKETS_MS, hist):
+        running += count
+        if running >= q * total:
+            return float(bound)
+    return float(BUCKETS_MS[-1])
+
+
+def timeout_ms(entry: dict, kind: str) -> int:
+    """Deadline for one navigation/wait of this kind on the entry's domain"""
+    hist = entry.get(kind) or []
+    if sum(hist) < MIN_SAMPLES:
+        return DEFAULT_TIMEOUT_MS
+    return int(min(TIMEOUT_MAX_MS, max(TIMEOUT_MIN_MS, percentile(hist, 0.95) * TIMEOUT_FACTOR)))
+
+
+def breaker_state(entry: dict, now: Optional[float] = None) -> str:
+    now = time.time() if now is None else now
+    if entry.get("open_until", 0) > now:
+        return "open"
+    return "half_open" if entry.get("trips") else "closed"
+
+
+def _record(entry: dict, ok: bool, now: float):
+    """Apply one query outcome to the breaker fields"""
+    if ok:
+        entry.update({"failures": 0, "trips": 0, "open_until": 0.0})
+        return
+    entry["failures"] += 1
+    entry["last_failure"] = now
+    if breaker_state(entry, now) == "half_open" or entry["failures"] >= BREAKER_THRESHOLD:
+        entry["trips"] += 1
+        entry["open_until"] = now + min(BREAKER_COOLDOWN_MAX, BREAKER_COOLDOWN * 2 ** (entry["trips"] - 1))
+        entry["failures"] = 0
+
+
+def summary(entry: dict) -> dict:
+    """Breaker state and current deadlines, for job items and the API"""
+    now = time.time()
+    return {
+        "state": breaker_state(entry, now),
+        "failures": entry.get("failures", 0),
+        "trips": entry.get("trips", 0),
+        "retry_in": round(max(0.0, entry.get("open_until", 0) - now)),
+        "nav_timeout_ms": timeout_ms(entry, "nav"),
+        "settle_timeout_ms": timeout_ms(entry, "settle"),
+        "nav_p50_ms": percentile(entry.get("nav") or [], 0.5),
+        "nav_p95_ms": percentile(entry.get("nav") or [], 0.95),
+        "samples": sum(entry.get("nav") or []),
+    }
+
+
+def load_health() -> Dict[str, dict]:
+    return load_json(DOMAIN_HEALTH_JSON, {})
+
+
+def entry_for(health: Dict[str, dict], domain: str) -> dict:
+    return {**_empty(), **health.get(normalize_domain(domain), {})}
+
+
+def health_summary(state: Optional[str] = None) -> Dict[str, dict]:
+    result = {}
+    for domain, entry in load_health().items():
+        info = summary({**_empty(), **entry})
+        if state is None or info["state"] == state:
+            result[domain] = info
+    return result
+
+
+class DomainSession:
+    """
+    One search's view of its domain: the deadlines to use, the breaker
+    decision, and the outcomes to fold back in with `save()`.
+    """
+
+    def __init__(self, domain: str):
+        self.domain = normalize_domain(domain)
+        # A replay starts from default deadlines and a closed breaker, and saves nothing
+        self.offline = SESSION_ARCHIVE.replaying
+        self.entry = _empty() if self.offline else entry_for(load_health(), self.domain)
+        self.nav_timeout_ms = timeout_ms(self.entry, "nav")
+        self.settle_timeout_ms = timeout_ms(self.entry, "settle")
+        self._samples = []   # (kind, ms)
+        self._outcomes = []  # (ok, at)
+
+    def allowed(self) -> bool:
+        return breaker_state(self.entry) != "open"
+
+    def observe(self, kind: str, seconds: float):
+        self._samples.append((kind, seconds * 1000))
+        _observe(self.entry[kind], seconds * 1000)
+
+    def success(self):
+        self._outcomes.append((True, time.time()))
+        _record(self.entry, True, time.time())
+
+    def failure(self, timed_out_kind: Optional[str] = None):
+        """A failed query; a timeout also counts as a sample at its deadline"""
+        if timed_out_kind:
+            self.observe(timed_out_kind, getattr(self, f"{timed_out_kind}_timeout_ms") / 1000)
+        self._outcomes.append((False, time.time()))
+        _record(self.entry, False, time.time())
+
+    @property
+    def tripped(self) -> bool:
+        return not self.allowed()
+
+    def save(self):
+        """Fold this search's samples and outcomes into the stored entry"""
+        if self.offline or not self.domain or not (self._samples or self._outcomes):
+            return
+        with store_lock():
+            health = load_health()
+            entry = entry_for(health, self.domain)
+            for kind, ms in self._samples:
+                _observe(entry[kind], ms)
+            for ok, at in self._outcomes:
+                _record(entry, ok, at)
+            health[self.domain] = entry
+            save_json(DOMAIN_HEALTH_JSON, health)
+        if breaker_state(entry) == "open":
+            print(f"    ⛔ {self.domain} circuit open for {summary(entry)['retry_in']}s after repeated failures")
@@ -0,0 +1,420 @@
+"""
+Per-broker discovery and removal steps shared by the API's in-process runner
+and the standalone queue workers (`python -m backend.app.worker`).
+
+Each step takes one broker and returns its item dict; `record_*_item`
+appends the item to the job's item log and folds it into the job record's
+counters under the store lock, so results from any number of threads or
+processes land in the same job.
+"""
+
+import copy, hashlib, json, os, time
+from typing import List, Optional
+
+from . import domain_health, item_log, outbox, yield_index
+from .broker_profiles import filter_brokers_by_profile
+from .cancellation import JobCancelled
+from .discovery.asset_cache import add_stats
+from .discovery.prefetch import NAV_COUNTERS, add_nav_stats
+from .politeness import normalize_domain
+from .singleflight import SingleFlight
+from .store import (
+    STORE_DIR, BROKERS_JSON, FINDINGS_JSON, PROFILES_JSON, REMOVALS_JSON,
+    get_job, load_json, update_job,
+)
+
+RATE_LIMIT_RETRIES = 2  # times a throttled broker goes back on the queue
+SEARCH_COALESCE_WINDOW = float(os.getenv("SEARCH_COALESCE_WINDOW", "120"))
+
+EMPTY_PROFILE = {"names": [], "emails": [], "phones": [], "addresses": []}
+
+# Identical broker searches from overlapping jobs share one browser run;
+# throttled or cancelled results are not handed to late arrivals
+SEARCHES = SingleFlight("search", window=SEARCH_COALESCE_WINDOW,
+                        keep=lambda res: not (res.get("rate_limited") or res.get("cancelled")))
+
+
+def load_profile(profile_id: str) -> Optional[dict]:
+    profiles = load_json(PROFILES_JSON, [])
+    return next((p for p in profiles if p.get("id") == profile_id), None)
+
+
+def select_discovery_brokers(scope: Optional[List[int]], broker_profile: str = "all_brokers") -> List[dict]:
+    """Catalog brokers for a discovery job after profile and scope filtering"""
+    brokers = load_json(BROKERS_JSON, [])
+    if broker_profile != "all_brokers":
+        brokers = filter_brokers_by_profile(brokers, broker_profile)
+    if scope:
+        brokers = [b for idx, b in enumerate(brokers) if idx in scope]
+    return brokers
+
+
+def select_removal_brokers(broker_ids: List[int]) -> List[tuple]:
+    """(broker_id, broker) pairs for the catalog indexes a removal job targets"""
+    brokers = load_json(BROKERS_JSON, [])
+    return [(bid, brokers[bid]) for bid in broker_ids if 0 <= bid < len(brokers)]
+
+
+def evidence_dir_for(job_id: str):
+    path = STORE_DIR / "evidence" / job_id
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def is_rate_limited(item: dict) -> bool:
+    return item.get("error") == "rate_limited" and not item.get("found")
+
+
+def search_key(broker: dict, profile: dict) -> tuple:
+    """Searches with equal keys run the same queries against the same page"""
+    pii = {k: profile.get(k) or [] for k in EMPTY_PROFILE}
+    digest = hashlib.sha1(json.dumps(pii, sort_keys=True).encode()).hexdigest()
+    return normalize_domain(broker.get("domain") or ""), broker.get("search_url") or "", digest
+
+
+def discover_broker(broker_id: int, broker: dict, profile: dict, evidence_dir: str, cancel=None) -> dict:
+    """
+    Search one broker and build the discovery item for it. The item of a
+    search cut short by `cancel` has `cancelled` set and should not be recorded.
+    A search for the same broker and PII that another job has running, or
+    finished within SEARCH_COALESCE_WINDOW seconds, is joined rather than
+    repeated; its item has `coalesced` set.
+    """
+    from .discovery.search_playwright import search_broker
+    started = time.monotonic()
+    try:
+        res, coalesced = SEARCHES.do(search_key(broker, profile),
+                                     lambda token: search_broker(broker, profile, str(evidence_dir), cancel=token),
+                                     cancel=cancel)
+        item = {
+            "broker_name": broker.get("name"),
+            "domain": broker.get("domain"),
+            "broker_id": broker_id,
+            "found": bool(res.get("found")),
+            "confidence": float(res.get("confidence") or 0.0),
+            "evidence_url": res.get("evidence_url"),
+            "screenshot_path": res.get("screenshot"),
+            "duration_s": round(time.monotonic() - started, 2),
+            "query_timeouts": res.get("query_timeouts", 0)
+        }
+        if res.get("browsers_recycled"):
+            item["browsers_recycled"] = res["browsers_recycled"]
+        if coalesced:
+            item["coalesced"] = True
+        elif res.get("asset_cache"):  # the job that ran the search reports its downloads
+            item["asset_cache"] = res["asset_cache"]
+        if res.get("navigation") and not coalesced:
+            item["navigation"] = res["navigation"]
+        if res.get("breaker"):
+            item["breaker"] = res["breaker"]
+        if res.get("cancelled"):
+            item["cancelled"] = True
+        elif res.get("circuit_open") and not res.get("found"):
+            item["error"] = "circuit_open"
+            if res.get("error") == "circuit_open":  # refused before any query ran
+                item["skipped"] = "circuit_open"
+        elif res.get("unreachable"):
+            item["error"] = "unreachable"
+            item["unreachable_reason"] = res["unreachable"]
+        elif res.get("rate_limited"):
+            item["error"] = "rate_limited"
+            item["retry_after"] = res.get("retry_after", 0)
+        return item
+    except JobCancelled:
+        return {"broker_name": broker.get("name"), "domain": broker.get("domain"), "broker_id": broker_id,
+                "found": False, "confidence": 0.0, "evidence_url": None, "cancelled": True}
+    except Exception as e:
+        print(f"❌ Error searching {broker.get('name', 'Unknown')}: {str(e)}")
+        return {
+            **({"cancelled": True} if cancel and cancel.cancelled else {}),
+            "broker_name": broker.get("name"),
+            "domain": broker.get("domain"),
+            "broker_id": broker_id,
+            "found": False,
+            "confidence": 0.0,
+            "evidence_url": None,
+            "error": str(e),
+            "duration_s": round(time.monotonic() - started, 2)
+        }
+
+
+def skipped_item(broker_id: int, broker: dict, reason: str) -> dict:
+    """Item for a broker the plan decided not to scan"""
+    return {
+        "broker_name": broker.get("name"),
+        "domain": broker.get("domain"),
+        "broker_id": broker_id,
+        "found": False,
+        "confidence": 0.0,
+        "evidence_url": None,
+        "skipped": reason
+    }
+
+
+def unreachable_item(broker_id: int, broker: dict, entry: dict) -> dict:
+    """Item for a broker that pre-flight triage could not reach"""
+    return {**skipped_item(broker_id, broker, "unreachable"), "error": "unreachable",
+            "unreachable_reason": entry.get("reason"), "http_status": entry.get("http_status")}
+
+
+def circuit_open_item(broker_id: int, broker: dict, entry: dict) -> dict:
+    """Item for a broker whose circuit breaker is open"""
+    return {**skipped_item(broker_id, broker, "circuit_open"), "error": "circuit_open",
+            "breaker": domain_health.summary(entry)}
+
+
+def plan_discovery(brokers: List[dict], order: str = "catalog", skip_barren: bool = False,
+                   reachability: Optional[dict] = None):
+    """
+    (broker_id, broker) tasks to scan, in scan order, plus items for the
+    brokers skipped as barren, with an open circuit breaker or, given a triage
+    cache, unreachable. Brokers triaged as degraded go last.
+    broker_id stays the catalog-selection index.
+    """
+    to_scan, skipped = yield_index.plan_brokers(list(enumerate(brokers)), order, skip_barren)
+    items = [skipped_item(i, b, "barren_broker") for i, b in skipped]
+    health, closed = domain_health.load_health(), []
+    for i, b in to_scan:
+        entry = domain_health.entry_for(health, b.get("domain") or b.get("search_url") or "")
+        if domain_health.breaker_state(entry) == "open":
+            items.append(circuit_open_item(i, b, entry))
+        else:
+            closed.append((i, b))
+    to_scan = closed
+    if reachability is None:
+        return to_scan, items
+    from .triage import fresh_entry
+    reachable, degraded = [], []
+    for i, b in to_scan:
+        entry = fresh_entry(reachability, b) or {}
+        if entry.get("status") == "unreachable":
+            items.append(unreachable_item(i, b, entry))
+        elif entry.get("status") == "degraded":
+            degraded.append((i, b))
+        else:
+            reachable.append((i, b))
+    return reachable + degraded, items
+
+
+def is_form_broker(broker: dict) -> bool:
+    return broker.get("method", "email").lower() == "form" and bool(broker.get("optout_url"))
+
+
+def remove_broker(broker_id: int, broker: dict, profile: dict, cancel=None) -> dict:
+    """Run the removal connector that fits one broker and build its item"""
+    try:
+        # Create drafts directory
+        drafts_dir = STORE_DIR / "drafts"
+        drafts_dir.mkdir(exist_ok=True)
+
+        # Determine removal method based on broker data
+        method = broker.get("method", "email").lower()
+        result = {"broker_name": broker.get("name"), "broker_id": broker_id, "method": method}
+
+        if method == "email" or not broker.get("optout_url"):
+            # Use AI-powered email generation
+            from .removal.connectors.email_generic import EmailGeneric
+            connector = EmailGeneric(broker, profile, cancel=cancel)
+            result.update(connector.submit())
+
+        elif is_form_broker(broker):
+            # Use form automation
+            from .removal.connectors.form_generic import GenericForm
+            connector = GenericForm(broker, profile, cancel=cancel)
+            result.update(connector.submit())
+
+        else:
+            # Manual process required
+            result.update({
+                "status": "manual_required",
+                "transcript": f"Manual removal required for {broker.get('name')}. Check broker requirements.",
+                "evidence_path": None
+            })
+
+        print(f"Processed removal for {broker.get('name')}: {result.get('status')}")
+        return result
+
+    except Exception as e:
+        print(f"Error processing removal for {broker.get('name')}: {e}")
+        return {
+            "broker_name": broker.get("name"),
+            "broker_id": broker_id,
+            "method": "error",
+            "status": "error",
+            "transcript": f"Error: {str(e)}",
+            "evidence_path": None
+        }
+
+
+def remove_form_brokers(brokers: List[tuple], profile: dict, on_item, cancel=None):
+    """
+    Submit opt-out forms for many (broker_id, broker) pairs through one browser
+    with pooled contexts, calling `on_item` with each finished item.
+    """
+    from .removal.connectors.form_batch import submit_forms
+    def _done(broker_id, broker, result):
+        item = {"broker_name": broker.get("name"), "broker_id": broker_id, "method": "form", **result}
+        print(f"Processed removal for {broker.get('name')}: {item.get('status')} in {item.get('duration_s')}s")
+        on_item(item)
+    submit_forms(brokers, profile, _done, cancel=cancel)
+
+
+def _merge_item(job: dict, item: dict):
+    # Jobs recorded before item logs keep their items in the record.
+    # Replace rather than append so a task retried after a lost lease stays single
+    items = [it for it in job.get("items", []) if it.get("broker_id") != item.get("broker_id")]
+    items.append(item)
+    items.sort(key=lambda it: it["broker_id"])
+    job["items"] = items
+    total = max(1, job.get("total_brokers") or len(job.get("broker_ids", [])) or len(items))
+    job["progress"] = int((len(items) / total) * 100)
+
+
+def item_tally(item: dict) -> dict:
+    """Counters an item contributes to its job record"""
+    return {
+        "found": int(bool(item.get("found"))),
+        "errors": int(bool(item.get("error"))),
+        "skipped": int(bool(item.get("skipped"))),
+        "coalesced": int(bool(item.get("coalesced"))),
+        "circuit_open": int(item.get("error") == "circuit_open"),
+    }
+
+
+def _record_item(path, job_id: str, item: dict, previous: Optional[dict] = None, on_merge=None) -> dict:
+    """
+    Append the item to the job's item log and fold it into the record's
+    counters (`items_done`, `tally`, `progress`). An item for a broker
+    already in the log replaces that earlier version, whose counters are
+    taken back out. JobCache may replay update functions, so only the first
+    run appends to the log. Returns the item as stamped with its revision.
+    """
+    if previous is None:
+        previous = item_log.get_item(path, job_id, item["broker_id"])
+    appended = []
+
+    def _merge(job):
+        stamped = {**item, "revision": job["revision"]}
+        if "items" in job:
+            _merge_item(job, stamped)
+            return stamped
+        if not appended:
+            item_log.append(path, job_id, stamped)
+            appended.append(True)
+        tally = job.setdefault("tally", {})
+        for key, value in item_tally(item).items():
+            tally[key] = tally.get(key, 0) + value - (item_tally(previous)[key] if previous else 0)
+        if previous is None:
+            job["items_done"] = job.get("items_done", 0) + 1
+        total = max(1, job.get("total_brokers") or len(job.get("broker_ids", [])) or job["items_done"])
+        job["progress"] = int((job["items_done"] / total) * 100)
+        if on_merge:
+            on_merge(job, stamped, previous)
+        return stamped
+
+    return update_job(path, job_id, _merge)
+
+
+def update_item(path, job_id: str, broker_id: int, fn):
+    """
+    Apply `fn(item)` to a broker's latest item and record the new version.
+    Returns (previous, updated), or (None, None) if the broker has no item.
+    """
+    job = get_job(path, job_id) or {}
+    if "items" in job:
+        def _legacy(job):
+            for item in job["items"]:
+                if item.get("broker_id") == broker_id:
+                    previous = copy.deepcopy(item)
+                    fn(item)
+                    item["revision"] = job["revision"]
+                    return previous, item
+            return None, None
+        return update_job(path, job_id, _legacy)
+    previous = item_log.get_item(path, job_id, broker_id)
+    if previous is None:
+        return None, None
+    updated = copy.deepcopy(previous)
+    fn(updated)
+    return previous, _record_item(path, job_id, updated, previous,
+                                   _discovery_totals if path == FINDINGS_JSON else None)
+
+
+def _discovery_totals(job: dict, item: dict, replaced: Optional[dict]):
+    tally = job["tally"]
+    job["coalesced_searches"] = tally.get("coalesced", 0)
+    job["circuit_open"] = tally.get("circuit_open", 0)
+    totals = job.get("asset_cache", {})
+    if item.get("asset_cache"):
+        totals = add_stats(totals, item["asset_cache"])
+    if replaced and replaced.get("asset_cache"):
+        totals = add_stats(totals, {k: -v for k, v in replaced["asset_cache"].items() if k != "hit_rate"})
+    if totals:
+        job["asset_cache"] = totals
+    navigation = job.get("navigation", {})
+    if item.get("navigation"):
+        navigation = add_nav_stats(navigation, item["navigation"])
+    if replaced and replaced.get("navigation"):
+        navigation = add_nav_stats(navigation, {k: -replaced["navigation"].get(k, 0) for k in NAV_COUNTERS})
+    if navigation:
+        job["navigation"] = navigation
+    if job.get("started_at"):  # throughput of the brokers actually scanned so far
+        scanned = job["items_done"] - job.get("skipped_brokers", 0)
+        elapsed = time.time() - float(job["started_at"])
+        job["brokers_per_min"] = round(scanned / elapsed * 60, 1) if elapsed > 0 else 0.0
+
+
+
+def record_discovery_item(job_id: str, item: dict):
+    _record_item(FINDINGS_JSON, job_id, item, on_merge=_discovery_totals)
+    if not item.get("coalesced"):  # the job that ran the search already counted it
+        yield_index.record_scan(item)
+
+
+def record_removal_item(job_id: str, item: dict):
+    _record_item(REMOVALS_JSON, job_id, item)
+    if item.get("outbox_id"):
+        outbox.link(item["outbox_id"], job_id, item["broker_id"])
+
+
+def mark_running(path, job_id: str):
+    started_at = time.time()
+    def _start(job):
+        if job.get("status") == "queued":
+            job["status"] = "running"
+            job.setdefault("started_at", started_at)
+    update_job(path, job_id, _start)
+
+
+def mark_completed(path, job_id: str):
+    def _complete(job):
+        if job.get("status") in ("queued", "running"):
+            job["status"] = "completed"
+    update_job(path, job_id, _complete)
+
+
+def request_cancel(path, job_id: str) -> bool:
+    """Flag a queued or running job as cancelled. False if it already finished."""
+    requested_at = time.time()
+    def _cancel(job):
+        if job.get("status") in ("queued", "running"):
+            job["status"] = "cancelled"
+            job["cancel_requested_at"] = requested_at
+            return True
+        return False
+    return update_job(path, job_id, _cancel)
+
+
+def mark_cancel_released(path, job_id: str):
+    """
+    Stamp when a runner of a cancelled job let go of its brokers. With several
+    runners the latest stamp wins, so cancel_latency_s covers the slowest one.
+    """
+    released_at = time.time()
+    def _released(job):
+        if job.get("status") != "cancelled":
+            return
+        job["released_at"] = max(released_at, job.get("released_at") or 0)
+        if job.get("cancel_requested_at"):
+            job["cancel_latency_s"] = round(job["released_at"] - job["cancel_requested_at"], 3)
+    update_job(path, job_id, _released)
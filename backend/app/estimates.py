@@ -0,0 +1,85 @@
+"""
+Time estimates from measured scan durations.
+
+Per-domain search durations already accumulate in the yield index. Broker
+profile estimates add up those durations for the brokers actually present in
+the catalog. A running job's ETA uses its own observed throughput once a few
+brokers have finished, and the historical per-broker mean before that.
+"""
+
+import time
+from typing import Dict, List, Optional
+
+from . import item_log, yield_index
+from .broker_profiles import BROKER_PROFILES, filter_brokers_by_profile
+
+MIN_OBSERVED = 3  # finished brokers before a job's own throughput replaces history
+
+
+def broker_seconds(broker: dict, index: Dict[str, dict]) -> float:
+    return yield_index.avg_seconds(yield_index.entry_for(index, broker.get("domain")))
+
+
+def mean_broker_seconds(brokers: List[dict], index: Optional[Dict[str, dict]] = None) -> float:
+    if not brokers:
+        return yield_index.DEFAULT_SECONDS
+    index = yield_index.load_index() if index is None else index
+    return sum(broker_seconds(b, index) for b in brokers) / len(brokers)
+
+
+def format_duration(seconds: float) -> str:
+    if seconds < 90:
+        n = round(seconds)
+        return "1 second" if n == 1 else f"{n} seconds"
+    if seconds < 90 * 60:
+        return f"{round(seconds / 60)} minutes"
+    return f"{seconds / 3600:.1f} hours"
+
+
+def profile_estimates(catalog: List[dict], workers: int) -> Dict[str, dict]:
+    """Broker count and wall-clock estimate of every profile against the current catalog"""
+    index = yield_index.load_index()
+    estimates = {}
+    for name in BROKER_PROFILES:
+        brokers = filter_brokers_by_profile(catalog, name)
+        seconds = sum(broker_seconds(b, index) for b in brokers) / max(1, workers)
+        measured = sum(1 for b in brokers if yield_index.entry_for(index, b.get("domain"))["timed_scans"])
+        estimates[name] = {
+            "broker_count": len(brokers),
+            "estimated_seconds": round(seconds),
+            "estimated_time": format_duration(seconds),
+            "measured_brokers": measured,
+        }
+    return estimates
+
+
+def job_eta(job: dict, workers: int, now: Optional[float] = None) -> Optional[dict]:
+    """Live progress figures for a queued or running job; None once it has finished"""
+    if job.get("status") not in ("queued", "running"):
+        return None
+    now = now or time.time()
+    done = item_log.items_done(job)
+    total = job.get("total_brokers") or len(job.get("broker_ids", [])) or done
+    remaining = max(0, total - done)
+    if "items" in job:
+        skipped = sum(1 for it in job["items"] if it.get("skipped"))
+    else:
+        skipped = job.get("tally", {}).get("skipped", 0)
+    finished = done - skipped
+    elapsed = now - job["started_at"] if job.get("started_at") else 0.0
+    per_minute = finished / elapsed * 60 if elapsed > 0 and finished else None
+
+    if per_minute and finished >= MIN_OBSERVED:
+        remaining_s, basis = remaining / per_minute * 60, "observed"
+    else:
+        per_broker = job.get("history_s_per_broker") or yield_index.DEFAULT_SECONDS
+        remaining_s, basis = remaining * per_broker / max(1, workers), "history"
+    return {
+        "elapsed_s": round(elapsed, 1),
+        "brokers_per_minute": round(per_minute, 2) if per_minute else None,
+        "remaining_brokers": remaining,
+        "remaining_s": round(remaining_s),
+        "remaining_time": format_duration(remaining_s),
+        "eta": round(now + remaining_s),
+        "basis": basis,
+    }
@@ -0,0 +1,128 @@
+"""
+Bulk exports of discovery findings and removal history across jobs.
+
+Rows are produced one job at a time. Each row holds the job's metadata plus
+one item, and the items are streamed from the job's item log with
+`iter_job_items` (without filling the shared offset-index cache), so memory
+doesn't grow with history. The encoded output is yielded in CHUNK_BYTES
+pieces for a chunked StreamingResponse. Job records carry no per-item
+timestamps, so the date range applies to when the job was created (or
+started, for discovery jobs from before `created_at` was recorded).
+"""
+
+import csv, io, json
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator, Optional
+
+from . import item_log
+
+CHUNK_BYTES = 64 * 1024
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+JOB_COLUMNS = ["job_id", "profile_id", "job_created_at", "job_status"]
+FINDING_COLUMNS = JOB_COLUMNS + ["broker_profile", "broker_id", "broker_name", "domain", "found", "confidence",
+                                 "evidence_url", "screenshot_path", "duration_s", "error", "skipped", "coalesced",
+                                 "marked_false_positive", "verified_positive"]
+REMOVAL_COLUMNS = JOB_COLUMNS + ["broker_id", "broker_name", "method", "status", "duration_s", "evidence_path",
+                                 "transcript"]
+
+
+def parse_time(value: Optional[str]) -> Optional[float]:
+    """Epoch seconds from epoch seconds or an ISO date/datetime (UTC unless it says otherwise)"""
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"not a timestamp or ISO date: {value!r}")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def job_time(job: dict) -> Optional[float]:
+    for key in ("created_at", "started_at"):
+        try:
+            return float(job[key])
+        except (KeyError, TypeError, ValueError):
+            continue
+    return None
+
+
+def iter_rows(path: Path, jobs: dict, since: Optional[float] = None, until: Optional[float] = None,
+              profile_id: Optional[str] = None, broker_id: Optional[int] = None, domain: Optional[str] = None,
+              found_only: bool = False, status: Optional[str] = None) -> Iterator[dict]:
+    """
+    Matching items of `jobs` (job_id -> record without items), oldest job
+    first, each with the job's metadata in front
+    """
+    dated = []
+    for job_id, job in jobs.items():
+        at = job_time(job)
+        if since is not None and (at is None or at < since):
+            continue
+        if until is not None and (at is None or at >= until):
+            continue
+        if profile_id is not None and job.get("profile_id") != profile_id:
+            continue
+        dated.append((at or 0.0, job_id))
+    domain = domain.lower() if domain else None
+
+    for at, job_id in sorted(dated):
+        job = jobs[job_id]
+        meta = {"job_id": job_id, "profile_id": job.get("profile_id"),
+                "job_created_at": datetime.fromtimestamp(at, timezone.utc).isoformat() if at else None,
+                "job_status": job.get("status")}
+        if "broker_profile" in job:
+            meta["broker_profile"] = job["broker_profile"]
+        for item in item_log.iter_job_items(path, job_id, job, cached=False):
+            if broker_id is not None and item.get("broker_id") != broker_id:
+                continue
+            if domain and (item.get("domain") or "").lower() != domain:
+                continue
+            if found_only and (not item.get("found") or item.get("marked_false_positive")):
+                continue
+            if status is not None and item.get("status") != status:
+                continue
+            yield {**meta, **item}
+
+
+def _chunked(pieces: Iterator[str]) -> Iterator[bytes]:
+    buf, size = [], 0
+    for piece in pieces:
+        buf.append(piece)
+        size += len(piece)
+        if size >= CHUNK_BYTES:
+            yield "".join(buf).encode()
+            buf, size = [], 0
+    if buf:
+        yield "".join(buf).encode()
+
+
+def _ndjson(rows: Iterator[dict]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(row, default=str) + "\n"
+
+
+def _csv(rows: Iterator[dict], columns: list) -> Iterator[str]:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    for row in rows:
+        # Nested values (breaker, asset_cache, ...) go into their cell as JSON
+        writer.writerow([json.dumps(v) if isinstance(v, (dict, list)) else v
+                         for v in (row.get(c) for c in columns)])
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
+    yield out.getvalue()
+
+
+def encode(rows: Iterator[dict], fmt: str, columns: list) -> Iterator[bytes]:
+    """CSV (fixed columns) or NDJSON (every field) bytes for `rows`, in CHUNK_BYTES pieces"""
+    return _chunked(_csv(rows, columns) if fmt == "csv" else _ndjson(rows))
@@ -0,0 +1,163 @@
+"""
+Append-only per-job item logs.
+
+Job records used to carry their `items` list, so a full-catalog scan kept
+every item in memory, deep-copied the growing record on each update and
+rewrote all of it to disk after every broker. Items are now streamed to
+`storage/items/<job file>/<job_id>.jsonl`, one line per item version, and the
+job record keeps only counters. When a broker has several lines (a retried
+task, user feedback), the last one wins. Each process keeps a broker_id ->
+offset index per log, brought up to date by reading only what other writers
+appended since it last looked.
+
+Jobs created before the log existed still have `items` in their record;
+`job_items` and `iter_job_items` fall back to it.
+"""
+
+import json, os, threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from .store import STORE_DIR
+
+ITEMS_DIR = STORE_DIR / "items"
+INDEX_CACHE_SIZE = 64  # logs whose offset index stays in memory
+JSON_CHUNK_SIZE = 64 * 1024
+
+_indexes = OrderedDict()  # log path -> {"offsets": {broker_id: offset}, "size": bytes indexed}
+_index_lock = threading.Lock()
+
+
+def log_path(path: Path, job_id: str) -> Path:
+    return ITEMS_DIR / path.stem / f"{job_id}.jsonl"
+
+
+def append(path: Path, job_id: str, item: dict):
+    """Append one item version; a single O_APPEND write, so concurrent writers don't interleave"""
+    target = log_path(path, job_id)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    line = (json.dumps(item, separators=(",", ":")) + "\n").encode()
+    fd = os.open(target, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+def _refresh(target: Path) -> dict:
+    """The log's offset index, extended by whatever was appended since last time (call under _index_lock)"""
+    index = _indexes.pop(target, None) or {"offsets": {}, "size": 0}
+    _indexes[target] = index
+    while len(_indexes) > INDEX_CACHE_SIZE:
+        _indexes.popitem(last=False)
+    return _extend(target, index)
+
+
+def _extend(target: Path, index: dict) -> dict:
+    try:
+        with open(target, "rb") as fh:
+            fh.seek(index["size"])
+            offset = index["size"]
+            for line in fh:
+                if not line.endswith(b"\n"):
+                    break  # still being written; pick it up next time
+                try:
+                    index["offsets"][json.loads(line)["broker_id"]] = offset
+                except (ValueError, KeyError):
+                    pass
+                offset += len(line)
+            index["size"] = offset
+    except FileNotFoundError:
+        pass
+    return index
+
+
+def offsets(path: Path, job_id: str) -> Dict[int, int]:
+    """broker_id -> byte offset of its latest line, for the log as it is now"""
+    with _index_lock:
+        return dict(_refresh(log_path(path, job_id))["offsets"])
+
+
+def iter_items(path: Path, job_id: str, cached: bool = True) -> Iterator[dict]:
+    """
+    Latest version of each item, by broker_id, read back one at a time.
+    Memory stays at one offset per broker however large the items are.
+    cached=False indexes the log without keeping the index, so a sweep over
+    many old jobs doesn't push the active ones out of the cache.
+    """
+    if cached:
+        latest = offsets(path, job_id)
+    else:
+        latest = _extend(log_path(path, job_id), {"offsets": {}, "size": 0})["offsets"]
+    if not latest:
+        return
+    with open(log_path(path, job_id), "rb") as fh:
+        for broker_id in sorted(latest):
+            fh.seek(latest[broker_id])
+            yield json.loads(fh.readline())
+
+
+def read_items(path: Path, job_id: str) -> List[dict]:
+    return list(iter_items(path, job_id))
+
+
+def get_item(path: Path, job_id: str, broker_id: int) -> Optional[dict]:
+    with _index_lock:
+        offset = _refresh(log_path(path, job_id))["offsets"].get(broker_id)
+    if offset is None:
+        return None
+    with open(log_path(path, job_id), "rb") as fh:
+        fh.seek(offset)
+        return json.loads(fh.readline())
+
+
+def iter_job_items(path: Path, job_id: str, job: dict, cached: bool = True) -> Iterator[dict]:
+    if "items" in job:  # recorded before item logs
+        return iter(job["items"])
+    return iter_items(path, job_id, cached)
+
+
+def job_items(path: Path, job_id: str, job: dict) -> List[dict]:
+    return list(iter_job_items(path, job_id, job))
+
+
+def iter_job_items_json(path: Path, job_id: str, job: dict, chunk_size: int = JSON_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    The job's items as a JSON array, in chunks of about `chunk_size` bytes,
+    copied from the log's lines one at a time without decoding them.
+    """
+    if "items" in job:
+        yield json.dumps(job["items"]).encode()
+        return
+    target = log_path(path, job_id)
+    latest = offsets(path, job_id)
+    chunk = [b"["]
+    size = 0
+    try:
+        with open(target, "rb") as fh:
+            for n, broker_id in enumerate(sorted(latest)):
+                fh.seek(latest[broker_id])
+                line = fh.readline().rstrip(b"\n")
+                chunk.append(b"," + line if n else line)
+                size += len(line)
+                if size >= chunk_size:
+                    yield b"".join(chunk)
+                    chunk, size = [], 0
+    except FileNotFoundError:  # deleted while being read
+        pass
+    chunk.append(b"]")
+    yield b"".join(chunk)
+
+
+def items_done(job: dict) -> int:
+    return len(job["items"]) if "items" in job else job.get("items_done", 0)
+
+
+def delete(path: Path, job_id: str):
+    with _index_lock:
+        _indexes.pop(log_path(path, job_id), None)
+    try:
+        log_path(path, job_id).unlink()
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,142 @@
+"""
+In-process, write-behind cache for a JSON job file.
+
+The API process keeps every job record in memory, so status reads never touch
+the job file. (Items live in per-job logs, which handlers read in the
+threadpool.) Updates are applied to the cached record immediately and queued as
+operations; a background flusher replays them onto the file under the store
+lock and reloads the merged result. Replaying operations rather than writing
+the cached copy keeps updates made by queue workers in other processes,
+which write the file directly. The flusher also picks up those external
+writes by watching the file's mtime.
+
+Cached records are replaced, never mutated, so a record handed to a response
+stays consistent while it is serialized. Update functions may run twice (on
+the cache and on disk), so they must not have side effects beyond the job.
+"""
+
+import copy, os, threading
+from pathlib import Path
+
+from .store import load_json, save_json, store_lock
+
+FLUSH_INTERVAL = float(os.getenv("JOB_CACHE_FLUSH_INTERVAL", "0.5"))
+
+
+class JobCache:
+    def __init__(self, path: Path, flush_interval: float = FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()  # one flush at a time keeps ops in order
+        self._jobs = None
+        self._pending = []  # ("create", job_id, job) | ("update", job_id, fn)
+        self._mtime = None
+        self._wake = threading.Event()
+        self._thread = None
+
+    # -- reads -------------------------------------------------------------
+
+    def _loaded(self) -> dict:
+        if self._jobs is None:
+            self._reload()
+        return self._jobs
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._loaded().get(job_id)
+
+    def all(self) -> dict:
+        with self._lock:
+            return dict(self._loaded())
+
+    def __contains__(self, job_id: str) -> bool:
+        return self.get(job_id) is not None
+
+    # -- writes ------------------------------------------------------------
+
+    def create(self, job_id: str, job: dict):
+        with self._lock:
+            self._loaded()[job_id] = job
+            self._pending.append(("create", job_id, copy.deepcopy(job)))
+        self.start()
+        self._wake.set()
+
+    def update(self, job_id: str, fn):
+        """Same contract as store.update_job; persisted asynchronously"""
+        with self._lock:
+            job = copy.deepcopy(self._loaded()[job_id])
+            job["revision"] = job.get("revision", 0) + 1
+            result = fn(job)
+            self._jobs[job_id] = job
+            self._pending.append(("update", job_id, fn))
+        self.start()
+        self._wake.set()
+        return result
+
+    # -- persistence -------------------------------------------------------
+
+    def _file_mtime(self):
+        try:
+            return self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _reload(self):
+        self._jobs = load_json(self.path, {})
+        self._mtime = self._file_mtime()
+
+    def flush(self):
+        """Replay queued operations onto the file and refresh from the merged result"""
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+            external_change = self._jobs is not None and self._file_mtime() != self._mtime
+        if not batch and not external_change:
+            return
+        with store_lock():
+            jobs = load_json(self.path, {})
+            for op, job_id, arg in batch:
+                if op == "create":
+                    jobs[job_id] = arg
+                elif job_id in jobs:
+                    jobs[job_id]["revision"] = jobs[job_id].get("revision", 0) + 1
+                    try:
+                        arg(jobs[job_id])
+                    except Exception as e:
+                        print(f"⚠️ Job cache could not persist update to {job_id}: {e}")
+            if batch:
+                save_json(self.path, jobs)
+            mtime = self._file_mtime()
+        with self._lock:
+            # Operations queued while we were writing still apply on top
+            for op, job_id, arg in self._pending:
+                if op == "create":
+                    jobs[job_id] = copy.deepcopy(arg)
+                elif job_id in jobs:
+                    job = copy.deepcopy(jobs[job_id])
+                    job["revision"] = job.get("revision", 0) + 1
+                    arg(job)
+                    jobs[job_id] = job
+            self._jobs = jobs
+            self._mtime = mtime
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ Job cache flush failed for {self.path.name}: {e}")
+
+    def start(self):
+        """Load the file and start the background flusher (idempotent)"""
+        with self._lock:
+            self._loaded()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"job-cache-{self.path.stem}", daemon=True)
+                self._thread.start()
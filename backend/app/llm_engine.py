@@ -1,40 +1,87 @@
 
-import os, subprocess, json, requests
+import os, signal, subprocess, json, threading
 
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1:8b")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+# What the runners return instead of text when generation failed
+LLM_ERROR_MARKERS = ("[ollama error]", "[openai error]", "[openai fallback disabled]", "[empty]", "[cancelled]")
 
-def run_ollama(prompt: str, model: str = None):
+def _kill_group(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+def run_ollama(prompt: str, model: str = None, cancel=None):
     model = model or OLLAMA_MODEL
     try:
-        res = subprocess.run(["ollama", "run", model],
-                             input=prompt.encode("utf-8"),
-                             capture_output=True, timeout=90)
-        out = (res.stdout or b"").decode("utf-8", "ignore")
+        proc = subprocess.Popen(["ollama", "run", model], stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True)
+        # Killing the process group is how a cancelled job aborts generation
+        kill = lambda: _kill_group(proc)
+        unregister = cancel.on_cancel(kill) if cancel else (lambda: None)
+        try:
+            stdout, _ = proc.communicate(prompt.encode("utf-8"), timeout=90)
+        except subprocess.TimeoutExpired:
+            kill()
+            proc.communicate()
+            raise
+        finally:
+            unregister()
+        if cancel and cancel.cancelled:
+            return "[Ollama error] cancelled"
+        out = (stdout or b"").decode("utf-8", "ignore")
         return out.strip() or "[empty]"
     except Exception as e:
         return f"[Ollama error] {e}"
 
-def run_openai(prompt: str, model: str = None):
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        return "[OpenAI fallback disabled]"
+def _post_openai(prompt: str, model: str, api_key: str) -> str:
     try:
         import requests
-        model = model or OPENAI_MODEL
         r = requests.post("https://api.openai.com/v1/chat/completions",
                           headers={"Authorization": f"Bearer {api_key}"},
                           json={"model": model,
                                 "messages":[{"role":"user","content": prompt}],
-                                "temperature":0})
+                                "temperature":0},
+                          timeout=60)
         r.raise_for_status()
         j = r.json()
         return j["choices"][0]["message"]["content"].strip()
     except Exception as e:
         return f"[OpenAI error] {e}"
 
-def smart_llm(prompt: str):
-    out = run_ollama(prompt)
+def run_openai(prompt: str, model: str = None, cancel=None):
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        return "[OpenAI fallback disabled]"
+    model = model or OPENAI_MODEL
+    # A blocking HTTP call can't be interrupted, so it runs on its own thread and a
+    # cancelled job stops waiting for it; the abandoned request ends at its timeout
+    result, done = {}, threading.Event()
+    def _call():
+        result["out"] = _post_openai(prompt, model, api_key)
+        done.set()
+    threading.Thread(target=_call, daemon=True).start()
+    unregister = cancel.on_cancel(done.set) if cancel else (lambda: None)
+    try:
+        done.wait()
+    finally:
+        unregister()
+    if cancel and cancel.cancelled:
+        return "[OpenAI error] cancelled"
+    return result["out"]
+
+def smart_llm(prompt: str, cancel=None):
+    out = run_ollama(prompt, cancel=cancel)
+    if cancel and cancel.cancelled:
+        return "[cancelled]"
     if out.lower().startswith("[ollama error]") or out.strip() == "[empty]":
-        return run_openai(prompt)
+        out = run_openai(prompt, cancel=cancel)
+        if cancel and cancel.cancelled:
+            return "[cancelled]"
     return out
+
+def llm_failed(out: str) -> bool:
+    """True when smart_llm produced an error marker or nothing at all"""
+    text = (out or "").strip().lower()
+    return not text or text.startswith(LLM_ERROR_MARKERS)
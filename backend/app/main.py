@@ -1,32 +1,72 @@
 \
-import os, json, uuid, threading, time
+import os, json, uuid, threading, tempfile, time
+from contextlib import asynccontextmanager, nullcontext
 from pathlib import Path
-from typing import List, Optional, Union
-from fastapi import FastAPI, UploadFile, File, Form
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Union
+import hashlib
+from fastapi import FastAPI, UploadFile, File, Form, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 
 # Import broker profiles
 from .broker_profiles import (
     get_broker_profiles, 
     get_profile_by_name, 
-    filter_brokers_by_profile, 
-    get_profile_recommendations
+    get_profile_recommendations,
+    get_profile_priority
 )
 
-APP_DIR = Path(__file__).resolve().parent
-DATA_DIR = APP_DIR.parent.parent / "data"
-STORE_DIR = APP_DIR.parent.parent / "storage"
-STORE_DIR.mkdir(exist_ok=True)
-
-BROKERS_FILE = DATA_DIR / "brokers_normalized.csv"
-BROKERS_JSON = STORE_DIR / "brokers.json"
-FINDINGS_JSON = STORE_DIR / "findings.json"
-PROFILES_JSON = STORE_DIR / "profiles.json"
-REMOVALS_JSON = STORE_DIR / "removals.json"
-
-app = FastAPI(title="Local Data Removal API")
+from .store import (
+    DATA_DIR, STORE_DIR,
+    BROKERS_FILE, BROKERS_JSON, FINDINGS_JSON, PROFILES_JSON, REMOVALS_JSON,
+    load_json, save_json, update_job, store_lock, register_cache,
+)
+from .engine import (
+    RATE_LIMIT_RETRIES, EMPTY_PROFILE,
+    load_profile, select_discovery_brokers, select_removal_brokers, evidence_dir_for,
+    discover_broker, remove_broker, is_rate_limited, plan_discovery,
+    record_discovery_item, record_removal_item, mark_completed, request_cancel, mark_cancel_released,
+    is_form_broker, remove_form_brokers, update_item, SEARCHES,
+)
+from .job_cache import JobCache
+from .scheduler import FairScheduler, job_weight
+from .estimates import job_eta, mean_broker_seconds, profile_estimates
+from .triage import load_reachability, triage_brokers, triage_summary
+from .browser_state import list_states, reset_state
+from .domain_health import health_summary
+from .memory_probe import MEMORY_PROFILE, MemorySampler
+from .profiling import JobProfiler, RequestProfiler
+from .discovery import scoring
+from . import cancellation, exports, item_log, outbox, profiling, rescore, retention, task_queue, yield_index
+
+DISCOVERY_WORKERS = int(os.getenv("DISCOVERY_WORKERS", "3"))
+MAX_PAGE_SIZE = 500
+ETA_REFRESH_SECONDS = 10  # how long a cached status with an ETA stays fresh
+
+# Local discovery jobs share these workers, interleaved by broker-profile priority
+SCHEDULER = FairScheduler(DISCOVERY_WORKERS)
+
+# Job state is served from memory; the caches persist updates in the background
+FINDINGS = JobCache(FINDINGS_JSON)
+REMOVALS = JobCache(REMOVALS_JSON)
+register_cache(FINDINGS_JSON, FINDINGS)
+register_cache(REMOVALS_JSON, REMOVALS)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    FINDINGS.start()
+    REMOVALS.start()
+    retention.start_background()
+    yield
+    FINDINGS.flush()
+    REMOVALS.flush()
+    scoring.shutdown_pool()
+
+app = FastAPI(title="Local Data Removal API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -34,14 +74,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-def load_json(path: Path, default):
-    if path.exists():
-        return json.loads(path.read_text())
-    return default
-
-def save_json(path: Path, data):
-    path.write_text(json.dumps(data, indent=2))
+app.add_middleware(RequestProfiler)
 
 class PIIProfile(BaseModel):
     label: str
@@ -51,25 +84,16 @@ class PIIProfile(BaseModel):
     addresses: Optional[List[dict]] = []
 
 @app.get("/health")
-def health():
+async def health():
     return {"ok": True}
 
 @app.post("/unlock")
-def unlock(passphrase: str = Form(...)):
+async def unlock(passphrase: str = Form(...)):
     # Placeholder for local vault unlock; in starter repo we acknowledge and proceed.
     return {"token": str(uuid.uuid4())}
 
-@app.post("/brokers/import")
-async def brokers_import(file: Union[UploadFile, None] = File(default=None)):
+def _import_brokers_csv(src: Path):
     import pandas as pd
-    if file is not None:
-        content = await file.read()
-        (DATA_DIR / "brokers_upload.csv").write_bytes(content)
-        src = DATA_DIR / "brokers_upload.csv"
-    else:
-        src = BROKERS_FILE
-    if not src.exists():
-        return JSONResponse({"error": "No CSV found. Upload a file or place data/brokers_normalized.csv"}, status_code=400)
     try:
         df = pd.read_csv(src)
     except Exception as e:
@@ -83,93 +107,324 @@ async def brokers_import(file: Union[UploadFile, None] = File(default=None)):
     save_json(BROKERS_JSON, recs)
     return {"imported": len(recs)}
 
+@app.post("/brokers/import")
+async def brokers_import(file: Union[UploadFile, None] = File(default=None)):
+    if file is not None:
+        content = await file.read()
+        src = DATA_DIR / "brokers_upload.csv"
+        await run_in_threadpool(src.write_bytes, content)
+    else:
+        src = BROKERS_FILE
+    if not src.exists():
+        return JSONResponse({"error": "No CSV found. Upload a file or place data/brokers_normalized.csv"}, status_code=400)
+    return await run_in_threadpool(_import_brokers_csv, src)
+
 @app.get("/brokers")
-def brokers_list():
-    return load_json(BROKERS_JSON, [])
+async def brokers_list():
+    return await run_in_threadpool(load_json, BROKERS_JSON, [])
+
+def _append_profile(new: dict):
+    with store_lock():
+        profiles = load_json(PROFILES_JSON, [])
+        profiles.append(new)
+        save_json(PROFILES_JSON, profiles)
 
 @app.post("/pii-profiles")
-def create_profile(p: PIIProfile):
-    profiles = load_json(PROFILES_JSON, [])
+async def create_profile(p: PIIProfile):
     new = p.dict()
     new["id"] = str(uuid.uuid4())
-    profiles.append(new)
-    save_json(PROFILES_JSON, profiles)
+    await run_in_threadpool(_append_profile, new)
     return {"id": new["id"]}
 
 @app.get("/pii-profiles")
-def list_profiles():
-    return load_json(PROFILES_JSON, [])
-
-# --- Discovery jobs ---
+async def list_profiles():
+    return await run_in_threadpool(load_json, PROFILES_JSON, [])
 
 # --- Removal jobs ---
 
 @app.post("/removals")
-def start_removal(profile_id: str, brokers: List[int]):
-    """Start a removal job for selected brokers"""
-    removals = load_json(REMOVALS_JSON, {})
+async def start_removal(profile_id: str, brokers: List[int], execution: str = "local", batch_forms: bool = True,
+                        profile: bool = False, profile_mode: str = "cprofile"):
+    """Start a removal job for selected brokers
+
+    With execution=queue the brokers are written to the shared task queue and
+    processed by `python -m backend.app.worker` processes instead of this one.
+    Locally, form brokers are submitted as one batch through pooled browser
+    contexts unless batch_forms=false. profile=true records a profile of the
+    job (see GET /removals/{job_id}/profiling).
+    """
+    error = _profiling_error(profile, profile_mode, execution)
+    if error:
+        return error
     job_id = str(uuid.uuid4())
     
     # Initialize removal job
-    removals[job_id] = {
+    REMOVALS.create(job_id, {
         "status": "queued",
         "profile_id": profile_id,
         "broker_ids": brokers,
         "progress": 0,
-        "items": [],
-        "created_at": str(time.time())
-    }
-    save_json(REMOVALS_JSON, removals)
+        "items_done": 0,
+        "created_at": str(time.time()),
+        "execution": execution,
+        "batch_forms": batch_forms,
+        "revision": 0
+    })
     
+    if execution == "queue":
+        def _enqueue():
+            # Workers in other processes read the job file, so persist it first
+            REMOVALS.flush()
+            tasks = [{"broker_id": bid, "broker": b} for bid, b in select_removal_brokers(brokers)]
+            task_queue.enqueue("removal", job_id, {"profile_id": profile_id}, tasks)
+        await run_in_threadpool(_enqueue)
+        return {"job_id": job_id, "status": "queued", "broker_count": len(brokers)}
+
     # Start removal process in background
-    t = threading.Thread(target=_run_removal, args=(job_id, profile_id, brokers))
+    cancellation.token_for(job_id)
+    t = threading.Thread(target=_run_removal, args=(job_id, profile_id, brokers, batch_forms,
+                                                    profile_mode if profile else None))
     t.daemon = True
     t.start()
     
     return {"job_id": job_id, "status": "queued", "broker_count": len(brokers)}
 
 @app.get("/removals/{job_id}")
-def removal_status(job_id: str):
+async def removal_status(job_id: str):
     """Get status of a removal job"""
-    removals = load_json(REMOVALS_JSON, {})
-    if job_id not in removals:
+    job = REMOVALS.get(job_id)
+    if job is None:
         return JSONResponse({"error": "Removal job not found"}, status_code=404)
-    return removals[job_id]
+    # Removals run one broker at a time
+    return _with_items(job, item_log.iter_job_items_json(REMOVALS_JSON, job_id, job),
+                       {"eta": job_eta(job, workers=1)})
 
 @app.get("/removals")
-def list_removals():
+async def list_removals():
     """List all removal jobs"""
-    removals = load_json(REMOVALS_JSON, {})
-    return {job_id: job for job_id, job in removals.items()}
+    def _attach_items(jobs):
+        return {job_id: {**job, "items": item_log.job_items(REMOVALS_JSON, job_id, job)} for job_id, job in jobs.items()}
+    return await run_in_threadpool(_attach_items, REMOVALS.all())
 
 @app.delete("/removals/{job_id}")
-def cancel_removal(job_id: str):
-    """Cancel a removal job"""
-    removals = load_json(REMOVALS_JSON, {})
-    if job_id not in removals:
+async def cancel_removal(job_id: str):
+    """Cancel a removal job, aborting the broker currently being processed"""
+    if job_id not in REMOVALS:
         return JSONResponse({"error": "Removal job not found"}, status_code=404)
-    
-    if removals[job_id]["status"] in ["queued", "running"]:
-        removals[job_id]["status"] = "cancelled"
-        save_json(REMOVALS_JSON, removals)
-        return {"status": "cancelled"}
-    else:
+    return await run_in_threadpool(_cancel, REMOVALS, REMOVALS_JSON, job_id)
+
+def _cancel(cache: JobCache, path: Path, job_id: str):
+    """
+    Flag the job cancelled and abort its in-flight work: a local runner's token
+    closes its browsers and LLM subprocesses now; queue workers drop pending
+    tasks here and abort leased ones when their next status poll sees the flag.
+    """
+    if not request_cancel(path, job_id):
         return JSONResponse({"error": "Cannot cancel completed job"}, status_code=400)
+    if cache.get(job_id).get("execution") == "queue":
+        cache.flush()
+        task_queue.drop_pending(job_id)
+    else:
+        cancellation.cancel_job(job_id)
+    return {"status": "cancelled"}
+
+# --- Outbox ---
+
+OUTBOX_SEND = {"running": False, "token": None, "last": None}
+_outbox_send_lock = threading.Lock()
+
+@app.get("/outbox")
+async def list_outbox(status: Optional[str] = None):
+    """Opt-out emails drafted by removal jobs (bodies left out), with counts by status"""
+    def _list():
+        counts, messages = {}, []
+        for message in outbox.iter_messages():
+            counts[message["status"]] = counts.get(message["status"], 0) + 1
+            if status is None or message["status"] == status:
+                messages.append({k: v for k, v in message.items() if k != "body"})
+        return {"counts": counts, "messages": messages, "sending": OUTBOX_SEND["running"]}
+    return await run_in_threadpool(_list)
+
+@app.get("/outbox/export")
+async def export_outbox(format: str = "mbox", status: Optional[str] = "draft"):
+    """Download messages as one mbox file (streamed) or a zip of .eml files"""
+    if format == "mbox":
+        return StreamingResponse(outbox.export_mbox(outbox.iter_messages(status)), media_type="application/mbox",
+                                 headers={"Content-Disposition": 'attachment; filename="outbox.mbox"'})
+    if format != "eml":
+        return JSONResponse({"error": "format must be mbox or eml"}, status_code=400)
+    def _bundle():
+        fh = tempfile.NamedTemporaryFile(suffix=".zip", delete=False)
+        with fh:
+            outbox.export_eml_zip(outbox.iter_messages(status), fh)
+        return fh.name
+    path = await run_in_threadpool(_bundle)
+    return FileResponse(path, media_type="application/zip", filename="outbox.zip",
+                        background=BackgroundTask(os.unlink, path))
+
+@app.post("/outbox/send")
+async def send_outbox(ids: Optional[List[str]] = None, include_failed: bool = False):
+    """Send drafts (all of them, or `ids`) in the background over one SMTP connection
+
+    Sending is paced and batched (OUTBOX_RATE, OUTBOX_BATCH_SIZE,
+    OUTBOX_BATCH_PAUSE) with retries on transient errors. Progress shows in
+    GET /outbox and each removal item's `email` field; GET /outbox/send has
+    the last run's summary and DELETE /outbox/send stops the run.
+    """
+    if not outbox.SMTP_HOST:
+        return JSONResponse({"error": "SMTP_HOST is not configured"}, status_code=400)
+    statuses = ("draft", "failed") if include_failed else ("draft",)
+    messages = await run_in_threadpool(
+        lambda: [m for m in outbox.iter_messages(ids=ids) if m["status"] in statuses])
+    with _outbox_send_lock:
+        if OUTBOX_SEND["running"]:
+            return JSONResponse({"error": "outbox is already sending"}, status_code=409)
+        token = cancellation.CancelToken()
+        OUTBOX_SEND.update(running=True, token=token)
+
+    def _send():
+        try:
+            OUTBOX_SEND["last"] = outbox.send_messages(messages, cancel=token)
+        except outbox.OutboxError as e:
+            print(f"❌ Outbox sending stopped: {e}")
+            OUTBOX_SEND["last"] = {"error": str(e)}
+        finally:
+            OUTBOX_SEND.update(running=False, token=None)
+    threading.Thread(target=_send, daemon=True).start()
+    return {"status": "sending", "messages": len(messages)}
+
+@app.get("/outbox/send")
+async def outbox_send_status():
+    return {"running": OUTBOX_SEND["running"], "last": OUTBOX_SEND["last"]}
+
+@app.delete("/outbox/send")
+async def stop_outbox_send():
+    token = OUTBOX_SEND["token"]
+    if token is None:
+        return JSONResponse({"error": "outbox is not sending"}, status_code=400)
+    token.cancel()
+    return {"status": "stopping"}
+
+@app.get("/outbox/{message_id}")
+async def get_outbox_message(message_id: str):
+    message = await run_in_threadpool(outbox.get_message, message_id)
+    if message is None:
+        return JSONResponse({"error": "message not found"}, status_code=404)
+    return message
+
+@app.put("/outbox/{message_id}")
+async def edit_outbox_message(message_id: str, request: dict):
+    """Change an unsent message's recipient, subject or body"""
+    fields = {k: request[k] for k in ("to", "subject", "body") if k in request}
+    def _edit(message):
+        if message["status"] != "sent":
+            message.update(fields)
+            if "to" in fields:
+                message["recipient_source"] = "user"
+    message = await run_in_threadpool(outbox.update_message, message_id, _edit)
+    if message is None:
+        return JSONResponse({"error": "message not found"}, status_code=404)
+    if message["status"] == "sent":
+        return JSONResponse({"error": "message already sent"}, status_code=400)
+    return message
+
+@app.post("/brokers/triage")
+async def brokers_triage(force: bool = False):
+    """Check DNS and HTTP reachability of the whole catalog (only expired entries unless force)"""
+    catalog = await run_in_threadpool(load_json, BROKERS_JSON, [])
+    cache = await run_in_threadpool(triage_brokers, catalog, force)
+    return {"brokers": len(catalog), "summary": triage_summary(cache)}
+
+@app.get("/brokers/reachability")
+async def brokers_reachability(status: Optional[str] = None):
+    """Cached triage results by domain, optionally only one status (ok, degraded, unreachable)"""
+    cache = await run_in_threadpool(load_reachability)
+    return {d: e for d, e in cache.items() if status is None or e.get("status") == status}
+
+@app.get("/brokers/health")
+async def brokers_health(state: Optional[str] = None):
+    """Per-domain circuit breakers and adaptive deadlines, optionally one breaker state (closed, open, half_open)"""
+    return await run_in_threadpool(health_summary, state)
+
+@app.get("/browser-state")
+async def browser_state():
+    """Domains with saved cookies/localStorage that broker visits start from"""
+    return await run_in_threadpool(list_states)
+
+@app.get("/storage/usage")
+async def storage_usage(limit: int = 50):
+    """Bytes per storage area, and per job and broker (top `limit`, 0 = all) for evidence and snapshots"""
+    return await run_in_threadpool(retention.usage, limit)
+
+@app.post("/storage/gc")
+async def storage_gc(dry_run: bool = False, max_age_days: Optional[float] = None,
+                     keep_per_broker: Optional[int] = None, keep_verified: Optional[bool] = None,
+                     quota_mb: Optional[float] = None, compact_after_days: Optional[float] = None):
+    """Apply the retention policy now; parameters override the RETENTION_* settings for this run"""
+    try:
+        return await run_in_threadpool(lambda: retention.collect(
+            dry_run, max_age_days=max_age_days, keep_per_broker=keep_per_broker, keep_verified=keep_verified,
+            quota_mb=quota_mb, compact_after_days=compact_after_days))
+    except RuntimeError as e:
+        return JSONResponse({"error": str(e)}, status_code=409)
+
+@app.get("/storage/gc")
+async def storage_gc_status():
+    """The retention policy and the last collection's report"""
+    return {**retention.RETENTION_STATE, "policy": retention.policy()}
+
+@app.delete("/browser-state")
+async def reset_browser_state(domain: Optional[str] = None):
+    """Forget saved browser state for one domain, or for all of them"""
+    removed = await run_in_threadpool(reset_state, domain)
+    return {"removed": removed}
 
 @app.get("/broker-profiles")
-def get_profiles():
-    """Get all available broker profiles for discovery"""
-    return get_broker_profiles()
+async def get_profiles():
+    """Get all available broker profiles for discovery, with broker counts and
+    time estimates computed from the current catalog and measured scan durations"""
+    catalog = await run_in_threadpool(load_json, BROKERS_JSON, [])
+    estimates = await run_in_threadpool(profile_estimates, catalog, DISCOVERY_WORKERS)
+    return {name: {**profile, **estimates.get(name, {})} for name, profile in get_broker_profiles().items()}
+
+# --- Discovery jobs ---
 
 @app.post("/discovery")
-def start_discovery(
+async def start_discovery(
     profile_id: str, 
     scope: Optional[List[int]] = None,
-    broker_profile: str = "all_brokers"
+    broker_profile: str = "all_brokers",
+    execution: str = "local",
+    order: str = "catalog",
+    skip_barren: bool = False,
+    priority: Optional[int] = None,
+    triage: bool = True,
+    memory_profile: bool = MEMORY_PROFILE,
+    profile: bool = False,
+    profile_mode: str = "cprofile"
 ):
-    """Start discovery with optional broker profile filtering"""
-    jobs = load_json(FINDINGS_JSON, {})
+    """Start discovery with optional broker profile filtering
+
+    With execution=queue the brokers are written to the shared task queue and
+    processed by `python -m backend.app.worker` processes instead of this one.
+    order=yield scans brokers by expected yield per second from the yield
+    index; skip_barren=true skips brokers that have never returned results.
+    Concurrent jobs share workers by priority, which defaults to the broker
+    profile's (all_brokers sweeps get the lowest, 1). With triage (the
+    default) brokers whose domain doesn't resolve or whose search page is
+    gone are recorded as unreachable instead of being scanned, and brokers
+    that time out or error go last. memory_profile=true records the
+    peak Python heap, process RSS and browser RSS of a local job in its
+    `memory` field. profile=true records a cProfile (profile_mode=cprofile)
+    or stack-sampling (profile_mode=sampling) profile of a local job, for
+    GET /discovery/{job_id}/profiling.
+    """
+    error = _profiling_error(profile, profile_mode, execution)
+    if error:
+        return error
     job_id = str(uuid.uuid4())
+    if priority is None:
+        priority = get_profile_priority(broker_profile)
     
     # Get profile info for metadata
     profile_info = None
@@ -179,53 +434,187 @@ def start_discovery(
         except ValueError:
             profile_info = None
     
-    jobs[job_id] = {
+    FINDINGS.create(job_id, {
         "status": "queued", 
         "progress": 0, 
-        "items": [],
+        "items_done": 0,
         "current_broker": 0,
         "total_brokers": 0,
         "current_broker_name": "",
+        "profile_id": profile_id,
+        "created_at": str(time.time()),
         "broker_profile": broker_profile,
-        "profile_info": profile_info
-    }
-    save_json(FINDINGS_JSON, jobs)
-    t = threading.Thread(target=_run_discovery, args=(job_id, profile_id, scope, broker_profile))
+        "profile_info": profile_info,
+        "execution": execution,
+        "order": order,
+        "skip_barren": skip_barren,
+        "priority": priority,
+        "triage": triage,
+        "revision": 0
+    })
+    if execution == "queue":
+        await run_in_threadpool(_enqueue_discovery, job_id, profile_id, scope, broker_profile, order, skip_barren, priority, triage)
+        return {"job_id": job_id}
+    cancellation.token_for(job_id)
+    t = threading.Thread(target=_run_discovery, args=(job_id, profile_id, scope, broker_profile, order, skip_barren, priority, triage, memory_profile,
+                                                      profile_mode if profile else None))
     t.daemon = True
     t.start()
     return {"job_id": job_id}
 
+def _enqueue_discovery(job_id: str, profile_id: str, scope: Optional[List[int]], broker_profile: str,
+                       order: str, skip_barren: bool, priority: int = 1, triage: bool = True):
+    brokers = select_discovery_brokers(scope, broker_profile)
+    to_scan, skipped = plan_discovery(brokers, order, skip_barren, _reachability(brokers) if triage else None)
+    history_s_per_broker = mean_broker_seconds([b for _, b in to_scan])
+    def _plan(job):
+        job["total_brokers"] = len(brokers)
+        job["skipped_brokers"] = len(skipped)
+        job["history_s_per_broker"] = round(history_s_per_broker, 1)
+    update_job(FINDINGS_JSON, job_id, _plan)
+    for item in skipped:
+        record_discovery_item(job_id, item)
+    tasks = [{"broker_id": i, "broker": b} for i, b in to_scan]
+    if not tasks:
+        mark_completed(FINDINGS_JSON, job_id)
+    # Workers in other processes read and merge into the job file, so persist it first
+    FINDINGS.flush()
+    task_queue.enqueue("discovery", job_id, {"profile_id": profile_id}, tasks, weight=job_weight(priority))
+
+def _reachability(brokers: List[dict]) -> Optional[dict]:
+    """Triage cache refreshed for these brokers; None (no filtering) if triage itself fails"""
+    try:
+        return triage_brokers(brokers)
+    except Exception as e:
+        print(f"⚠️ Reachability triage failed, scanning every broker: {e}")
+        return None
+
+def _with_items(job: dict, items_json: Iterator[bytes], extra: dict, headers: Optional[dict] = None) -> Response:
+    """
+    A job record plus its items, with the items' JSON streamed from the item
+    log. The log is on disk and grows with the job; StreamingResponse reads a
+    sync iterator in the threadpool, so the event loop never waits on it.
+    """
+    record = {k: v for k, v in job.items() if k != "items"}
+    body = json.dumps({**record, **extra}).encode()
+    def _body():
+        yield body[:-1] + b', "items": '
+        yield from items_json
+        yield b"}"
+    return StreamingResponse(_body(), media_type="application/json", headers=headers)
+
+def _etag(job_id: str, revision: int, query: str, epoch: str = "") -> str:
+    digest = hashlib.sha1(f"{job_id}:{revision}:{query}:{epoch}".encode()).hexdigest()[:16]
+    return f'W/"{revision}-{digest}"'
+
+def _filter_items(items: Iterable[dict], found: Optional[bool], min_confidence: Optional[float],
+                  error: Optional[bool], since_revision: Optional[int]) -> Iterator[dict]:
+    for item in items:
+        if found is not None and bool(item.get("found")) != found:
+            continue
+        if min_confidence is not None and float(item.get("confidence") or 0.0) < min_confidence:
+            continue
+        if error is not None and bool(item.get("error")) != error:
+            continue
+        if since_revision is not None and item.get("revision", 0) <= since_revision:
+            continue
+        yield item
+
 @app.get("/discovery/{job_id}")
-def discovery_status(job_id: str):
-    jobs = load_json(FINDINGS_JSON, {})
-    if job_id not in jobs:
+async def discovery_status(
+    job_id: str,
+    request: Request,
+    found: Optional[bool] = None,
+    min_confidence: Optional[float] = None,
+    error: Optional[bool] = None,
+    since_revision: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None
+):
+    """
+    Job status and results. Without query parameters the whole job is
+    returned. Filters (found, min_confidence, error), `since_revision` deltas
+    and cursor pagination (`cursor` is the `next_cursor` of the previous page)
+    return only matching items. Responses carry an ETag; a matching
+    If-None-Match gets 304 Not Modified.
+    """
+    job = FINDINGS.get(job_id)
+    if job is None:
         return JSONResponse({"error": "not found"}, status_code=404)
-    return jobs[job_id]
+
+    # The ETA moves with the clock, so a running job's ETag also expires periodically
+    eta = job_eta(job, DISCOVERY_WORKERS)
+    epoch = str(int(time.time() // ETA_REFRESH_SECONDS)) if eta else ""
+    etag = _etag(job_id, job.get("revision", 0), str(request.url.query), epoch)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    query_params = (found, min_confidence, error, since_revision, cursor, limit)
+    if all(param is None for param in query_params):
+        return _with_items(job, item_log.iter_job_items_json(FINDINGS_JSON, job_id, job), {"eta": eta},
+                           headers={"ETag": etag})
+
+    after = None
+    if cursor:
+        try:
+            after = int(cursor)
+        except ValueError:
+            return JSONResponse({"error": "invalid cursor"}, status_code=400)
+    limit = max(1, min(limit or MAX_PAGE_SIZE, MAX_PAGE_SIZE))
+
+    def _page():
+        # Items are streamed from the job's item log; stop one past the page to know if there's more
+        matched = _filter_items(item_log.iter_job_items(FINDINGS_JSON, job_id, job),
+                                found, min_confidence, error, since_revision)
+        if after is not None:
+            matched = (item for item in matched if item.get("broker_id", -1) > after)
+        return list(islice(matched, limit + 1))
+    matched = await run_in_threadpool(_page)
+    page = matched[:limit]
+    next_cursor = str(page[-1]["broker_id"]) if len(matched) > limit else None
+
+    body = {k: v for k, v in job.items() if k != "items"}
+    body.update({
+        "eta": eta,
+        "items": page,
+        "total_items": item_log.items_done(job),
+        "next_cursor": next_cursor,
+    })
+    return JSONResponse(body, headers={"ETag": etag})
+
+@app.delete("/discovery/{job_id}")
+async def cancel_discovery(job_id: str):
+    """Cancel a discovery job; items already found are kept"""
+    if job_id not in FINDINGS:
+        return JSONResponse({"error": "Job not found"}, status_code=404)
+    return await run_in_threadpool(_cancel, FINDINGS, FINDINGS_JSON, job_id)
 
 @app.post("/discovery/{job_id}/mark-false-positive")
-def mark_false_positive(job_id: str, request: dict):
+async def mark_false_positive(job_id: str, request: dict):
     """Mark a broker result as a false positive"""
-    print(f"Marking broker {request['broker_id']} as false positive for job {job_id}")
-    
-    findings_file = STORE_DIR / "findings.json"
-    if findings_file.exists():
-        findings = json.loads(findings_file.read_text())
-        
-        # Find and update the specific result
-        for result in findings.get(job_id, []):
-            if result.get('broker_id') == request['broker_id']:
-                result['marked_false_positive'] = True
-                result['confidence'] = 0.0  # Reset confidence
-                break
-        
-        findings_file.write_text(json.dumps(findings, indent=2))
-        print(f"Successfully marked broker {request['broker_id']} as false positive")
-        return {"success": True}
-    
-    return {"success": False, "error": "Findings not found"}
+    broker_id = request.get('broker_id')
+    if broker_id is None:
+        return JSONResponse({"error": "broker_id required"}, status_code=400)
+
+    print(f"Marking broker {broker_id} as false positive for job {job_id}")
+
+    if job_id not in FINDINGS:
+        return {"success": False, "error": "Findings not found"}
+
+    def _mark(item):
+        item["marked_false_positive"] = True
+        item["confidence"] = 0.0  # Reset confidence
+
+    previous, item = await run_in_threadpool(update_item, FINDINGS_JSON, job_id, broker_id, _mark)
+    if item is None:
+        return {"success": False, "error": "Broker result not found"}
+    if not previous.get("marked_false_positive"):
+        await run_in_threadpool(yield_index.record_feedback, item.get("domain"), "false_positives")
+    print(f"Successfully marked broker {broker_id} as false positive")
+    return {"success": True}
 
 @app.post("/discovery/{job_id}/verify-positive")
-def verify_positive(job_id: str, request: dict):
+async def verify_positive(job_id: str, request: dict):
     """Mark a discovery result as verified true positive"""
     broker_id = request.get('broker_id')
     if broker_id is None:
@@ -233,180 +622,281 @@ def verify_positive(job_id: str, request: dict):
 
     print(f"Verifying broker {broker_id} as true positive for job {job_id}")
 
-    jobs = load_json(FINDINGS_JSON, {})
-    if job_id not in jobs:
+    if job_id not in FINDINGS:
         return JSONResponse({"error": "job not found"}, status_code=404)
-    
-    job = jobs[job_id]
-    items = job.get("items", [])
-    
-    found = False
-    # Find and update the item
-    for item in items:
-        if item.get("broker_id") == broker_id:
-            item["verified_positive"] = True
-            item["confidence"] = min(1.0, item.get("confidence", 0.5) + 0.2)  # Boost confidence
-            item["notes"] = (item.get("notes", "") + " [VERIFIED_BY_USER]").strip()
-            found = True
-            break
 
-    if found:
-        # Save updated job
-        jobs[job_id] = job
-        save_json(FINDINGS_JSON, jobs)
+    def _verify(item):
+        item["verified_positive"] = True
+        item["confidence"] = min(1.0, item.get("confidence", 0.5) + 0.2)  # Boost confidence
+        item["notes"] = (item.get("notes", "") + " [VERIFIED_BY_USER]").strip()
+
+    previous, item = await run_in_threadpool(update_item, FINDINGS_JSON, job_id, broker_id, _verify)
+
+    if item is not None:
+        if not previous.get("verified_positive"):
+            await run_in_threadpool(yield_index.record_feedback, item.get("domain"), "verified")
         print(f"Successfully verified broker {broker_id} as true positive")
         return {"success": True, "message": f"Marked broker {broker_id} as verified positive"}
     
     return {"success": False, "error": "Broker result not found"}
 
+@app.post("/discovery/{job_id}/rescore")
+async def rescore_discovery(job_id: str, profile_id: Optional[str] = None, reextract: bool = False,
+                            apply: bool = False):
+    """Re-score a job's brokers from their page snapshots (searches run with SNAPSHOTS=1)
 
-def _run_discovery(job_id: str, profile_id: str, scope: Optional[List[int]], broker_profile: str = "all_brokers"):
-    from .discovery.search_playwright import search_broker
-    evidence_dir = STORE_DIR / "evidence" / job_id
-    evidence_dir.mkdir(parents=True, exist_ok=True)
-
-    # Load brokers first
-    brokers = load_json(BROKERS_JSON, [])
-    
-    # Apply broker profile filtering
-    if broker_profile != "all_brokers":
-        brokers = filter_brokers_by_profile(brokers, broker_profile)
-    
-    # Apply scope filtering if provided
-    if scope:
-        brokers = [b for idx, b in enumerate(brokers) if idx in scope]
-
-    jobs = load_json(FINDINGS_JSON, {})
-    jobs[job_id]["status"] = "running"
-    jobs[job_id]["total_brokers"] = len(brokers)
-    save_json(FINDINGS_JSON, jobs)
+    Uses the current scoring code, and profile_id's PII when given instead of
+    the job's. reextract=true rebuilds page text from the stored HTML. Returns
+    the verdicts that would change; apply=true writes them to the items.
+    """
+    if job_id not in FINDINGS:
+        return JSONResponse({"error": "job not found"}, status_code=404)
+    profile = None
+    if profile_id is not None:
+        profile = await run_in_threadpool(load_profile, profile_id)
+        if profile is None:
+            return JSONResponse({"error": "Profile not found"}, status_code=404)
+    rows = await run_in_threadpool(lambda: list(rescore.rescore_jobs([job_id], profile, reextract, apply)))
+    return {"job_id": job_id, "applied": apply, **rescore.summarize(rows)}
+
+
+@app.get("/scheduler")
+async def scheduler_status():
+    """Local discovery jobs sharing the worker pool, with their fair-share state
+    and how many broker searches were coalesced with an identical one in flight"""
+    return {"workers": SCHEDULER.workers, "jobs": SCHEDULER.snapshot(), "searches": dict(SEARCHES.stats)}
+
+@app.get("/yield-index")
+async def get_yield_index(limit: Optional[int] = None):
+    """Per-broker history across all jobs, best expected yield per second first"""
+    rows = await run_in_threadpool(yield_index.index_report)
+    return rows[:limit] if limit else rows
+
+def _profiling_error(profile: bool, mode: str, execution: str) -> Optional[JSONResponse]:
+    if not profile:
+        return None
+    if mode not in profiling.MODES:
+        return JSONResponse({"error": f"profile_mode must be one of {list(profiling.MODES)}"}, status_code=400)
+    if execution != "local":
+        return JSONResponse({"error": "profiling is only available for local execution"}, status_code=400)
+    return None
+
+def _profiling_artifact(cache: JobCache, job_id: str, artifact: Optional[str]):
+    job = cache.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "job not found"}, status_code=404)
+    path = profiling.artifact_path(STORE_DIR / "evidence" / job_id, job.get("profiling"), artifact)
+    if path is None:
+        return JSONResponse({"error": "no such profiling artifact", "profiling": job.get("profiling")},
+                            status_code=404)
+    return FileResponse(path, filename=f"{job_id}-{path.name}")
+
+@app.get("/discovery/{job_id}/profiling")
+async def discovery_profiling(job_id: str, artifact: Optional[str] = None):
+    """Download a profiled discovery job's profile.prof / profile.folded (default) or profile.txt"""
+    return _profiling_artifact(FINDINGS, job_id, artifact)
+
+@app.get("/removals/{job_id}/profiling")
+async def removal_profiling(job_id: str, artifact: Optional[str] = None):
+    """Download a profiled removal job's profile artifact"""
+    return _profiling_artifact(REMOVALS, job_id, artifact)
+
+@app.post("/admin/profiling")
+async def set_request_profiling(enabled: bool, path_prefix: str = "/", min_ms: float = 0.0):
+    """Switch stack-sampling of API requests on or off, for paths under path_prefix
+    taking at least min_ms"""
+    profiling.REQUEST_PROFILING.update(enabled=enabled, path_prefix=path_prefix, min_ms=min_ms)
+    return profiling.REQUEST_PROFILING
+
+@app.get("/admin/profiling")
+async def get_request_profiling():
+    return {"settings": profiling.REQUEST_PROFILING,
+            "captures": await run_in_threadpool(profiling.request_captures)}
+
+@app.get("/admin/profiling/{name}")
+async def download_request_profile(name: str):
+    path = profiling.request_capture_path(name)
+    if path is None:
+        return JSONResponse({"error": "capture not found"}, status_code=404)
+    return FileResponse(path, filename=path.name)
+
+@app.get("/exports/findings")
+async def export_findings(format: str = "ndjson", since: Optional[str] = None, until: Optional[str] = None,
+                          profile_id: Optional[str] = None, broker_id: Optional[int] = None,
+                          domain: Optional[str] = None, found_only: bool = False):
+    """Discovery items of every job as a streamed CSV or NDJSON download
+
+    since/until (epoch seconds or ISO dates) select jobs by creation time;
+    the other filters apply per item. Memory stays flat however many jobs
+    there are.
+    """
+    return _export("findings", FINDINGS, FINDINGS_JSON, exports.FINDING_COLUMNS, format, since, until,
+                   profile_id=profile_id, broker_id=broker_id, domain=domain, found_only=found_only)
+
+@app.get("/exports/removals")
+async def export_removals(format: str = "ndjson", since: Optional[str] = None, until: Optional[str] = None,
+                          profile_id: Optional[str] = None, broker_id: Optional[int] = None,
+                          status: Optional[str] = None):
+    """Removal items of every job as a streamed CSV or NDJSON download"""
+    return _export("removals", REMOVALS, REMOVALS_JSON, exports.REMOVAL_COLUMNS, format, since, until,
+                   profile_id=profile_id, broker_id=broker_id, status=status)
+
+def _export(name: str, cache: JobCache, path: Path, columns: list, fmt: str, since: Optional[str],
+            until: Optional[str], **filters) -> Response:
+    if fmt not in exports.FORMATS:
+        return JSONResponse({"error": f"format must be one of {sorted(exports.FORMATS)}"}, status_code=400)
+    try:
+        window = {"since": exports.parse_time(since), "until": exports.parse_time(until)}
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    # Job records are small now that items live in the item logs; the rows are generated
+    # (in the threadpool, by StreamingResponse) as the client reads them
+    rows = exports.iter_rows(path, cache.all(), **window, **filters)
+    return StreamingResponse(exports.encode(rows, fmt, columns), media_type=exports.FORMATS[fmt],
+                             headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'})
+
+
+def _run_discovery(job_id: str, profile_id: str, scope: Optional[List[int]], broker_profile: str = "all_brokers",
+                   order: str = "catalog", skip_barren: bool = False, priority: int = 1, triage: bool = True,
+                   memory_profile: bool = False, profile_mode: Optional[str] = None):
+    evidence_dir = evidence_dir_for(job_id)
+    token = cancellation.token_for(job_id)
+    sampler = MemorySampler().start() if memory_profile else None
+    profiler = JobProfiler(profile_mode) if profile_mode else None
+
+    with (profiler.task() if profiler else nullcontext()):
+        brokers = select_discovery_brokers(scope, broker_profile)
+        to_scan, skipped = plan_discovery(brokers, order, skip_barren, _reachability(brokers) if triage else None)
+
+    started_at = time.time()
+    history_s_per_broker = mean_broker_seconds([b for _, b in to_scan])
+    def _start(job):
+        if job["status"] == "queued":
+            job["status"] = "running"
+        job["started_at"] = started_at
+        job["total_brokers"] = len(brokers)
+        job["skipped_brokers"] = len(skipped)
+        job["history_s_per_broker"] = round(history_s_per_broker, 1)
+    update_job(FINDINGS_JSON, job_id, _start)
+    for item in skipped:
+        record_discovery_item(job_id, item)
 
     # Load PII (for now from PROFILES_JSON)
-    profiles = load_json(PROFILES_JSON, [])
-    profile = next((p for p in profiles if p.get("id")==profile_id), None)
-    if not profile:
-        profile = {"names":[], "emails":[], "phones":[], "addresses":[]}
+    profile = load_profile(profile_id) or dict(EMPTY_PROFILE)
 
-    items = []
     total = max(1, len(brokers))
-    for i, b in enumerate(brokers):
-        # Update progress BEFORE starting broker search
-        jobs = load_json(FINDINGS_JSON, {})
-        jobs[job_id]["current_broker"] = i + 1
-        jobs[job_id]["total_brokers"] = total
-        jobs[job_id]["current_broker_name"] = b.get("name", "Unknown")
-        jobs[job_id]["progress"] = int((i/total)*100)  # Progress based on started brokers
-        save_json(FINDINGS_JSON, jobs)
-        
-        try:
-            res = search_broker(b, profile, str(evidence_dir))
-            items.append({
-                "broker_name": b.get("name"),
-                "domain": b.get("domain"),
-                "broker_id": i,
-                "found": bool(res.get("found")),
-                "confidence": float(res.get("confidence") or 0.0),
-                "evidence_url": res.get("evidence_url"),
-                "screenshot_path": res.get("screenshot")
-            })
-        except Exception as e:
-            print(f"❌ Error searching {b.get('name', 'Unknown')}: {str(e)}")
-            items.append({
-                "broker_name": b.get("name"),
-                "domain": b.get("domain"),
-                "broker_id": i,
-                "found": False,
-                "confidence": 0.0,
-                "evidence_url": None,
-                "error": str(e)
-            })
-        
+    counter_lock = threading.Lock()
+    counters = {"started": len(skipped)}
+
+    def _scan(task):
+        """Scan one (broker_id, broker, rate-limit retries) task; returns a task to requeue or None"""
+        i, b, retries = task
+        if token.cancelled:
+            return None
+        if retries == 0:
+            with counter_lock:
+                counters["started"] += 1
+                started = counters["started"]
+            # Update progress BEFORE starting broker search
+            def _progress(job):
+                job["current_broker"] = started
+                job["total_brokers"] = total
+                job["current_broker_name"] = b.get("name", "Unknown")
+            update_job(FINDINGS_JSON, job_id, _progress)
+
+        item = discover_broker(i, b, profile, str(evidence_dir), cancel=token)
+        if item.get("cancelled"):
+            return None
+        if is_rate_limited(item) and retries < RATE_LIMIT_RETRIES:
+            return (i, b, retries + 1)
+
         # Update final results after broker completion
-        jobs = load_json(FINDINGS_JSON, {})
-        jobs[job_id]["items"] = items
-        jobs[job_id]["progress"] = int(((i+1)/total)*100)  # Progress based on completed brokers
-        save_json(FINDINGS_JSON, jobs)
+        record_discovery_item(job_id, item)
+        return None
+
+    def _profiled_scan(task):
+        with profiler.task():
+            return _scan(task)
+
+    # Brokers of all local jobs share the scheduler's workers, weighted by priority
+    SCHEDULER.submit(job_id, [(i, b, 0) for i, b in to_scan], _profiled_scan if profiler else _scan,
+                     priority, cancel=token).done.wait()
+
+    if sampler:
+        peaks = sampler.stop()
+        update_job(FINDINGS_JSON, job_id, lambda job: job.update(memory=peaks))
+    if profiler:
+        info = profiler.save(evidence_dir)
+        update_job(FINDINGS_JSON, job_id, lambda job: job.update(profiling=info))
+    if token.cancelled:
+        mark_cancel_released(FINDINGS_JSON, job_id)
+        print(f"🛑 Discovery job {job_id} cancelled")
+    else:
+        mark_completed(FINDINGS_JSON, job_id)
+    cancellation.release(job_id)
+
 
-    jobs = load_json(FINDINGS_JSON, {})
-    jobs[job_id]["status"] = "completed"
-    save_json(FINDINGS_JSON, jobs)
+def _run_removal(job_id: str, profile_id: str, broker_ids: List[int], batch_forms: bool = True,
+                 profile_mode: Optional[str] = None):
+    if not profile_mode:
+        return _removal(job_id, profile_id, broker_ids, batch_forms)
+    profiler = JobProfiler(profile_mode)
+    try:
+        with profiler.task():
+            _removal(job_id, profile_id, broker_ids, batch_forms)
+    finally:
+        info = profiler.save(evidence_dir_for(job_id))
+        update_job(REMOVALS_JSON, job_id, lambda job: job.update(profiling=info))
 
 
-def _run_removal(job_id: str, profile_id: str, broker_ids: List[int]):
+def _removal(job_id: str, profile_id: str, broker_ids: List[int], batch_forms: bool = True):
     """Execute removal process for selected brokers"""
-    removals = load_json(REMOVALS_JSON, {})
-    removals[job_id]["status"] = "running"
-    save_json(REMOVALS_JSON, removals)
+    token = cancellation.token_for(job_id)
+    started_at = time.time()
+    def _start(job):
+        if job["status"] == "queued":
+            job["status"] = "running"
+        job["started_at"] = started_at
+    update_job(REMOVALS_JSON, job_id, _start)
 
     # Load broker and profile data
-    brokers = load_json(BROKERS_JSON, [])
-    selected_brokers = [brokers[i] for i in broker_ids if i < len(brokers)]
+    selected_brokers = select_removal_brokers(broker_ids)
     
-    profiles = load_json(PROFILES_JSON, [])
-    profile = next((p for p in profiles if p.get("id") == profile_id), None)
+    profile = load_profile(profile_id)
     if not profile:
-        removals[job_id]["status"] = "error"
-        removals[job_id]["error"] = "Profile not found"
-        save_json(REMOVALS_JSON, removals)
+        def _missing_profile(job):
+            job["status"] = "error"
+            job["error"] = "Profile not found"
+        update_job(REMOVALS_JSON, job_id, _missing_profile)
+        cancellation.release(job_id)
         return
 
-    items = []
-    total = max(1, len(selected_brokers))
-    
-    for i, broker in enumerate(selected_brokers):
+    done = set()
+    if batch_forms:
+        def _record(item):
+            done.add(item["broker_id"])
+            record_removal_item(job_id, item)
         try:
-            # Create drafts directory
-            drafts_dir = STORE_DIR / "drafts"
-            drafts_dir.mkdir(exist_ok=True)
-            
-            # Determine removal method based on broker data
-            method = broker.get("method", "email").lower()
-            result = {"broker_name": broker.get("name"), "broker_id": broker_ids[i], "method": method}
-            
-            if method == "email" or not broker.get("optout_url"):
-                # Use AI-powered email generation
-                from .removal.connectors.email_generic import EmailGeneric
-                connector = EmailGeneric(broker, profile)
-                removal_result = connector.submit()
-                result.update(removal_result)
-            
-            elif method == "form" and broker.get("optout_url"):
-                # Use form automation
-                from .removal.connectors.form_generic import GenericForm
-                connector = GenericForm(broker, profile)
-                removal_result = connector.submit()
-                result.update(removal_result)
-            
-            else:
-                # Manual process required
-                result.update({
-                    "status": "manual_required",
-                    "transcript": f"Manual removal required for {broker.get('name')}. Check broker requirements.",
-                    "evidence_path": None
-                })
-            
-            items.append(result)
-            print(f"Processed removal for {broker.get('name')}: {result.get('status')}")
-            
+            remove_form_brokers([(bid, b) for bid, b in selected_brokers if is_form_broker(b)],
+                                profile, _record, cancel=token)
         except Exception as e:
-            print(f"Error processing removal for {broker.get('name')}: {e}")
-            items.append({
-                "broker_name": broker.get("name"),
-                "broker_id": broker_ids[i],
-                "method": "error",
-                "status": "error",
-                "transcript": f"Error: {str(e)}",
-                "evidence_path": None
-            })
-        
-        # Update progress
-        removals = load_json(REMOVALS_JSON, {})
-        removals[job_id]["items"] = items
-        removals[job_id]["progress"] = int(((i + 1) / total) * 100)
-        save_json(REMOVALS_JSON, removals)
-    
+            print(f"⚠️ Form batch failed, falling back to one browser per broker: {e}")
+
+    for broker_id, broker in selected_brokers:
+        if token.cancelled:
+            break
+        if broker_id in done:
+            continue
+        item = remove_broker(broker_id, broker, profile, cancel=token)
+        if token.cancelled:
+            break
+        record_removal_item(job_id, item)
+
+    cancellation.release(job_id)
+    if token.cancelled:
+        mark_cancel_released(REMOVALS_JSON, job_id)
+        print(f"🛑 Removal job {job_id} cancelled")
+        return
     # Mark as completed
-    removals = load_json(REMOVALS_JSON, {})
-    removals[job_id]["status"] = "completed"
-    save_json(REMOVALS_JSON, removals)
-    print(f"Removal job {job_id} completed with {len(items)} items")
+    mark_completed(REMOVALS_JSON, job_id)
+    print(f"Removal job {job_id} completed with {len(selected_brokers)} items")
@@ -0,0 +1,165 @@
+"""
+Memory instrumentation for scans.
+
+`MemorySampler` polls every MEMORY_SAMPLE_INTERVAL seconds and keeps the
+peaks of:
+
+  - the Python heap (tracemalloc, switched on while any sampler runs)
+  - this process's RSS
+  - the combined RSS of its child processes (Playwright drivers and Chromium)
+
+The figures are process-wide, so concurrent jobs see each other's memory.
+`browser_pid` asks a launched Chromium for its browser process id once, over
+CDP, and `tree_rss_mb` on that id measures the browser with its renderer and
+GPU processes, which search_broker uses to recycle a bloated browser.
+Process trees are walked through /proc/<pid>/task/*/children, so a sample
+reads only the tree's own processes; kernels without that file fall back to
+one scan of /proc per sample.
+"""
+
+import os, threading, tracemalloc
+from typing import Dict, List, Optional
+
+MEMORY_PROFILE = os.getenv("MEMORY_PROFILE", "0") == "1"  # sample every discovery job
+MEMORY_SAMPLE_INTERVAL = float(os.getenv("MEMORY_SAMPLE_INTERVAL", "1"))
+BROWSER_RSS_LIMIT_MB = float(os.getenv("BROWSER_RSS_LIMIT_MB", "1024"))
+
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+
+
+def _rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status") as fh:
+            for line in fh:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0.0
+
+
+def _children_map() -> Dict[int, List[int]]:
+    children = {}
+    try:
+        pids = [int(name) for name in os.listdir("/proc") if name.isdigit()]
+    except OSError:
+        return children
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat") as fh:
+                # The command name may contain spaces; ppid is the 2nd field after it
+                ppid = int(fh.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(pid)
+    return children
+
+
+def _child_pids(pid: int) -> Optional[List[int]]:
+    """A process's children from /proc/<pid>/task/*/children; None if the kernel doesn't provide it"""
+    children = []
+    try:
+        tasks = os.listdir(f"/proc/{pid}/task")
+    except OSError:
+        return []  # the process is gone
+    for tid in tasks:
+        try:
+            with open(f"/proc/{pid}/task/{tid}/children") as fh:
+                children.extend(int(child) for child in fh.read().split())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            continue
+    return children
+
+
+def tree_rss_mb(pid: int, include_root: bool = True) -> float:
+    """RSS of a process and all its descendants (0 where /proc is unavailable)"""
+    children_map = None
+    def _children(parent):
+        nonlocal children_map
+        if children_map is None:
+            found = _child_pids(parent)
+            if found is not None:
+                return found
+            children_map = _children_map()
+        return children_map.get(parent, [])
+    total, stack = (_rss_mb(pid) if include_root else 0.0), list(_children(pid))
+    while stack:
+        child = stack.pop()
+        total += _rss_mb(child)
+        stack.extend(_children(child))
+    return total
+
+
+def browser_pid(browser) -> Optional[int]:
+    """The browser process id of a launched Chromium, None if it can't be asked"""
+    try:
+        session = browser.new_browser_cdp_session()
+        try:
+            info = session.send("SystemInfo.getProcessInfo")
+        finally:
+            session.detach()
+    except Exception:
+        return None
+    return next((proc["id"] for proc in info.get("processInfo", []) if proc.get("type") == "browser"), None)
+
+
+def _start_tracing():
+    global _tracing_users
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing_users = 1
+        elif _tracing_users:
+            _tracing_users += 1
+
+
+def _stop_tracing():
+    global _tracing_users
+    with _tracing_lock:
+        if _tracing_users:
+            _tracing_users -= 1
+            if _tracing_users == 0:
+                tracemalloc.stop()
+
+
+class MemorySampler:
+    def __init__(self, interval: float = MEMORY_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peaks = {"python_heap_mb": 0.0, "python_rss_mb": 0.0, "browser_rss_mb": 0.0}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        heap = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+        current = {
+            "python_heap_mb": heap / 1024 / 1024,
+            "python_rss_mb": _rss_mb(os.getpid()),
+            "browser_rss_mb": tree_rss_mb(os.getpid(), include_root=False),
+        }
+        for key, value in current.items():
+            self.peaks[key] = max(self.peaks[key], value)
+        self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self) -> "MemorySampler":
+        _start_tracing()
+        self._sample()
+        self._thread = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> dict:
+        """Stop sampling and return the peaks, in MB"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self._sample()
+        _stop_tracing()
+        return {**{key: round(value, 1) for key, value in self.peaks.items()}, "samples": self.samples}
@@ -0,0 +1,323 @@
+"""
+Outbox for opt-out emails.
+
+EmailGeneric used to leave each draft as a bare `.txt`, so every message had
+to be addressed and sent by hand. Drafts are now also stored as outbox
+messages in `storage/outbox/<id>.json`, with recipient, subject, body and
+delivery status. The recipient is the catalog's `email` field, else a
+mailto:/address found in the opt-out URL, requirements or notes, else
+privacy@<domain> (marked `recipient_source: guessed`). When the removal item
+is recorded, its message is linked to the (job, broker).
+
+From there the outbox can be:
+
+  - exported in one pass, as a streamed mbox or a zip of .eml files, for a
+    mail client
+  - sent over one reused SMTP connection. Sending is paced to OUTBOX_RATE
+    messages/sec and pauses OUTBOX_BATCH_PAUSE seconds after every
+    OUTBOX_BATCH_SIZE messages. Transient failures (4xx, dropped
+    connections) reconnect and retry with backoff; 5xx answers fail the
+    message. Each outcome is written to the message and to its removal item's
+    `email` field.
+"""
+
+import os, re, smtplib, time, uuid, zipfile
+from email.generator import BytesGenerator
+from email.message import EmailMessage
+from email.utils import format_datetime, make_msgid
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, List, Optional
+
+from .store import STORE_DIR, REMOVALS_JSON, load_json, save_json, store_lock
+
+OUTBOX_DIR = STORE_DIR / "outbox"
+OUTBOX_FROM = os.getenv("OUTBOX_FROM", "")  # default: the profile's first email
+OUTBOX_RATE = float(os.getenv("OUTBOX_RATE", "1"))  # messages/sec
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "20"))
+OUTBOX_BATCH_PAUSE = float(os.getenv("OUTBOX_BATCH_PAUSE", "30"))
+OUTBOX_RETRIES = int(os.getenv("OUTBOX_RETRIES", "3"))
+OUTBOX_RETRY_BACKOFF = 5.0  # seconds, doubled per attempt
+
+SMTP_HOST = os.getenv("SMTP_HOST", "")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USER = os.getenv("SMTP_USER", "")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") == "1"
+SMTP_SSL = os.getenv("SMTP_SSL", "0") == "1"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+
+DEFAULT_SUBJECT = "Data deletion request under CCPA/CPRA"
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+
+
+class OutboxError(Exception):
+    """Sending can't go on at all (no server configured, login refused, server unreachable)"""
+
+
+def _path(message_id: str):
+    return OUTBOX_DIR / f"{message_id}.json"
+
+
+def recipient_for(broker: dict):
+    """(address, source) to send a broker's opt-out email to"""
+    if broker.get("email"):
+        return broker["email"].strip(), "catalog"
+    mailto = re.search(r"mailto:([^?\s\"'>]+)", broker.get("optout_url") or "")
+    if mailto:
+        return mailto.group(1), "optout_url"
+    for field in ("requirements", "notes"):
+        found = EMAIL_RE.search(broker.get(field) or "")
+        if found:
+            return found.group(0), field
+    return f"privacy@{broker.get('domain', '')}", "guessed"
+
+
+def split_subject(text: str, default: str = DEFAULT_SUBJECT):
+    """(subject, body) from a drafted text that may open with a `Subject:` line"""
+    lines = (text or "").strip().splitlines()
+    if lines and lines[0].lower().startswith("subject:"):
+        return lines[0].split(":", 1)[1].strip() or default, "\n".join(lines[1:]).strip()
+    return default, (text or "").strip()
+
+
+def add_draft(broker: dict, pii: dict, subject: str, body: str) -> dict:
+    to, source = recipient_for(broker)
+    reply_to = next((e for e in pii.get("emails", []) if e), "")
+    sender = OUTBOX_FROM or reply_to
+    message = {
+        "id": f"{int(time.time() * 1000):013d}-{uuid.uuid4().hex[:8]}",
+        "job_id": None, "broker_id": None,
+        "broker_name": broker.get("name"), "domain": broker.get("domain"),
+        "to": to, "recipient_source": source, "from": sender, "reply_to": reply_to,
+        "subject": subject, "body": body,
+        "message_id": make_msgid(domain=(sender.split("@")[-1] if "@" in sender else None)),
+        "status": "draft", "attempts": 0, "error": None,
+        "created_at": time.time(), "sent_at": None,
+    }
+    OUTBOX_DIR.mkdir(parents=True, exist_ok=True)
+    save_json(_path(message["id"]), message)
+    return message
+
+
+def get_message(message_id: str) -> Optional[dict]:
+    return load_json(_path(message_id), None)
+
+
+def update_message(message_id: str, fn) -> Optional[dict]:
+    with store_lock():
+        message = get_message(message_id)
+        if message is None:
+            return None
+        fn(message)
+        save_json(_path(message_id), message)
+        return message
+
+
+def link(message_id: str, job_id: str, broker_id: int):
+    """Tie a draft to the removal item it was written for"""
+    update_message(message_id, lambda m: m.update(job_id=job_id, broker_id=broker_id))
+
+
+def iter_messages(status: Optional[str] = None, ids: Optional[Iterable[str]] = None) -> Iterator[dict]:
+    """Messages oldest first (ids sort by creation time), read one file at a time"""
+    if ids is not None:
+        paths = [_path(i) for i in ids]
+    else:
+        paths = sorted(OUTBOX_DIR.glob("*.json")) if OUTBOX_DIR.exists() else []
+    for path in paths:
+        message = load_json(path, None)
+        if message and (status is None or message["status"] == status):
+            yield message
+
+
+def to_email(message: dict) -> EmailMessage:
+    email = EmailMessage()
+    email["From"] = message["from"] or SMTP_USER
+    email["To"] = message["to"]
+    if message.get("reply_to"):
+        email["Reply-To"] = message["reply_to"]
+    email["Subject"] = message["subject"]
+    email["Date"] = format_datetime(datetime.fromtimestamp(message["created_at"], timezone.utc))
+    email["Message-ID"] = message["message_id"]
+    email["X-Outbox-Id"] = message["id"]
+    email.set_content(message["body"])
+    return email
+
+
+# --- export -------------------------------------------------------------------
+
+class _Chunks:
+    """File-like sink collecting what BytesGenerator writes"""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(data)
+
+    def take(self) -> bytes:
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+
+def export_mbox(messages: Iterable[dict]) -> Iterator[bytes]:
+    """The messages as an mbox file, one message's bytes at a time"""
+    sink = _Chunks()
+    generator = BytesGenerator(sink, mangle_from_=True)
+    for message in messages:
+        email = to_email(message)
+        email.set_unixfrom(f"From outbox {time.asctime(time.gmtime(message['created_at']))}")
+        generator.flatten(email, unixfrom=True)
+        sink.write(b"\n")
+        yield sink.take()
+
+
+def export_eml_zip(messages: Iterable[dict], fh) -> int:
+    """Write the messages into `fh` as a zip of <broker domain>-<id>.eml files; returns the count"""
+    count = 0
+    with zipfile.ZipFile(fh, "w", zipfile.ZIP_DEFLATED) as bundle:
+        for message in messages:
+            bundle.writestr(f"{message.get('domain') or 'broker'}-{message['id']}.eml", to_email(message).as_bytes())
+            count += 1
+    return count
+
+
+# --- sending ------------------------------------------------------------------
+
+class SmtpConnection:
+    """One SMTP session reused across messages, reopened after it drops"""
+
+    def __init__(self, host: str = SMTP_HOST, port: int = SMTP_PORT, user: str = SMTP_USER,
+                 password: str = SMTP_PASSWORD, starttls: bool = SMTP_STARTTLS, ssl: bool = SMTP_SSL,
+                 timeout: float = SMTP_TIMEOUT):
+        if not host:
+            raise OutboxError("SMTP_HOST is not configured")
+        self.host, self.port, self.user, self.password = host, port, user, password
+        self.starttls, self.ssl, self.timeout = starttls, ssl, timeout
+        self.smtp = None
+        self.connections = 0
+
+    def _open(self):
+        cls = smtplib.SMTP_SSL if self.ssl else smtplib.SMTP
+        smtp = cls(self.host, self.port, timeout=self.timeout)
+        try:
+            smtp.ehlo()
+            if self.starttls and not self.ssl:
+                smtp.starttls()
+                smtp.ehlo()
+            if self.user:
+                smtp.login(self.user, self.password)
+        except Exception:
+            smtp.close()
+            raise
+        self.smtp = smtp
+        self.connections += 1
+
+    def send(self, email: EmailMessage) -> dict:
+        if self.smtp is None:
+            self._open()
+        return self.smtp.send_message(email)
+
+    def drop(self):
+        """Forget a connection that failed; the next send opens a new one"""
+        if self.smtp is not None:
+            try:
+                self.smtp.close()
+            finally:
+                self.smtp = None
+
+    def close(self):
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except smtplib.SMTPException:
+                pass
+            self.drop()
+
+
+def _permanent(error: Exception) -> bool:
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return False
+
+
+def _record(message: dict, status: str, error: Optional[str] = None):
+    """Write one delivery outcome to the message and its removal item"""
+    now = time.time()
+    def _message(m):
+        m.update(status=status, error=error, attempts=message["attempts"],
+                 sent_at=now if status == "sent" else m.get("sent_at"))
+    update_message(message["id"], _message)
+    if message.get("job_id") and message.get("broker_id") is not None:
+        from .engine import update_item
+        def _item(item):
+            item["email"] = {"outbox_id": message["id"], "to": message["to"], "status": status,
+                             "attempts": message["attempts"], "error": error,
+                             "sent_at": now if status == "sent" else None}
+            if status == "sent":
+                item["status"] = "email_sent"
+        update_item(REMOVALS_JSON, message["job_id"], message["broker_id"], _item)
+
+
+def send_messages(messages: List[dict], connection: Optional[SmtpConnection] = None, rate: float = OUTBOX_RATE,
+                  batch_size: int = OUTBOX_BATCH_SIZE, batch_pause: float = OUTBOX_BATCH_PAUSE,
+                  retries: int = OUTBOX_RETRIES, backoff: float = OUTBOX_RETRY_BACKOFF, cancel=None) -> dict:
+    """
+    Send `messages` in order over one connection. Returns counts; raises
+    OutboxError if the server can't be used at all (login refused, or no
+    connection after every retry).
+    """
+    connection = connection or SmtpConnection()
+    wait = (lambda s: cancel.wait(s)) if cancel else time.sleep
+    stopped = lambda: bool(cancel and cancel.cancelled)
+    summary = {"sent": 0, "failed": 0, "retried": 0}
+    started, last_send = time.monotonic(), 0.0
+    try:
+        for n, message in enumerate(messages):
+            if stopped():
+                break
+            if n and batch_size and n % batch_size == 0:
+                print(f"📮 Sent a batch of {batch_size}, pausing {batch_pause:.0f}s")
+                wait(batch_pause)
+            email = to_email(message)
+            for attempt in range(retries + 1):
+                if stopped():
+                    break
+                if rate > 0:
+                    wait(max(0.0, last_send + 1 / rate - time.monotonic()))
+                last_send = time.monotonic()
+                message["attempts"] += 1
+                try:
+                    refused = connection.send(email)
+                except smtplib.SMTPAuthenticationError as e:
+                    raise OutboxError(f"SMTP login refused: {e}")
+                except (smtplib.SMTPException, OSError) as e:
+                    if _permanent(e) or attempt == retries:
+                        if connection.connections == 0:
+                            raise OutboxError(f"cannot reach SMTP server {connection.host}:{connection.port}: {e}")
+                        print(f"    ❌ {message['to']}: {e}")
+                        _record(message, "failed", str(e))
+                        summary["failed"] += 1
+                        break
+                    # 4xx or a dropped connection: reconnect and try again
+                    if not isinstance(e, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)):
+                        connection.drop()
+                    summary["retried"] += 1
+                    wait(backoff * 2 ** attempt)
+                    continue
+                if refused:
+                    _record(message, "failed", f"refused: {refused}")
+                    summary["failed"] += 1
+                else:
+                    _record(message, "sent")
+                    summary["sent"] += 1
+                break
+    finally:
+        connection.close()
+    summary.update(connections=connection.connections, elapsed_s=round(time.monotonic() - started, 2),
+                   cancelled=stopped())
+    print(f"📮 Outbox: {summary['sent']} sent, {summary['failed']} failed over "
+          f"{summary['connections']} connection(s) in {summary['elapsed_s']}s")
+    return summary
@@ -0,0 +1,177 @@
+"""
+Per-domain politeness scheduling shared by discovery and removal.
+
+Every navigation to a broker site goes through `POLITENESS.acquire(domain)`,
+which enforces a token bucket per domain across all jobs and connectors in
+this process. Callers report what came back with `POLITENESS.report(...)`;
+throttling signals (HTTP 429/503 or a CAPTCHA/bot-check page) put the domain
+into an exponential cooldown so workers can move on to brokers on other domains.
+Replayed sessions (SESSION_ARCHIVE=replay) never reach a broker, so they are
+neither paced nor counted.
+"""
+
+import os, threading, time
+from typing import Callable, List, Optional
+from urllib.parse import urlparse
+
+from .session_archive import SESSION_ARCHIVE
+
+RATE_PER_SECOND = float(os.getenv("POLITENESS_RATE", "0.5"))  # sustained requests/sec per domain
+BURST = float(os.getenv("POLITENESS_BURST", "2"))
+BACKOFF_BASE = float(os.getenv("POLITENESS_BACKOFF_BASE", "30"))  # seconds, doubled per strike
+BACKOFF_MAX = float(os.getenv("POLITENESS_BACKOFF_MAX", "900"))
+POLITENESS_MAX_WAIT = float(os.getenv("POLITENESS_MAX_WAIT", "20"))  # give the broker back if cooling longer
+
+THROTTLE_STATUSES = {429, 503}
+
+# Markers of bot-check / CAPTCHA interstitials. Plain "captcha" is deliberately
+# absent: plenty of opt-out forms embed a reCAPTCHA widget without blocking us.
+BLOCK_PAGE_MARKERS = [
+    "verify you are human", "are you a robot", "unusual traffic",
+    "cf-chl-", "challenge-platform", "attention required! | cloudflare",
+    "captcha-delivery.com", "px-captcha",
+    "please complete the security check", "access to this page has been denied",
+]
+
+
+def normalize_domain(value: str) -> str:
+    """Reduce a domain or URL to a bare lowercase host without `www.`"""
+    value = (value or "").strip().lower()
+    if "://" in value:
+        value = urlparse(value).netloc
+    value = value.split("/")[0].split(":")[0]
+    return value[4:] if value.startswith("www.") else value
+
+
+def looks_blocked(html: str) -> bool:
+    """True if the page looks like a CAPTCHA or bot-check interstitial"""
+    if not html:
+        return False
+    head = html[:200000].lower()
+    return any(marker in head for marker in BLOCK_PAGE_MARKERS)
+
+
+class DomainScheduler:
+    """Token buckets and exponential cooldowns keyed by domain"""
+
+    def __init__(self, rate: float = RATE_PER_SECOND, burst: float = BURST,
+                 backoff_base: float = BACKOFF_BASE, backoff_max: float = BACKOFF_MAX):
+        self.rate = rate
+        self.burst = burst
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._lock = threading.Lock()
+        self._domains = {}
+
+    def _state(self, domain: str) -> dict:
+        state = self._domains.get(domain)
+        if state is None:
+            state = {"tokens": self.burst, "updated": time.monotonic(),
+                     "cooldown_until": 0.0, "strikes": 0, "throttled": 0}
+            self._domains[domain] = state
+        return state
+
+    def _refill(self, state: dict, now: float):
+        state["tokens"] = min(self.burst, state["tokens"] + (now - state["updated"]) * self.rate)
+        state["updated"] = now
+
+    def ready_in(self, domain: str) -> float:
+        """Seconds until a request to `domain` would be allowed"""
+        if SESSION_ARCHIVE.replaying:
+            return 0.0
+        domain = normalize_domain(domain)
+        with self._lock:
+            now = time.monotonic()
+            state = self._state(domain)
+            self._refill(state, now)
+            wait = max(0.0, state["cooldown_until"] - now)
+            if state["tokens"] < 1:
+                wait = max(wait, (1 - state["tokens"]) / self.rate)
+            return wait
+
+    def is_cooling(self, domain: str) -> bool:
+        domain = normalize_domain(domain)
+        with self._lock:
+            return self._state(domain)["cooldown_until"] > time.monotonic()
+
+    def acquire(self, domain: str, max_wait: Optional[float] = None,
+                should_stop: Optional[Callable[[], bool]] = None) -> bool:
+        """
+        Block until a token for `domain` is available and take it.
+        Returns False without taking a token if the wait would exceed `max_wait`
+        or `should_stop()` becomes true while waiting.
+        """
+        if SESSION_ARCHIVE.replaying:
+            return True
+        domain = normalize_domain(domain)
+        deadline = None if max_wait is None else time.monotonic() + max_wait
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                state = self._state(domain)
+                self._refill(state, now)
+                wait = max(0.0, state["cooldown_until"] - now)
+                if state["tokens"] < 1:
+                    wait = max(wait, (1 - state["tokens"]) / self.rate)
+                if wait <= 0:
+                    state["tokens"] -= 1
+                    return True
+            if deadline is not None and now + wait > deadline:
+                return False
+            if should_stop and should_stop():
+                return False
+            time.sleep(min(wait, 0.5))
+
+    def report(self, domain: str, status: Optional[int] = None, html: Optional[str] = None) -> bool:
+        """
+        Record the outcome of a request. Returns True if it was throttled, in
+        which case the domain enters an exponentially growing cooldown.
+        """
+        domain = normalize_domain(domain)
+        throttled = (status in THROTTLE_STATUSES) or looks_blocked(html)
+        if SESSION_ARCHIVE.replaying:
+            return throttled
+        with self._lock:
+            state = self._state(domain)
+            if throttled:
+                state["strikes"] += 1
+                state["throttled"] += 1
+                backoff = min(self.backoff_max, self.backoff_base * (2 ** (state["strikes"] - 1)))
+                state["cooldown_until"] = max(state["cooldown_until"], time.monotonic() + backoff)
+                state["tokens"] = 0.0
+                print(f"    🐢 {domain} throttled (status={status}), cooling down for {backoff:.0f}s")
+            elif status is not None and status < 400:
+                state["strikes"] = max(0, state["strikes"] - 1)
+        return throttled
+
+    def pick(self, candidates: List[dict], domain_of: Callable[[dict], str] = lambda b: b.get("domain", "")) -> int:
+        """
+        Index of the candidate whose domain is ready soonest, preferring list
+        order among domains that are ready now. -1 for an empty list.
+        """
+        best, best_wait = -1, None
+        for idx, candidate in enumerate(candidates):
+            wait = self.ready_in(domain_of(candidate))
+            if wait <= 0:
+                return idx
+            if best_wait is None or wait < best_wait:
+                best, best_wait = idx, wait
+        return best
+
+    def snapshot(self) -> dict:
+        """Current cooldowns and strike counts, for status reporting"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                domain: {
+                    "cooldown_remaining": round(max(0.0, s["cooldown_until"] - now), 1),
+                    "strikes": s["strikes"],
+                    "throttled": s["throttled"],
+                }
+                for domain, s in self._domains.items()
+                if s["throttled"]
+            }
+
+
+# Process-wide scheduler shared by every job and connector
+POLITENESS = DomainScheduler()
@@ -0,0 +1,248 @@
+"""
+On-demand profiling of single jobs and of API requests.
+
+A job started with profile=true gets a `JobProfiler`. Each unit of the job's
+work (its planning step and every broker task) runs inside
+`profiler.task()`, on whichever scheduler thread picks it up, so other jobs
+sharing those threads are not captured. Two modes:
+
+  - "cprofile": a cProfile.Profile per task, merged into one pstats file
+    (deterministic, every call, noticeable overhead on hot pure-Python code)
+  - "sampling": a background thread samples the stacks of the threads
+    currently running the job's tasks every PROFILE_SAMPLE_INTERVAL seconds
+    and writes collapsed stacks (flamegraph.pl / speedscope input). It shows
+    wall-clock time, browser waits included, at a fixed small cost.
+
+Artifacts go next to the job's evidence (`storage/evidence/<job_id>/`), with
+a plain-text top-N summary. Jobs without the flag run no profiling code.
+
+`RequestProfiler` is an ASGI middleware. While switched on from the admin
+endpoint, it samples every thread during each request whose path matches
+the prefix, so work handed to the threadpool is included. Threads parked
+in waits are left out. Captures go to `storage/profiles/requests/` and the
+newest REQUEST_PROFILE_KEEP are kept. Switched off, it costs one dict lookup
+per request.
+"""
+
+import cProfile, io, os, pstats, sys, threading, time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .store import STORE_DIR
+
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+REQUEST_PROFILE_DIR = STORE_DIR / "profiles" / "requests"
+REQUEST_PROFILE_KEEP = int(os.getenv("REQUEST_PROFILE_KEEP", "50"))
+MODES = ("cprofile", "sampling")
+SUMMARY_LINES = 40
+IDLE_FILES = ("threading.py", "selectors.py", "queue.py")
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _idle(frame) -> bool:
+    return frame.f_code.co_filename.endswith(IDLE_FILES)
+
+
+class StackSampler:
+    """Counts collapsed stacks of some threads (or all but itself) at a fixed interval"""
+
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL, skip_idle: bool = False):
+        self.interval = interval
+        self.skip_idle = skip_idle
+        self.stacks = Counter()
+        self.samples = 0
+        self.threads = None  # thread idents to sample; None = every other thread
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        own = threading.get_ident()
+        targets = self.threads
+        for ident, frame in sys._current_frames().items():
+            if ident == own or (targets is not None and ident not in targets):
+                continue
+            if self.skip_idle and _idle(frame):
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self) -> "StackSampler":
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self, lines: int = SUMMARY_LINES) -> str:
+        """Frames by share of samples they appear in (inclusive) and are on top of (self)"""
+        total, inclusive, self_time = sum(self.stacks.values()), Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            for frame in set(frames):
+                inclusive[frame] += count
+            self_time[frames[-1]] += count
+        out = [f"{self.samples} samples every {self.interval * 1000:g} ms, {total} stacks",
+               f"{'incl%':>6} {'self%':>6}  frame"]
+        for frame, count in inclusive.most_common(lines):
+            out.append(f"{100 * count / total:6.1f} {100 * self_time[frame] / total:6.1f}  {frame}")
+        return "\n".join(out) + "\n"
+
+
+class JobProfiler:
+    def __init__(self, mode: str = "cprofile"):
+        if mode not in MODES:
+            raise ValueError(f"profile mode must be one of {MODES}")
+        self.mode = mode
+        self.tasks = 0
+        self._lock = threading.Lock()
+        self._stats = None
+        self._active = {}  # thread ident -> tasks running on it
+        self._sampler = None
+        self._started = time.monotonic()
+        if mode == "sampling":
+            self._sampler = StackSampler()
+            self._sampler.threads = set()
+            self._sampler.start()
+
+    @contextmanager
+    def task(self):
+        """Profile the job work done on this thread inside the block"""
+        if self.mode == "cprofile":
+            prof = cProfile.Profile()
+            prof.enable()
+            try:
+                yield
+            finally:
+                prof.disable()
+                with self._lock:
+                    self.tasks += 1
+                    if self._stats is None:
+                        self._stats = pstats.Stats(prof)
+                    else:
+                        self._stats.add(prof)
+            return
+        ident = threading.get_ident()
+        with self._lock:
+            self.tasks += 1
+            self._active[ident] = self._active.get(ident, 0) + 1
+            self._sampler.threads = set(self._active)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active[ident] -= 1
+                if not self._active[ident]:
+                    del self._active[ident]
+                self._sampler.threads = set(self._active)
+
+    def save(self, directory) -> dict:
+        """Write the artifacts into `directory`; returns what the job record keeps"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        info = {"mode": self.mode, "tasks": self.tasks, "wall_s": round(time.monotonic() - self._started, 2)}
+        if self.mode == "cprofile":
+            text = io.StringIO()
+            if self._stats is not None:
+                self._stats.dump_stats(directory / "profile.prof")
+                self._stats.stream = text
+                self._stats.sort_stats("cumulative").print_stats(SUMMARY_LINES)
+                files = ["profile.prof", "profile.txt"]
+            else:
+                text.write("no tasks ran\n")
+                files = ["profile.txt"]
+            (directory / "profile.txt").write_text(text.getvalue())
+        else:
+            self._sampler.stop()
+            (directory / "profile.folded").write_text(self._sampler.folded())
+            (directory / "profile.txt").write_text(self._sampler.summary())
+            info["samples"] = self._sampler.samples
+            files = ["profile.folded", "profile.txt"]
+        info["files"] = files
+        return info
+
+
+def artifact_path(directory, info: Optional[dict], name: Optional[str] = None) -> Optional[Path]:
+    """A job's profiling artifact by name (default: the first), only if the job recorded it"""
+    if not info or not info.get("files"):
+        return None
+    name = name or info["files"][0]
+    if name not in info["files"]:
+        return None
+    path = Path(directory) / name
+    return path if path.exists() else None
+
+
+REQUEST_PROFILING = {"enabled": False, "path_prefix": "/", "min_ms": 0.0}  # set by the admin endpoint
+
+
+class RequestProfiler:
+    """ASGI middleware sampling matching requests while REQUEST_PROFILING is enabled"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        settings = REQUEST_PROFILING
+        if not settings["enabled"] or scope["type"] != "http" or not scope["path"].startswith(settings["path_prefix"]):
+            return await self.app(scope, receive, send)
+        sampler = StackSampler(skip_idle=True).start()
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            sampler.stop()
+            elapsed_ms = (time.monotonic() - started) * 1000
+            if elapsed_ms >= settings["min_ms"]:
+                _save_request(scope, elapsed_ms, sampler)
+
+
+def _save_request(scope, elapsed_ms: float, sampler: StackSampler):
+    REQUEST_PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    slug = scope["path"].strip("/").replace("/", "_") or "root"
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{int(time.time() * 1000) % 1000:03d}-{scope['method']}-{slug}"[:120]
+    header = f"{scope['method']} {scope['path']} {elapsed_ms:.1f} ms\n"
+    (REQUEST_PROFILE_DIR / f"{name}.folded").write_text(sampler.folded())
+    (REQUEST_PROFILE_DIR / f"{name}.txt").write_text(header + sampler.summary())
+    captures = sorted(REQUEST_PROFILE_DIR.glob("*.txt"))
+    for old in captures[:-REQUEST_PROFILE_KEEP]:
+        for path in (old, old.with_suffix(".folded")):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def request_captures() -> List[Dict]:
+    if not REQUEST_PROFILE_DIR.exists():
+        return []
+    captures = []
+    for path in sorted(REQUEST_PROFILE_DIR.glob("*.txt"), reverse=True):
+        with open(path) as fh:
+            captures.append({"name": path.stem, "request": fh.readline().strip(),
+                             "files": [path.name, path.with_suffix(".folded").name]})
+    return captures
+
+
+def request_capture_path(name: str) -> Optional[Path]:
+    path = REQUEST_PROFILE_DIR / os.path.basename(name)
+    return path if path.suffix in (".txt", ".folded") and path.exists() else None
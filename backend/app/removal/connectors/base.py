@@ -2,10 +2,11 @@
 from abc import ABC, abstractmethod
 
 class RemovalConnector(ABC):
-    def __init__(self, broker: dict, pii: dict, headless: bool = True):
+    def __init__(self, broker: dict, pii: dict, headless: bool = True, cancel=None):
         self.broker = broker
         self.pii = pii
         self.headless = headless
+        self.cancel = cancel  # CancelToken of the owning job, if any
 
     @abstractmethod
     def submit(self) -> dict:
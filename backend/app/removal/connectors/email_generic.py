@@ -1,8 +1,9 @@
 
 from .base import RemovalConnector
-from ...llm_engine import smart_llm
+from ...llm_engine import llm_failed, smart_llm
+from ...outbox import add_draft, split_subject
+from ...store import STORE_DIR
 from datetime import datetime
-from pathlib import Path
 
 EMAIL_TEMPLATE_PROMPT = """You are drafting a concise data-broker opt-out email.
 Subject: Data removal request
@@ -20,9 +21,18 @@ class EmailGeneric(RemovalConnector):
         broker = self.broker
         pii = self.pii
         prompt = EMAIL_TEMPLATE_PROMPT.format(broker=broker.get("name"), domain=broker.get("domain"), pii=str({k:pii.get(k) for k in ['names','emails','phones','addresses']}))
-        body = smart_llm(prompt)
-        drafts = Path(__file__).resolve().parents[4] / "storage" / "drafts"
+        body = smart_llm(prompt, cancel=self.cancel)
+        if self.cancel and self.cancel.cancelled:
+            return {"status":"cancelled","transcript":"Job cancelled before the draft was written","evidence_path": None}
+        if llm_failed(body):
+            # Never queue an error message where the outbox could mail it to the broker
+            return {"status":"error","transcript":f"Draft not written: {body.strip() or 'empty LLM output'}","evidence_path": None}
+        drafts = STORE_DIR / "drafts"
         drafts.mkdir(parents=True, exist_ok=True)
         fname = drafts / f"optout_{broker.get('domain','broker')}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.txt"
         fname.write_text(body)
-        return {"status":"drafted","transcript":"Draft email created","evidence_path": str(fname)}
+        # Also queue it in the outbox, addressed, for bulk export or SMTP sending
+        subject, text = split_subject(body)
+        message = add_draft(broker, pii, subject, text)
+        return {"status":"drafted","transcript":f"Draft email created for {message['to']}","evidence_path": str(fname),
+                "outbox_id": message["id"], "email_to": message["to"]}
@@ -0,0 +1,152 @@
+
+import asyncio, os, time, uuid
+from typing import Callable, List, Tuple
+
+from playwright.async_api import async_playwright
+
+from ...browser_state import load_state, local_storage_script, save_state
+from ...politeness import POLITENESS, POLITENESS_MAX_WAIT, normalize_domain
+from ...session_archive import SESSION_ARCHIVE
+from ...store import STORE_DIR
+from ..form_fill import FILL_JS, fill_values, load_recipe, save_recipe
+
+FORM_BATCH_CONTEXTS = int(os.getenv("FORM_BATCH_CONTEXTS", "3"))
+SETTLE_TIMEOUT_MS = 5000  # after submitting, wait at most this long for the page to load
+
+
+def submit_forms(brokers: List[Tuple[int, dict]], pii: dict, on_result: Callable[[int, dict, dict], None],
+                 contexts: int = FORM_BATCH_CONTEXTS, headless: bool = True, cancel=None):
+    """
+    Submit opt-out forms for many (broker_id, broker) pairs from one browser.
+
+    A fixed pool of browser contexts works through the list concurrently.
+    Each submission is one navigation, one in-page fill evaluation and a click,
+    and only waits for the load event rather than network idle. `on_result` is
+    called as each broker finishes. Blocks until every broker is done or
+    `cancel` fires.
+    """
+    if not brokers:
+        return
+    asyncio.run(_submit_all(list(brokers), pii, on_result, max(1, contexts), headless, cancel))
+
+
+async def _submit_all(brokers, pii, on_result, contexts, headless, cancel):
+    evidence_dir = STORE_DIR / "evidence" / "removals"
+    evidence_dir.mkdir(parents=True, exist_ok=True)
+    values = fill_values(pii)
+    loop = asyncio.get_running_loop()
+    current = asyncio.current_task()
+    unregister = cancel.on_cancel(lambda: loop.call_soon_threadsafe(current.cancel)) if cancel else (lambda: None)
+
+    async def _worker(browser):
+        if SESSION_ARCHIVE.mode:
+            # Each broker gets its own context so it gets its own archive
+            while brokers:
+                broker_id, broker = brokers.pop(0)
+                result = await _submit_archived(browser, broker, values, evidence_dir, cancel)
+                if result["status"] == "cancelled":
+                    return
+                on_result(broker_id, broker, result)
+            return
+        context = await browser.new_context()
+        try:
+            while brokers:
+                broker_id, broker = brokers.pop(0)
+                result = await _submit_one(context, broker, values, evidence_dir, cancel)
+                if result["status"] == "cancelled":
+                    return
+                on_result(broker_id, broker, result)
+                await context.clear_cookies()
+        finally:
+            await context.close()
+
+    try:
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=headless)
+            try:
+                await asyncio.gather(*(_worker(browser) for _ in range(min(contexts, len(brokers)))))
+            finally:
+                await browser.close()
+    except asyncio.CancelledError:
+        print(f"🛑 Form batch cancelled with {len(brokers)} brokers left")
+    finally:
+        unregister()
+
+
+def _domain(broker: dict) -> str:
+    url = broker.get("optout_url") or broker.get("search_url") or f"https://{broker.get('domain','')}"
+    return normalize_domain(broker.get("domain") or url)
+
+
+async def _submit_archived(browser, broker: dict, values: dict, evidence_dir, cancel=None) -> dict:
+    """_submit_one in a context recording to, or replaying from, the broker's session archive"""
+    domain = _domain(broker)
+    context = await browser.new_context(**SESSION_ARCHIVE.context_options(domain, "form"))
+    try:
+        await SESSION_ARCHIVE.replay_async(context, domain, "form")
+        return await _submit_one(context, broker, values, evidence_dir, cancel, restore_state=False)
+    finally:
+        await context.close()
+
+
+async def _submit_one(context, broker: dict, values: dict, evidence_dir, cancel=None,
+                      restore_state: bool = True) -> dict:
+    url = broker.get("optout_url") or broker.get("search_url") or f"https://{broker.get('domain','')}"
+    domain = _domain(broker)
+    evidence_path = evidence_dir / f"{broker.get('domain', 'unknown')}_{uuid.uuid4()}.png"
+    timings = {}
+    started = time.perf_counter()
+
+    def _lap(name):
+        timings[name] = round(time.perf_counter() - started - sum(timings.values()), 3)
+
+    # Bounded, so a long cooldown can't hold a pool thread, and abandoned on cancel
+    cancelled = (lambda: cancel.cancelled) if cancel else None
+    if not await asyncio.to_thread(POLITENESS.acquire, domain, POLITENESS_MAX_WAIT, cancelled):
+        if cancel and cancel.cancelled:
+            return {"status": "cancelled", "transcript": "Job cancelled before the form was opened", "evidence_path": None}
+        return {"status": "skipped", "transcript": f"{domain} is cooling down; retry later", "evidence_path": None,
+                "duration_s": round(time.perf_counter() - started, 3), "timings": timings}
+    _lap("politeness_s")
+    # Pooled contexts can't take storage_state, so restore the domain's saved state by hand
+    state = load_state(domain) if restore_state else None
+    if state and state["cookies"]:
+        await context.add_cookies(state["cookies"])
+    page = await context.new_page()
+    try:
+        script = local_storage_script(state)
+        if script:
+            await page.add_init_script(script)
+        response = await page.goto(url, wait_until="domcontentloaded", timeout=30000)
+        _lap("load_s")
+        fill = await page.evaluate(FILL_JS, {"values": values, "recipe": load_recipe(domain)})
+        _lap("fill_s")
+        if POLITENESS.report(domain, status=response.status if response else None, html=fill["block_check"]):
+            await page.screenshot(path=str(evidence_path))
+            status, transcript = "rate_limited", f"{domain} is throttling or showing a CAPTCHA; retry later"
+        elif not fill["filled"] or not fill["submit"]:
+            await page.screenshot(path=str(evidence_path))
+            status, transcript = "manual_required", "No opt-out form detected; submit manually"
+        else:
+            await page.click(fill["submit"], timeout=2000)
+            try:
+                await page.wait_for_load_state("load", timeout=SETTLE_TIMEOUT_MS)
+            except Exception:
+                pass
+            _lap("submit_s")
+            await page.screenshot(path=str(evidence_path))
+            save_recipe(domain, fill)
+            save_state(domain, await context.storage_state())
+            status = "submitted"
+            transcript = f"Form submitted with {', '.join(fill['filled'])} (verify if CAPTCHA present)"
+        _lap("evidence_s")
+        return {"status": status, "transcript": transcript, "evidence_path": str(evidence_path),
+                "recipe_hit": fill["recipe_used"], "duration_s": round(time.perf_counter() - started, 3),
+                "timings": timings}
+    except Exception as e:
+        print(f"Error in form submission for {broker.get('name')}: {e}")
+        return {"status": "error", "transcript": f"Error: {str(e)}",
+                "evidence_path": str(evidence_path) if evidence_path.exists() else None,
+                "duration_s": round(time.perf_counter() - started, 3), "timings": timings}
+    finally:
+        await page.close()
@@ -1,17 +1,16 @@
 
 from playwright.sync_api import sync_playwright
 from .base import RemovalConnector
-
-DEFAULT_FIELDS = [
-  ("input[name='name']", lambda pii: (pii.get('names') or [""])[0]),
-  ("input[name='email']", lambda pii: (pii.get('emails') or [""])[0]),
-  ("input[name='phone']", lambda pii: (pii.get('phones') or [""])[0]),
-]
+from ...politeness import POLITENESS, POLITENESS_MAX_WAIT, normalize_domain
+from ...cancellation import close_playwright_threadsafe
+from ...browser_state import save_state
+from ...session_archive import SESSION_ARCHIVE
+from ...store import STORE_DIR
+from ..form_fill import FILL_JS, fill_values, load_recipe, save_recipe
 
 class GenericForm(RemovalConnector):
     def submit(self):
-        from pathlib import Path
-        import time, uuid
+        import uuid
 
         broker = self.broker
         pii = self.pii
@@ -20,39 +19,54 @@ class GenericForm(RemovalConnector):
         if not url:
             return {"status":"error","transcript":"No opt-out URL","evidence_path":None}
 
-        # Setup evidence directory
-        store_dir = Path(__file__).resolve().parents[4] / "storage"
-        evidence_dir = store_dir / "evidence" / "removals"
+        # Setup evidence directory (under STORAGE_DIR, where retention looks for it)
+        evidence_dir = STORE_DIR / "evidence" / "removals"
         evidence_dir.mkdir(parents=True, exist_ok=True)
 
         evidence_filename = f"{broker.get('domain', 'unknown')}_{uuid.uuid4()}.png"
         evidence_path = evidence_dir / evidence_filename
 
+        domain = normalize_domain(broker.get("domain") or url)
+        cancel = self.cancel
+        if not POLITENESS.acquire(domain, max_wait=POLITENESS_MAX_WAIT,
+                                  should_stop=(lambda: cancel.cancelled) if cancel else None):
+            if cancel and cancel.cancelled:
+                return {"status":"cancelled","transcript":"Job cancelled before the form was opened","evidence_path":None}
+            return {"status":"skipped","transcript":f"{domain} is cooling down; retry later","evidence_path":None}
+
         with sync_playwright() as p:
             # We use headless=False assuming manual intervention might be needed for CAPTCHA
             # if running locally, otherwise this might fail in headless environments without display
             browser = p.chromium.launch(headless=self.headless)
-            page = browser.new_page()
+            context = browser.new_context(**SESSION_ARCHIVE.context_options(domain, "form"))
+            SESSION_ARCHIVE.replay(context, domain, "form")
+            page = context.new_page()
+            unregister = cancel.on_cancel(lambda: close_playwright_threadsafe(browser)) if cancel else (lambda: None)
             try:
-                page.goto(url, timeout=30000)
-                for sel, fn in DEFAULT_FIELDS:
-                    try:
-                        if page.locator(sel).count():
-                            page.fill(sel, fn(pii))
-                    except Exception:
-                        pass
-                # try submit
-                for btn in ["button[type=submit]","button:has-text('Submit')","input[type=submit]"]:
-                    try:
-                        if page.locator(btn).count():
-                            page.click(btn, timeout=2000)
-                            break
-                    except Exception:
-                        pass
+                response = page.goto(url, timeout=30000)
+                # One evaluation detects and fills the fields (or replays the domain's recipe)
+                fill = page.evaluate(FILL_JS, {"values": fill_values(pii), "recipe": load_recipe(domain)})
+                if POLITENESS.report(domain, status=response.status if response else None, html=fill["block_check"]):
+                    page.screenshot(path=str(evidence_path), full_page=True)
+                    return {"status":"rate_limited","transcript":f"{domain} is throttling or showing a CAPTCHA; retry later","evidence_path": str(evidence_path)}
+                if not fill["filled"] or not fill["submit"]:
+                    # Nothing was filled or there's nothing to submit: not a removal
+                    page.screenshot(path=str(evidence_path), full_page=True)
+                    return {"status":"manual_required","transcript":"No opt-out form detected; submit manually","evidence_path": str(evidence_path)}
+                try:
+                    page.click(fill["submit"], timeout=2000)
+                except Exception as e:
+                    page.screenshot(path=str(evidence_path), full_page=True)
+                    return {"status":"manual_required","transcript":f"Filled {', '.join(fill['filled'])} but could not click submit ({e}); submit manually","evidence_path": str(evidence_path)}
 
                 page.wait_for_load_state("networkidle", timeout=10000)
                 page.screenshot(path=str(evidence_path), full_page=True)
+                save_recipe(domain, fill)
+                save_state(domain, context.storage_state())
+                filled = fill["filled"]
             except Exception as e:
+                if cancel and cancel.cancelled:
+                    return {"status":"cancelled","transcript":"Job cancelled while the form was open","evidence_path":None}
                 print(f"Error in form submission for {broker.get('name')}: {e}")
                 # Try to take screenshot of error
                 try:
@@ -61,6 +75,12 @@ class GenericForm(RemovalConnector):
                     pass
                 return {"status":"error","transcript":f"Error: {str(e)}","evidence_path": str(evidence_path) if evidence_path.exists() else None}
             finally:
-                browser.close()
+                unregister()
+                try:
+                    if SESSION_ARCHIVE.recording:
+                        context.close()  # writes the session's HAR archive
+                    browser.close()
+                except Exception:
+                    pass
 
-        return {"status":"submitted","transcript":"Generic form submitted (verify if CAPTCHA present)","evidence_path": str(evidence_path)}
+        return {"status":"submitted","transcript":f"Form submitted with {', '.join(filled)} (verify if CAPTCHA present)","evidence_path": str(evidence_path)}
@@ -0,0 +1,151 @@
+"""
+Opt-out form filling in a single in-page evaluation, with per-domain recipes.
+
+FILL_JS finds the form fields and the submit button, fills the fields, and
+returns the selectors it used, all in one round trip. The selectors become
+the domain's recipe in `storage/form_recipes.json`; the next submission to
+that domain uses them directly and only falls back to detection if the page
+changed. The same evaluation returns the text that bot-check detection looks
+at, so a CAPTCHA page is caught without another call.
+"""
+
+import time
+from typing import Optional
+
+from ..politeness import normalize_domain
+from ..session_archive import SESSION_ARCHIVE
+from ..store import STORE_DIR, load_json, save_json, store_lock
+
+FORM_RECIPES_JSON = STORE_DIR / "form_recipes.json"
+
+FILL_JS = r"""
+({values, recipe}) => {
+  const isVisible = el => {
+    const r = el.getBoundingClientRect(), s = getComputedStyle(el);
+    return r.width > 0 && r.height > 0 && s.visibility !== 'hidden' && s.display !== 'none';
+  };
+  const unique = sel => { try { return document.querySelectorAll(sel).length === 1; } catch (e) { return false; } };
+  const selectorFor = el => {
+    if (el.id && unique('#' + CSS.escape(el.id))) return '#' + CSS.escape(el.id);
+    const tag = el.tagName.toLowerCase();
+    if (el.name && unique(`${tag}[name="${CSS.escape(el.name)}"]`)) return `${tag}[name="${CSS.escape(el.name)}"]`;
+    const path = [];
+    for (let node = el; node && node.nodeType === 1 && node !== document.body; node = node.parentElement) {
+      let idx = 1;
+      for (let sib = node.previousElementSibling; sib; sib = sib.previousElementSibling)
+        if (sib.tagName === node.tagName) idx++;
+      path.unshift(`${node.tagName.toLowerCase()}:nth-of-type(${idx})`);
+    }
+    return 'body > ' + path.join(' > ');
+  };
+  const describe = el => [
+    el.name, el.id, el.placeholder, el.getAttribute('autocomplete'), el.getAttribute('aria-label'),
+    ...Array.from(el.labels || []).map(l => l.innerText),
+  ].filter(Boolean).join(' ').toLowerCase();
+  const setValue = (el, value) => {
+    const proto = el.tagName === 'TEXTAREA' ? HTMLTextAreaElement.prototype : HTMLInputElement.prototype;
+    Object.getOwnPropertyDescriptor(proto, 'value').set.call(el, value);  // works with React-controlled inputs
+    el.dispatchEvent(new Event('input', {bubbles: true}));
+    el.dispatchEvent(new Event('change', {bubbles: true}));
+  };
+
+  // Order matters: first/last name before the generic name pattern
+  const PATTERNS = [
+    ['email', /e-?mail/],
+    ['phone', /phone|mobile|\btel\b/],
+    ['first_name', /first|given|fname/],
+    ['last_name', /last|surname|family|lname/],
+    ['address', /address|street/],
+    ['name', /name/],
+  ];
+
+  let fields = {}, recipeUsed = false;
+  if (recipe && recipe.fields) {
+    const found = Object.entries(recipe.fields).map(([field, sel]) => [field, document.querySelector(sel)]);
+    if (found.length && found.every(([, el]) => el)) {
+      found.forEach(([field, el]) => { fields[field] = el; });
+      recipeUsed = true;
+    }
+  }
+  if (!recipeUsed) {
+    const inputs = Array.from(document.querySelectorAll('input, textarea')).filter(el =>
+      isVisible(el) && !el.disabled && !el.readOnly &&
+      ['text', 'email', 'tel', 'search', ''].includes((el.getAttribute('type') || '').toLowerCase()));
+    for (const el of inputs) {
+      const type = (el.getAttribute('type') || '').toLowerCase();
+      const text = describe(el);
+      let field = type === 'email' ? 'email' : type === 'tel' ? 'phone' : null;
+      if (!field) {
+        const hit = PATTERNS.find(([name, re]) => !fields[name] && re.test(text));
+        field = hit ? hit[0] : null;
+      }
+      if (field && !fields[field] && values[field]) fields[field] = el;
+    }
+  }
+
+  const filled = [];
+  for (const [field, el] of Object.entries(fields)) {
+    if (values[field]) { setValue(el, values[field]); filled.push(field); }
+  }
+
+  let submit = recipeUsed && recipe.submit ? document.querySelector(recipe.submit) : null;
+  if (!submit && filled.length) {
+    const scope = fields[filled[0]].closest('form') || document;
+    submit = scope.querySelector('button[type=submit], input[type=submit]') ||
+      Array.from(scope.querySelectorAll('button, [role=button]')).find(b =>
+        isVisible(b) && /submit|send|remove|opt.?out|request|continue|delete/i.test(b.innerText || b.value || ''));
+  }
+
+  const resources = Array.from(document.querySelectorAll('script[src], iframe[src]')).map(e => e.src).join('\n');
+  return {
+    fields: Object.fromEntries(Object.entries(fields).map(([f, el]) => [f, selectorFor(el)])),
+    submit: submit ? selectorFor(submit) : null,
+    filled,
+    recipe_used: recipeUsed,
+    block_check: [document.title, resources, (document.body ? document.body.innerText : '').slice(0, 20000)].join('\n'),
+  };
+}
+"""
+
+
+def format_address(address) -> str:
+    """One line ("street, city, state zip") from a profile address dict"""
+    if not isinstance(address, dict):
+        return str(address or "")
+    region = " ".join(filter(None, [address.get("state"), address.get("zip") or address.get("postal")]))
+    return ", ".join(filter(None, [address.get("street"), address.get("city"), region]))
+
+
+def fill_values(pii: dict) -> dict:
+    """Form values from a PII profile, keyed by the field names FILL_JS knows"""
+    name = (pii.get("names") or [""])[0]
+    parts = name.split()
+    return {
+        "name": name,
+        "first_name": parts[0] if parts else "",
+        "last_name": parts[-1] if len(parts) > 1 else "",
+        "email": (pii.get("emails") or [""])[0],
+        "phone": (pii.get("phones") or [""])[0],
+        "address": format_address((pii.get("addresses") or [""])[0]),
+    }
+
+
+def load_recipe(domain: str) -> Optional[dict]:
+    return load_json(FORM_RECIPES_JSON, {}).get(normalize_domain(domain))
+
+
+def save_recipe(domain: str, fill: dict):
+    """Remember the selectors a successful fill used for this domain"""
+    domain = normalize_domain(domain)
+    if not domain or not fill.get("filled") or not fill.get("submit") or SESSION_ARCHIVE.replaying:
+        return
+    with store_lock():
+        recipes = load_json(FORM_RECIPES_JSON, {})
+        previous = recipes.get(domain, {})
+        recipes[domain] = {
+            "fields": {f: fill["fields"][f] for f in fill["filled"]},
+            "submit": fill["submit"],
+            "uses": previous.get("uses", 0) + 1,
+            "updated_at": time.time(),
+        }
+        save_json(FORM_RECIPES_JSON, recipes)
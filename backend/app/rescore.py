@@ -0,0 +1,99 @@
+"""
+Offline re-scoring of past discovery jobs from their page snapshots.
+
+Each scanned broker's pages (see discovery.snapshots) are re-scored in a
+process pool, RESCORE_WORKERS wide (0 = one worker per CPU core), with the
+job's PII profile or a replacement. This shows what a change to token_hits,
+the meaningful-page indicators, the match thresholds or a profile would have
+done to found/confidence, without a re-crawl. With apply, changed verdicts
+are written back to the items as a new item version, and user feedback
+flags are kept.
+
+Only searches run with SNAPSHOTS=1 can be re-scored. A coalesced item's
+pages were stored with the job whose search it joined.
+"""
+
+import os, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterable, Iterator, List, Optional
+
+from . import item_log
+from .discovery.snapshots import load_manifest, rescore_pages
+from .engine import evidence_dir_for, load_profile, update_item
+from .store import FINDINGS_JSON, get_job
+
+RESCORE_WORKERS = int(os.getenv("RESCORE_WORKERS", "0"))
+
+
+def _apply(job_id: str, row: dict):
+    def _rescored(item):
+        item.update(found=row["found"], confidence=row["confidence"], evidence_url=row["evidence_url"] or None,
+                    rescored={"at": time.time(), "max_hits": row["max_hits"], "pages": row["pages"]})
+    update_item(FINDINGS_JSON, job_id, row["broker_id"], _rescored)
+
+
+def rescore_jobs(job_ids: Iterable[str], profile: Optional[dict] = None, reextract: bool = False,
+                 apply: bool = False, workers: int = RESCORE_WORKERS) -> Iterator[dict]:
+    """
+    One row per scanned broker of each job, in completion order: the verdict
+    before and after, or `skipped: no_snapshot`. A job that can't be
+    re-scored yields a single row with `error`.
+    """
+    tasks, rows = [], []
+    for job_id in job_ids:
+        job = get_job(FINDINGS_JSON, job_id)
+        if job is None:
+            yield {"job_id": job_id, "error": "job not found"}
+            continue
+        pii = profile or (load_profile(job["profile_id"]) if job.get("profile_id") else None)
+        if not pii:
+            yield {"job_id": job_id, "error": "no PII profile; pass one to re-score with"}
+            continue
+        pages_by_domain = load_manifest(evidence_dir_for(job_id))
+        for item in item_log.iter_job_items(FINDINGS_JSON, job_id, job, cached=False):
+            before = {"job_id": job_id, "broker_id": item["broker_id"], "domain": item.get("domain"),
+                      "found_before": bool(item.get("found")), "confidence_before": item.get("confidence", 0.0)}
+            pages = pages_by_domain.get(item.get("domain"))
+            if not pages:
+                rows.append({**before, "skipped": "no_snapshot"})
+            else:
+                tasks.append((before, pages, pii))
+    yield from rows
+
+    def _row(before, result):
+        row = {**before, **result}
+        row["changed"] = (row["found"], row["confidence"]) != (row["found_before"], row["confidence_before"])
+        if apply and row["changed"]:
+            _apply(row["job_id"], row)
+        return row
+
+    if workers == 1 or len(tasks) <= 1:
+        for before, pages, pii in tasks:
+            try:
+                result = rescore_pages(pages, pii, reextract)
+            except Exception as e:
+                yield {**before, "error": f"rescoring failed: {e}"}
+                continue
+            yield _row(before, result)
+        return
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = {pool.submit(rescore_pages, pages, pii, reextract): before for before, pages, pii in tasks}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                yield {**futures[future], "error": f"rescoring failed: {e}"}
+                continue
+            yield _row(futures[future], result)
+
+
+def summarize(rows: List[dict]) -> dict:
+    scored = [r for r in rows if "found" in r]
+    return {
+        "rescored": len(scored),
+        "no_snapshot": sum(1 for r in rows if r.get("skipped") == "no_snapshot"),
+        "errors": [r for r in rows if r.get("error")],
+        "found_before": sum(1 for r in scored if r["found_before"]),
+        "found_after": sum(1 for r in scored if r["found"]),
+        "changed": [r for r in scored if r["changed"]],
+    }
@@ -0,0 +1,382 @@
+"""
+Retention for evidence, drafts and page snapshots.
+
+Every discovery job leaves full-page screenshots in storage/evidence/<job_id>/,
+every removal a screenshot in storage/evidence/removals/ or a draft in
+storage/drafts/, and SNAPSHOTS=1 adds page blobs under storage/snapshots/.
+`collect()` applies these policies, in this order:
+
+  - RETENTION_MAX_AGE_DAYS: everything a job older than this left behind
+    goes, its snapshot manifest and profile artifacts included
+  - RETENTION_KEEP_PER_BROKER: only the newest N screenshots (and removal
+    evidence files) of each broker are kept
+  - RETENTION_QUOTA_MB: while evidence, drafts and snapshots together take
+    more than this, the oldest remaining evidence goes first
+
+Evidence of results the user verified is kept under every policy unless
+RETENTION_KEEP_VERIFIED=0, and jobs still queued or running are never
+touched. Orphans are deleted once they are older than RETENTION_GRACE
+seconds. These are directories of jobs that no longer exist, removal
+screenshots and drafts no item refers to, snapshot blobs no manifest
+lists, and stray temp files. With RETENTION_COMPACT_AFTER_DAYS, the
+screenshots of older jobs are packed into `<job_id>/screenshots.zip` under
+their original names.
+
+Job records and items are left alone, so an item's screenshot path may name
+a file that was deleted or packed. A background thread runs collect() every
+RETENTION_INTERVAL seconds (0 = never); POST /storage/gc and `cli gc` run
+it on demand, with dry_run to see what would go.
+"""
+
+import json, os, shutil, threading, time, uuid, zipfile
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from . import item_log
+from .discovery.snapshots import MANIFEST, SNAPSHOT_DIR
+from .exports import job_time
+from .store import FINDINGS_JSON, REMOVALS_JSON, STORE_DIR, load_json
+
+RETENTION_MAX_AGE_DAYS = float(os.getenv("RETENTION_MAX_AGE_DAYS", "0"))
+RETENTION_KEEP_PER_BROKER = int(os.getenv("RETENTION_KEEP_PER_BROKER", "0"))
+RETENTION_KEEP_VERIFIED = os.getenv("RETENTION_KEEP_VERIFIED", "1") != "0"
+RETENTION_QUOTA_MB = float(os.getenv("RETENTION_QUOTA_MB", "0"))
+RETENTION_COMPACT_AFTER_DAYS = float(os.getenv("RETENTION_COMPACT_AFTER_DAYS", "0"))
+RETENTION_GRACE = float(os.getenv("RETENTION_GRACE", "3600"))  # a younger orphan may belong to a job being set up
+RETENTION_INTERVAL = float(os.getenv("RETENTION_INTERVAL", str(6 * 3600)))
+
+EVIDENCE_DIR = STORE_DIR / "evidence"
+REMOVAL_EVIDENCE_DIR = EVIDENCE_DIR / "removals"
+DRAFTS_DIR = STORE_DIR / "drafts"
+COMPACT_ARCHIVE = "screenshots.zip"
+ACTIVE_STATUSES = {"queued", "running"}
+SAMPLE_PATHS = 20  # per reason in a report
+
+RETENTION_STATE = {"running": False, "last": None}
+_collect_lock = threading.Lock()
+
+
+def policy(**overrides) -> dict:
+    """The configured policy, with any non-None overrides"""
+    current = {
+        "max_age_days": RETENTION_MAX_AGE_DAYS, "keep_per_broker": RETENTION_KEEP_PER_BROKER,
+        "keep_verified": RETENTION_KEEP_VERIFIED, "quota_mb": RETENTION_QUOTA_MB,
+        "compact_after_days": RETENTION_COMPACT_AFTER_DAYS, "grace_s": RETENTION_GRACE,
+    }
+    current.update({k: v for k, v in overrides.items() if v is not None})
+    return current
+
+
+def _stat(path: Path):
+    try:
+        return path.stat()
+    except FileNotFoundError:
+        return None
+
+
+def _tree_bytes(path: Path) -> int:
+    total = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            st = _stat(Path(root) / name)
+            total += st.st_size if st else 0
+    return total
+
+
+def _jobs(path: Path) -> Dict[str, dict]:
+    """job_id -> status, time and the item fields retention needs, for one job file"""
+    jobs = {}
+    for job_id, job in load_json(path, {}).items():
+        items = [{"domain": item.get("domain"), "verified": bool(item.get("verified_positive")),
+                  "evidence_path": item.get("evidence_path")}
+                 for item in item_log.iter_job_items(path, job_id, job, cached=False)]
+        jobs[job_id] = {"status": job.get("status"), "at": job_time(job), "items": items}
+    return jobs
+
+
+def _manifest_blobs(path: Path) -> Dict[str, str]:
+    """blob name -> domain, for every page a job's snapshot manifest lists"""
+    blobs = {}
+    try:
+        with open(path, encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                blobs[entry["html"]] = blobs[entry["regions"]] = entry["domain"]
+    except FileNotFoundError:
+        pass
+    return blobs
+
+
+def inventory(grace_s: float = RETENTION_GRACE, now: Optional[float] = None) -> dict:
+    """
+    Every evidence file as a unit (path, bytes, job, broker, time, whether it
+    is protected or belongs to an active job), the snapshot blobs with the
+    manifests that list them, and the orphans.
+    """
+    now = now or time.time()
+    findings, removals = _jobs(FINDINGS_JSON), _jobs(REMOVALS_JSON)
+    units, orphans, manifests = [], [], {}
+    blob_refs = Counter()
+
+    def _unit(path: Path, st, job_id, job, domain=None, kind="file", verified=False):
+        units.append({"path": path, "bytes": st.st_size, "job_id": job_id, "domain": domain, "kind": kind,
+                      "at": (job or {}).get("at") or st.st_mtime, "verified": verified,
+                      "active": bool(job) and job["status"] in ACTIVE_STATUSES})
+
+    def _orphan(path: Path, st, reason: str = "orphan"):
+        if st and now - st.st_mtime >= grace_s:
+            orphans.append({"path": path, "bytes": _tree_bytes(path) if path.is_dir() else st.st_size,
+                            "reason": reason})
+
+    # Per-job evidence directories (discovery screenshots, manifests, profiles)
+    for directory in sorted(EVIDENCE_DIR.iterdir()) if EVIDENCE_DIR.exists() else []:
+        st = _stat(directory)
+        if not st or not directory.is_dir() or directory == REMOVAL_EVIDENCE_DIR:
+            continue
+        job_id = directory.name
+        job = findings.get(job_id) or removals.get(job_id)
+        if job is None and not job_id.startswith("cli-"):  # CLI runs have no job record
+            _orphan(directory, st)
+            continue
+        job = job or {"status": None, "at": st.st_mtime, "items": []}
+        verified = {item["domain"] for item in job["items"] if item["verified"]}
+        for path in directory.iterdir():
+            fst = _stat(path)
+            if not fst or not path.is_file():
+                continue
+            if path.name.endswith(".tmp"):
+                _orphan(path, fst, "temp")
+            elif path.suffix == ".png":
+                _unit(path, fst, job_id, job, path.stem, "screenshot", path.stem in verified)
+            elif path.name == MANIFEST:
+                manifests[path] = _manifest_blobs(path)
+                blob_refs.update(manifests[path].keys())
+                _unit(path, fst, job_id, job, kind="manifest")
+            else:
+                _unit(path, fst, job_id, job, kind="archive" if path.name == COMPACT_ARCHIVE else "file")
+
+    # Removal screenshots and drafts belong to the removal items that name them
+    referenced = {}
+    for job_id, job in removals.items():
+        for item in job["items"]:
+            if item["evidence_path"]:
+                referenced[os.path.abspath(item["evidence_path"])] = (job_id, job, item["domain"])
+    for directory, kind in ((REMOVAL_EVIDENCE_DIR, "removal_evidence"), (DRAFTS_DIR, "draft")):
+        for path in directory.iterdir() if directory.exists() else []:
+            st = _stat(path)
+            if not st or not path.is_file():
+                continue
+            owner = referenced.get(os.path.abspath(path))
+            if owner:
+                _unit(path, st, owner[0], owner[1], owner[2], kind)
+            else:
+                _orphan(path, st, "temp" if path.name.endswith(".tmp") else "orphan")
+
+    blobs = {}
+    for path in SNAPSHOT_DIR.glob("*/*") if SNAPSHOT_DIR.exists() else []:
+        st = _stat(path)
+        if not st:
+            continue
+        if path.name in blob_refs:
+            blobs[path.name] = {"path": path, "bytes": st.st_size}
+        else:
+            _orphan(path, st, "temp" if path.name.endswith(".tmp") else "unreferenced_snapshot")
+    return {"units": units, "orphans": orphans, "manifests": manifests, "blob_refs": blob_refs, "blobs": blobs}
+
+
+def plan(inv: dict, pol: dict, now: Optional[float] = None) -> dict:
+    """What collect() would delete (with the reason) and which jobs it would compact"""
+    now = now or time.time()
+    deletions = {id(o): (o, o["reason"]) for o in inv["orphans"]}
+    candidates = [u for u in inv["units"]
+                  if not u["active"] and not (u["verified"] and pol["keep_verified"])]
+
+    if pol["max_age_days"]:
+        cutoff = now - pol["max_age_days"] * 86400
+        for unit in candidates:
+            if unit["at"] < cutoff:
+                deletions.setdefault(id(unit), (unit, "max_age"))
+
+    if pol["keep_per_broker"]:
+        by_broker = defaultdict(list)
+        for unit in candidates:
+            if unit["domain"] and id(unit) not in deletions:
+                by_broker[(unit["kind"], unit["domain"])].append(unit)
+        for group in by_broker.values():
+            group.sort(key=lambda u: u["at"], reverse=True)
+            for unit in group[pol["keep_per_broker"]:]:
+                deletions[id(unit)] = (unit, "keep_per_broker")
+
+    refs = Counter(inv["blob_refs"])
+
+    def _release(unit):
+        """Snapshot blobs a deleted manifest was the last to list"""
+        freed = []
+        for name in inv["manifests"].get(unit["path"], {}):
+            refs[name] -= 1
+            if refs[name] == 0 and name in inv["blobs"]:
+                freed.append(inv["blobs"][name])
+        return freed
+
+    blob_deletions = []
+    for unit, _ in list(deletions.values()):
+        if unit.get("kind") == "manifest":
+            blob_deletions += _release(unit)
+
+    if pol["quota_mb"]:
+        usage = (sum(u["bytes"] for u in inv["units"]) + sum(b["bytes"] for b in inv["blobs"].values())
+                 + sum(o["bytes"] for o in inv["orphans"]))
+        usage -= sum(entry[0]["bytes"] for entry in deletions.values()) + sum(b["bytes"] for b in blob_deletions)
+        quota = pol["quota_mb"] * 1024 * 1024
+        for unit in sorted(candidates, key=lambda u: u["at"]):
+            if usage <= quota:
+                break
+            if id(unit) in deletions:
+                continue
+            deletions[id(unit)] = (unit, "quota")
+            usage -= unit["bytes"]
+            if unit["kind"] == "manifest":
+                freed = _release(unit)
+                blob_deletions += freed
+                usage -= sum(b["bytes"] for b in freed)
+
+    compact = defaultdict(list)
+    if pol["compact_after_days"]:
+        cutoff = now - pol["compact_after_days"] * 86400
+        for unit in candidates:
+            if unit["kind"] == "screenshot" and unit["at"] < cutoff and id(unit) not in deletions:
+                compact[unit["path"].parent].append(unit)
+    delete = [(unit, reason) for unit, reason in deletions.values()]
+    delete += [({**blob, "kind": "snapshot"}, "unreferenced_snapshot") for blob in blob_deletions]
+    return {"delete": delete, "compact": dict(compact)}
+
+
+def _compact(directory: Path, units: List[dict]) -> int:
+    """Pack screenshots into the job's archive, keeping what it already holds; returns bytes saved"""
+    archive = directory / COMPACT_ARCHIVE
+    tmp = directory / f".{COMPACT_ARCHIVE}.{uuid.uuid4().hex}.tmp"
+    before = sum(u["bytes"] for u in units) + (archive.stat().st_size if archive.exists() else 0)
+    with zipfile.ZipFile(tmp, "w", zipfile.ZIP_DEFLATED, compresslevel=9) as out:
+        names = set()
+        if archive.exists():
+            with zipfile.ZipFile(archive) as old:
+                for info in old.infolist():
+                    out.writestr(info, old.read(info))
+                    names.add(info.filename)
+        for unit in units:
+            if unit["path"].name not in names:
+                out.write(unit["path"], unit["path"].name)
+    os.replace(tmp, archive)
+    for unit in units:
+        unit["path"].unlink(missing_ok=True)
+    return before - archive.stat().st_size
+
+
+def _delete(path: Path):
+    if path.is_dir():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        path.unlink(missing_ok=True)
+    parent = path.parent
+    if parent.parent == EVIDENCE_DIR and parent != REMOVAL_EVIDENCE_DIR:
+        try:
+            parent.rmdir()  # only once the job's directory is empty
+        except OSError:
+            pass
+
+
+def collect(dry_run: bool = False, **overrides) -> dict:
+    """Apply the retention policy once; returns what was (or would be) deleted and compacted"""
+    if not _collect_lock.acquire(blocking=False):
+        raise RuntimeError("a collection is already running")
+    RETENTION_STATE["running"] = True
+    started = time.time()
+    try:
+        pol = policy(**overrides)
+        inv = inventory(pol["grace_s"], started)
+        planned = plan(inv, pol, started)
+        reasons = {}
+        for unit, reason in planned["delete"]:
+            entry = reasons.setdefault(reason, {"files": 0, "bytes": 0, "sample": []})
+            entry["files"] += 1
+            entry["bytes"] += unit["bytes"]
+            if len(entry["sample"]) < SAMPLE_PATHS:
+                entry["sample"].append(str(unit["path"].relative_to(STORE_DIR)))
+            if not dry_run:
+                _delete(unit["path"])
+        compacted = {"jobs": len(planned["compact"]), "files": sum(len(u) for u in planned["compact"].values()),
+                     "bytes_saved": 0}
+        if not dry_run:
+            for directory, units in planned["compact"].items():
+                try:
+                    compacted["bytes_saved"] += _compact(directory, units)
+                except (OSError, zipfile.BadZipFile) as e:
+                    print(f"⚠️ Could not compact {directory.name}: {e}")
+        report = {
+            "dry_run": dry_run, "policy": pol, "at": started,
+            "deleted": reasons,
+            "freed_bytes": sum(r["bytes"] for r in reasons.values()),
+            "compacted": compacted,
+            "elapsed_s": round(time.time() - started, 2),
+        }
+        if not dry_run:
+            RETENTION_STATE["last"] = report
+        return report
+    finally:
+        RETENTION_STATE["running"] = False
+        _collect_lock.release()
+
+
+def usage(limit: int = 50) -> dict:
+    """Bytes by storage area, and by job and broker for evidence and snapshots"""
+    areas = {}
+    for child in sorted(STORE_DIR.iterdir()):
+        areas[child.name] = _tree_bytes(child) if child.is_dir() else child.stat().st_size
+    inv = inventory()
+    jobs = defaultdict(lambda: {"bytes": 0, "files": 0, "compacted": False})
+    brokers = defaultdict(lambda: {"bytes": 0, "files": 0, "snapshot_bytes": 0})
+    for unit in inv["units"]:
+        job = jobs[unit["job_id"]]
+        job["bytes"] += unit["bytes"]
+        job["files"] += 1
+        job["compacted"] = job["compacted"] or unit["kind"] == "archive"
+        if unit["domain"]:
+            brokers[unit["domain"]]["bytes"] += unit["bytes"]
+            brokers[unit["domain"]]["files"] += 1
+    domain_of = {}
+    for blobs in inv["manifests"].values():
+        domain_of.update(blobs)
+    for name, blob in inv["blobs"].items():
+        if domain_of.get(name):
+            brokers[domain_of[name]]["snapshot_bytes"] += blob["bytes"]
+    job_rows = sorted(jobs.items(), key=lambda kv: -kv[1]["bytes"])
+    broker_rows = sorted(brokers.items(), key=lambda kv: -(kv[1]["bytes"] + kv[1]["snapshot_bytes"]))
+    return {
+        "total_bytes": sum(areas.values()),
+        "areas": dict(sorted(areas.items(), key=lambda kv: -kv[1])),
+        "jobs": [{"job_id": job_id, **row} for job_id, row in job_rows[:limit or None]],
+        "brokers": [{"domain": domain, **row} for domain, row in broker_rows[:limit or None]],
+        "orphans": {"files": len(inv["orphans"]), "bytes": sum(o["bytes"] for o in inv["orphans"])},
+    }
+
+
+def _background(interval: float):
+    while True:
+        time.sleep(interval)
+        try:
+            report = collect()
+        except Exception as e:
+            print(f"⚠️ Retention run failed: {e}")
+            continue
+        if report["freed_bytes"] or report["compacted"]["files"]:
+            print(f"🧹 Retention freed {report['freed_bytes'] / 1e6:.1f} MB, "
+                  f"compacted {report['compacted']['files']} screenshots")
+
+
+def start_background(interval: float = RETENTION_INTERVAL):
+    if interval > 0:
+        threading.Thread(target=_background, args=(interval,), name="retention", daemon=True).start()
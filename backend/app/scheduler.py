@@ -0,0 +1,126 @@
+"""
+Fair-share scheduler for discovery jobs running in the API process.
+
+Every local job shares one pool of DISCOVERY_WORKERS threads instead of
+starting its own. A job's weight comes from its broker profile's priority
+(PRIORITY_BASE ** (priority - 1)), and broker tasks are handed out by stride
+scheduling: the job that has used the least virtual time goes next, and each
+dispatch advances that job's virtual time by 1/weight. While an all_brokers
+sweep (priority 1) runs, a quick_scan (priority 5) gets 16 of every 17 free
+workers and the sweep keeps moving with the rest. Within a job, brokers whose
+domain is cooling down are passed over, as before.
+"""
+
+import os, threading
+from typing import Callable, Dict, List, Optional
+
+from .politeness import POLITENESS
+
+PRIORITY_BASE = float(os.getenv("SCHEDULER_PRIORITY_BASE", "2"))
+
+
+def job_weight(priority: int) -> float:
+    return PRIORITY_BASE ** (max(1, int(priority)) - 1)
+
+
+def _task_domain(task) -> str:
+    return task[1].get("domain", "")
+
+
+class _Job:
+    def __init__(self, job_id: str, tasks: List, run: Callable, weight: float, cancel):
+        self.job_id = job_id
+        self.pending = list(tasks)
+        self.run = run
+        self.weight = weight
+        self.cancel = cancel
+        self.inflight = 0
+        self.vtime = 0.0
+        self.done = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return bool(self.cancel and self.cancel.cancelled)
+
+
+class FairScheduler:
+    def __init__(self, workers: int, domain_of: Callable = _task_domain):
+        self.workers = max(1, workers)
+        self.domain_of = domain_of
+        self._cond = threading.Condition()
+        self._jobs: Dict[str, _Job] = {}
+        self._vclock = 0.0  # virtual time of the last dispatch; new jobs start here
+        self._threads = []
+
+    def submit(self, job_id: str, tasks: List, run: Callable, priority: int = 1, cancel=None) -> _Job:
+        """
+        Schedule a job's tasks. `run(task)` executes one and may return a task
+        to requeue (e.g. after a rate limit). Wait on the returned job's `done`.
+        """
+        job = _Job(job_id, tasks, run, job_weight(priority), cancel)
+        with self._cond:
+            job.vtime = self._vclock
+            self._jobs[job_id] = job
+            self._finish_if_idle(job)
+            self._start_workers()
+            self._cond.notify_all()
+        if cancel is not None:
+            cancel.on_cancel(self._wake)
+        return job
+
+    def snapshot(self) -> List[dict]:
+        with self._cond:
+            return [{"job_id": j.job_id, "weight": j.weight, "pending": len(j.pending),
+                     "inflight": j.inflight, "vtime": round(j.vtime, 3)} for j in self._jobs.values()]
+
+    def _wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def _start_workers(self):
+        while len(self._threads) < self.workers:
+            t = threading.Thread(target=self._work, name=f"discovery-{len(self._threads)}", daemon=True)
+            self._threads.append(t)
+            t.start()
+
+    def _finish_if_idle(self, job: _Job):
+        if job.cancelled:
+            job.pending.clear()
+        if not job.pending and job.inflight == 0 and not job.done.is_set():
+            self._jobs.pop(job.job_id, None)
+            job.done.set()
+            self._cond.notify_all()
+
+    def _next(self):
+        with self._cond:
+            while True:
+                wait: Optional[float] = None
+                for job in sorted(self._jobs.values(), key=lambda j: j.vtime):
+                    self._finish_if_idle(job)
+                    if not job.pending:
+                        continue
+                    idx = POLITENESS.pick(job.pending, domain_of=self.domain_of)
+                    ready_in = POLITENESS.ready_in(self.domain_of(job.pending[idx]))
+                    if ready_in > 0:
+                        wait = ready_in if wait is None else min(wait, ready_in)
+                        continue
+                    self._vclock = max(self._vclock, job.vtime)
+                    job.vtime += 1.0 / job.weight
+                    job.inflight += 1
+                    return job, job.pending.pop(idx)
+                self._cond.wait(None if wait is None else min(wait, 1.0))
+
+    def _work(self):
+        while True:
+            job, task = self._next()
+            retry = None
+            try:
+                retry = job.run(task)
+            except Exception as e:
+                print(f"❌ Task of job {job.job_id} failed: {e}")
+            with self._cond:
+                job.inflight -= 1
+                if retry is not None and not job.cancelled:
+                    job.pending.append(retry)
+                self._finish_if_idle(job)
+                self._cond.notify_all()
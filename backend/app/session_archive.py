@@ -0,0 +1,208 @@
+"""
+Record and replay broker browser sessions.
+
+Broker sites change daily, so a discovery run can't be repeated to compare
+two versions of the code. With SESSION_ARCHIVE=record every browser context
+opened for a broker search or opt-out form records its traffic to a
+Playwright HAR archive:
+
+    <SESSION_ARCHIVE_DIR>/<domain>/<kind>-<ms>-<hex>.zip
+    <SESSION_ARCHIVE_DIR>/<domain>/<kind>.state.json   storage state it started from
+
+Here kind is "search" or "form". With SESSION_ARCHIVE=replay those contexts
+start from the archived storage state. Every request is answered from the
+domain's archives and nothing goes to the network. Repeated requests are
+served in their recorded order, and requests that were never recorded fail
+as if offline. Documents, XHR and fetches are held back for their recorded
+duration times REPLAY_TIME_SCALE: 1 keeps the original timings, 0.1 runs
+ten times faster, 0 serves at once. Sub-resources are never held back. A
+held-back request waits with page.wait_for_timeout, which lets Playwright
+route the page's other requests meanwhile. An answer that can't be
+delivered is logged and the request aborted rather than left hanging.
+
+Archives are recorded with the asset cache bypassed, so they hold the whole
+session. Replays bypass the cache too. A replay never touches live
+scheduling state: politeness pacing and cooldowns, domain health
+(adaptive deadlines and the circuit breaker) and reachability triage are
+skipped, and the yield index, saved browser state and form recipes are not
+written.
+"""
+
+import asyncio, base64, json, os, time, uuid, zipfile
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from .store import STORE_DIR, load_json, save_json
+
+SESSION_ARCHIVE_MODE = os.getenv("SESSION_ARCHIVE", "").lower()  # "", "record" or "replay"
+SESSION_ARCHIVE_DIR = Path(os.getenv("SESSION_ARCHIVE_DIR") or STORE_DIR / "session_archives")
+REPLAY_TIME_SCALE = float(os.getenv("REPLAY_TIME_SCALE", "1"))
+
+TIMED_TYPES = {"document", "xhr", "fetch"}
+# Bodies are stored decoded; the browser works out the length itself
+DROP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+
+def _read_archive(path: Path):
+    """(request key, response, recorded ms) for each entry of one HAR zip, in recorded order"""
+    with zipfile.ZipFile(path) as zf:
+        har_name = next(n for n in zf.namelist() if n.endswith(".har"))
+        entries = json.loads(zf.read(har_name))["log"]["entries"]
+        entries.sort(key=lambda e: e.get("startedDateTime", ""))
+        for entry in entries:
+            request, response = entry["request"], entry["response"]
+            if response.get("status", 0) <= 0:  # aborted or failed while recording
+                continue
+            content = response.get("content", {})
+            if content.get("_file"):
+                body = zf.read(content["_file"])
+            elif content.get("encoding") == "base64":
+                body = base64.b64decode(content.get("text", ""))
+            else:
+                body = content.get("text", "").encode()
+            headers = {}
+            for header in response.get("headers", []):
+                name = header["name"]
+                if name.lower() in DROP_HEADERS:
+                    continue
+                headers[name] = f"{headers[name]}\n{header['value']}" if name in headers else header["value"]
+            post = (request.get("postData") or {}).get("text") or ""
+            yield ((request["method"], request["url"], post),
+                   {"status": response["status"], "headers": headers, "body": body}, max(0.0, entry.get("time", 0)))
+
+
+class ReplaySession:
+    """Route handler answering one domain's requests from its archives"""
+
+    def __init__(self, paths, time_scale: float = REPLAY_TIME_SCALE):
+        self.time_scale = time_scale
+        self.entries = defaultdict(deque)  # (method, url, post data) -> recorded answers
+        self.by_url = defaultdict(deque)   # (method, url), when the post data differs
+        for path in paths:
+            for key, response, ms in _read_archive(path):
+                self.entries[key].append((response, ms))
+                self.by_url[key[:2]].append((response, ms))
+        self.stats = {"served": 0, "missing": 0, "failed": 0}
+
+    def _next(self, request) -> Optional[Tuple[dict, float]]:
+        key = (request.method, request.url, request.post_data or "")
+        queue = self.entries.get(key) or self.by_url.get(key[:2])
+        if not queue:
+            return None
+        # The last recording of a request keeps answering once its queue is used up
+        return queue.popleft() if len(queue) > 1 else queue[0]
+
+    def _delay(self, request, ms: float) -> float:
+        return ms / 1000 * self.time_scale if request.resource_type in TIMED_TYPES else 0.0
+
+    def _held_page(self, request):
+        try:
+            return request.frame.page
+        except Exception:  # service worker requests have no frame
+            return None
+
+    def handle(self, route, request):
+        found = self._next(request)
+        if not found:
+            self.stats["missing"] += 1
+            route.abort("internetdisconnected")
+            return
+        response, ms = found
+        delay = self._delay(request, ms)
+        page = self._held_page(request) if delay else None
+        try:
+            if page is not None:
+                # Unlike time.sleep, this hands the thread back to Playwright while it waits,
+                # so the page's other requests are routed meanwhile
+                page.wait_for_timeout(delay * 1000)
+            route.fulfill(**response)
+            self.stats["served"] += 1
+        except Exception as e:
+            self._failed(request, e)
+            try:
+                route.abort("failed")
+            except Exception:
+                pass
+
+    async def handle_async(self, route, request):
+        found = self._next(request)
+        if not found:
+            self.stats["missing"] += 1
+            await route.abort("internetdisconnected")
+            return
+        response, ms = found
+        delay = self._delay(request, ms)
+        try:
+            if delay:
+                await asyncio.sleep(delay)
+            await route.fulfill(**response)
+            self.stats["served"] += 1
+        except Exception as e:
+            self._failed(request, e)
+            try:
+                await route.abort("failed")
+            except Exception:
+                pass
+
+    def _failed(self, request, error: Exception):
+        self.stats["failed"] += 1
+        print(f"    ⚠️ Replay could not answer {request.method} {request.url[:100]}: {error}")
+
+
+class SessionArchive:
+    def __init__(self, mode: str = SESSION_ARCHIVE_MODE, root: Path = SESSION_ARCHIVE_DIR):
+        if mode not in ("", "record", "replay"):
+            raise ValueError(f"SESSION_ARCHIVE must be record or replay, not {mode!r}")
+        self.mode = mode
+        self.root = Path(root)
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def _dir(self, domain: str) -> Path:
+        from .politeness import normalize_domain  # politeness checks `replaying`, so import it late
+        return self.root / (normalize_domain(domain) or "unknown")
+
+    def context_options(self, domain: str, kind: str) -> Dict:
+        """new_context() keyword arguments for a broker session"""
+        if self.replaying:
+            return {"storage_state": load_json(self._dir(domain) / f"{kind}.state.json", None)}
+        from .browser_state import load_state
+        state = load_state(domain)
+        if not self.recording:
+            return {"storage_state": state}
+        directory = self._dir(domain)
+        directory.mkdir(parents=True, exist_ok=True)
+        state_path = directory / f"{kind}.state.json"
+        if not state_path.exists():  # the first recorded session's starting point
+            save_json(state_path, state)
+        name = f"{kind}-{int(time.time() * 1000)}-{uuid.uuid4().hex[:6]}.zip"
+        return {"storage_state": state, "record_har_path": str(directory / name),
+                "record_har_mode": "full", "record_har_content": "attach"}
+
+    def archives(self, domain: str, kind: str):
+        return sorted(self._dir(domain).glob(f"{kind}-*.zip"))
+
+    def replay(self, context, domain: str, kind: str) -> Optional[ReplaySession]:
+        """Route a sync context to the domain's archives; None unless replaying"""
+        if not self.replaying:
+            return None
+        session = ReplaySession(self.archives(domain, kind))
+        context.route("**/*", session.handle)
+        return session
+
+    async def replay_async(self, context, domain: str, kind: str) -> Optional[ReplaySession]:
+        if not self.replaying:
+            return None
+        session = ReplaySession(self.archives(domain, kind))
+        await context.route("**/*", session.handle_async)
+        return session
+
+
+SESSION_ARCHIVE = SessionArchive()
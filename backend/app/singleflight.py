@@ -0,0 +1,98 @@
+"""
+In-flight deduplication of identical work across concurrent jobs.
+
+The first caller for a key starts the work on its own thread; callers that
+arrive while it runs attach to it and all of them get the same result. The
+work runs under its own CancelToken, which fires only when every attached
+caller has been cancelled, so cancelling one job never aborts a search that
+another job is still waiting for.
+
+Results also stay joinable for `window` seconds after the work finishes. Jobs
+sharing the scheduler's workers tend to reach the same broker a few tasks
+apart rather than at the same instant, and those late arrivals count as
+coalesced too.
+"""
+
+import threading, time
+from typing import Callable, Dict, Hashable, Optional
+
+from .cancellation import CancelToken, JobCancelled
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.cancel = CancelToken()
+        self.waiters = 0
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, name: str, window: float = 0.0, keep: Optional[Callable[[object], bool]] = None):
+        self.name = name
+        self.window = window
+        self.keep = keep or (lambda result: True)  # which results late arrivals may reuse
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._recent: Dict[Hashable, tuple] = {}  # key -> (finished_at, result)
+        self.stats = {"started": 0, "coalesced": 0}
+
+    def do(self, key: Hashable, fn: Callable[[CancelToken], object], cancel: CancelToken = None):
+        """
+        Return (fn's result, coalesced). `fn(token)` runs once per key among
+        concurrent callers. Raises JobCancelled if the caller's own `cancel`
+        fires first; re-raises fn's exception to every caller.
+        """
+        with self._lock:
+            recent = self._recent.get(key)
+            if recent and time.monotonic() - recent[0] < self.window:
+                self.stats["coalesced"] += 1
+                return recent[1], True
+            flight = self._flights.get(key)
+            coalesced = flight is not None
+            if not coalesced:
+                flight = self._flights[key] = _Flight()
+                self.stats["started"] += 1
+            else:
+                self.stats["coalesced"] += 1
+            flight.waiters += 1
+        if not coalesced:
+            threading.Thread(target=self._run, args=(key, flight, fn), name=f"{self.name}-flight", daemon=True).start()
+
+        unregister = cancel.on_cancel(lambda: self._leave(key, flight)) if cancel else (lambda: None)
+        try:
+            while not flight.done.wait(0.2 if cancel else None):
+                if cancel.cancelled:
+                    raise JobCancelled()
+        finally:
+            unregister()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result, coalesced
+
+    def _run(self, key, flight: _Flight, fn):
+        try:
+            flight.result = fn(flight.cancel)
+        except Exception as e:
+            flight.error = e
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                now = time.monotonic()
+                if self.window > 0 and flight.error is None and not flight.cancel.cancelled and self.keep(flight.result):
+                    self._recent[key] = (now, flight.result)
+                for stale in [k for k, (t, _) in self._recent.items() if now - t >= self.window]:
+                    del self._recent[stale]
+            flight.done.set()
+
+    def _leave(self, key, flight: _Flight):
+        with self._lock:
+            flight.waiters -= 1
+            if flight.waiters > 0 or flight.done.is_set():
+                return
+            # Nobody is waiting any more: later callers start afresh
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.cancel.cancel()
@@ -0,0 +1,91 @@
+"""
+JSON-file persistence shared by the API process and queue workers.
+
+Job records live in a handful of JSON files under `storage/`. Several threads
+and, with the task queue, several processes (possibly on different hosts over
+a shared filesystem) update them, so every read-modify-write goes through
+`store_lock()` and files are replaced atomically.
+"""
+
+import os, json, threading, uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+APP_DIR = Path(__file__).resolve().parent
+DATA_DIR = APP_DIR.parent.parent / "data"
+STORE_DIR = Path(os.getenv("STORAGE_DIR") or APP_DIR.parent.parent / "storage")
+STORE_DIR.mkdir(parents=True, exist_ok=True)
+
+BROKERS_FILE = DATA_DIR / "brokers_normalized.csv"
+BROKERS_JSON = STORE_DIR / "brokers.json"
+FINDINGS_JSON = STORE_DIR / "findings.json"
+PROFILES_JSON = STORE_DIR / "profiles.json"
+REMOVALS_JSON = STORE_DIR / "removals.json"
+LOCK_FILE = STORE_DIR / ".store.lock"
+
+_thread_lock = threading.RLock()
+_lock_state = {"depth": 0, "fh": None}
+_caches = {}  # job file path -> JobCache serving it in this process
+
+
+def load_json(path: Path, default):
+    if path.exists():
+        return json.loads(path.read_text())
+    return default
+
+def save_json(path: Path, data):
+    # Write-then-rename so readers in other processes never see a partial file
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    tmp.write_text(json.dumps(data, indent=2))
+    os.replace(tmp, path)
+
+@contextmanager
+def store_lock():
+    """Serialize job-file updates across threads and processes (re-entrant)"""
+    with _thread_lock:
+        if _lock_state["depth"] == 0 and fcntl is not None:
+            fh = open(LOCK_FILE, "a+")
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            _lock_state["fh"] = fh
+        _lock_state["depth"] += 1
+        try:
+            yield
+        finally:
+            _lock_state["depth"] -= 1
+            if _lock_state["depth"] == 0 and _lock_state["fh"] is not None:
+                fcntl.flock(_lock_state["fh"], fcntl.LOCK_UN)
+                _lock_state["fh"].close()
+                _lock_state["fh"] = None
+
+def register_cache(path: Path, cache):
+    """Route job reads and updates for `path` in this process through `cache`"""
+    _caches[path] = cache
+
+def get_job(path: Path, job_id: str):
+    cache = _caches.get(path)
+    if cache is not None:
+        return cache.get(job_id)
+    return load_json(path, {}).get(job_id)
+
+def update_job(path: Path, job_id: str, fn):
+    """
+    Apply `fn(job)` to one job record under the store lock and persist it.
+    Each update bumps `job["revision"]` before `fn` runs, so `fn` can stamp
+    the items it touches with the revision they changed in. When a job cache
+    is registered for `path` the update lands there and is persisted by it.
+    """
+    cache = _caches.get(path)
+    if cache is not None:
+        return cache.update(job_id, fn)
+    with store_lock():
+        jobs = load_json(path, {})
+        job = jobs[job_id]
+        job["revision"] = job.get("revision", 0) + 1
+        result = fn(job)
+        save_json(path, jobs)
+        return result
@@ -0,0 +1,246 @@
+"""
+Shared on-disk task queue for discovery and removal jobs.
+
+No broker service is needed: the queue is a directory tree that any number of
+worker processes, on this host or on hosts sharing the filesystem, can drain.
+
+    queue/<job_id>/job.json           kind ("discovery" | "removal") and payload
+    queue/<job_id>/tasks/<task>.json  pending broker tasks
+    queue/<job_id>/leases/<task>.json held while a worker runs a task
+    queue/<job_id>/done/<task>.json   finished tasks with their result item
+
+A lease is claimed by creating its file with O_EXCL and expires unless the
+holder renews it. An expired lease is stolen by renaming it away first and
+checking that the renamed file is still the record that was judged expired
+(another stealer may have replaced it with a fresh lease), so only one
+worker wins. Delivery is at-least-once; results are merged by
+broker_id, so a task re-run after a lost lease does not duplicate items.
+"""
+
+import os, json, time, uuid, socket
+from pathlib import Path
+from typing import List, Optional
+
+from .store import STORE_DIR
+
+QUEUE_DIR = Path(os.getenv("TASK_QUEUE_DIR") or STORE_DIR / "queue")
+LEASE_SECONDS = float(os.getenv("TASK_LEASE_SECONDS", "120"))
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _write_atomic(path: Path, data: dict):
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    tmp.write_text(json.dumps(data))
+    os.replace(tmp, path)
+
+
+def _read(path: Path) -> Optional[dict]:
+    try:
+        return json.loads(path.read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def enqueue(kind: str, job_id: str, payload: dict, tasks: List[dict], weight: float = 1.0) -> int:
+    """
+    Write a job's broker tasks to the queue. Each task needs a `broker_id`;
+    workers claim them in list order. `weight` is the job's fair share
+    relative to other queued jobs.
+    """
+    job_dir = QUEUE_DIR / job_id
+    for sub in ("tasks", "leases", "done"):
+        (job_dir / sub).mkdir(parents=True, exist_ok=True)
+    for position, task in enumerate(tasks):
+        task_id = f"{position:06d}"
+        _write_atomic(job_dir / "tasks" / f"{task_id}.json",
+                      {**task, "task_id": task_id, "attempts": 0, "not_before": 0})
+    _write_atomic(job_dir / "job.json", {"kind": kind, "job_id": job_id, "payload": payload,
+                                         "total": len(tasks), "weight": weight, "created_at": time.time()})
+    return len(tasks)
+
+
+def _try_lease(lease_path: Path, worker_id: str, lease_seconds: float) -> Optional[str]:
+    token = uuid.uuid4().hex
+    record = {"worker": worker_id, "token": token, "expires_at": time.time() + lease_seconds}
+    try:
+        fd = os.open(lease_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        current = _read(lease_path)
+        if current is not None and current.get("expires_at", 0) > time.time():
+            return None
+        try:
+            judged_mtime = lease_path.stat().st_mtime
+        except FileNotFoundError:
+            return None
+        # Possibly still being written by its creator; only reclaim once stale
+        if current is None and time.time() - judged_mtime < lease_seconds:
+            return None
+        # Expired lease: whoever renames it away wins
+        stolen = lease_path.with_name(f".{lease_path.name}.expired-{token}")
+        try:
+            os.rename(lease_path, stolen)
+        except FileNotFoundError:
+            return None
+        if not _is_judged(stolen, current, judged_mtime):
+            # Another worker stole it first and this rename took its fresh (or renewed)
+            # lease: put it back, unless a third worker has claimed the path meanwhile
+            try:
+                os.link(stolen, lease_path)
+            except FileExistsError:
+                pass
+            stolen.unlink()
+            return None
+        stolen.unlink()
+        try:
+            fd = os.open(lease_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return None
+    with os.fdopen(fd, "w") as fh:
+        json.dump(record, fh)
+    return token
+
+
+def _is_judged(path: Path, judged: Optional[dict], judged_mtime: float) -> bool:
+    """Whether the lease file at `path` is still the one read and judged expired"""
+    if judged is None:
+        try:
+            return _read(path) is None and path.stat().st_mtime == judged_mtime
+        except FileNotFoundError:
+            return False
+    current = _read(path)
+    return current is not None and (current.get("token"), current.get("expires_at")) == \
+        (judged.get("token"), judged.get("expires_at"))
+
+
+def claim(worker_id: str, lease_seconds: float = LEASE_SECONDS, job_id: Optional[str] = None,
+          ready=None) -> Optional[dict]:
+    """
+    Lease the next runnable task. Jobs are served by weighted fair share:
+    the job with the fewest tasks started per unit of weight goes first,
+    oldest first among ties. `ready(task)` may veto a task (e.g. its domain is
+    cooling down); vetoed tasks are only taken when nothing else is runnable.
+    Returns a lease dict or None if the queue is idle.
+    """
+    if not QUEUE_DIR.exists():
+        return None
+    job_dirs = [QUEUE_DIR / job_id] if job_id else [d for d in QUEUE_DIR.iterdir() if (d / "job.json").exists()]
+    jobs = []
+    for job_dir in job_dirs:
+        job = _read(job_dir / "job.json")
+        if job is not None and (job_dir / "tasks").exists() and any((job_dir / "tasks").glob("*.json")):
+            jobs.append((_started(job_dir) / max(job.get("weight", 1.0), 1e-9), job.get("created_at", 0), job_dir, job))
+    jobs.sort(key=lambda j: j[:2])
+    now = time.time()
+    deferred = []
+    for _, _, job_dir, job in jobs:
+        try:
+            task_files = sorted((job_dir / "tasks").glob("*.json"))
+        except FileNotFoundError:
+            continue
+        for task_file in task_files:
+            task = _read(task_file)
+            if task is None or task.get("not_before", 0) > now:
+                continue
+            if ready is not None and not ready(task):
+                deferred.append((job_dir, job, task_file, task))
+                continue
+            lease = _lease_task(job_dir, job, task_file, task, worker_id, lease_seconds)
+            if lease:
+                return lease
+    for job_dir, job, task_file, task in deferred:
+        lease = _lease_task(job_dir, job, task_file, task, worker_id, lease_seconds)
+        if lease:
+            return lease
+    return None
+
+
+def _started(job_dir: Path) -> int:
+    count = lambda sub: sum(1 for _ in (job_dir / sub).glob("*.json")) if (job_dir / sub).exists() else 0
+    return count("leases") + count("done")
+
+
+def _lease_task(job_dir, job, task_file, task, worker_id, lease_seconds) -> Optional[dict]:
+    lease_path = job_dir / "leases" / task_file.name
+    token = _try_lease(lease_path, worker_id, lease_seconds)
+    if token is None:
+        return None
+    if not task_file.exists():  # completed between our scan and the lease
+        _drop_lease(lease_path, token)
+        return None
+    return {"job": job, "task": task, "task_path": str(task_file),
+            "lease_path": str(lease_path), "token": token, "worker": worker_id}
+
+
+def _drop_lease(lease_path: Path, token: str):
+    current = _read(lease_path)
+    if current is not None and current.get("token") == token:
+        try:
+            lease_path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def renew(lease: dict, lease_seconds: float = LEASE_SECONDS) -> bool:
+    """Extend a lease we still hold. False means it was stolen after expiring."""
+    lease_path = Path(lease["lease_path"])
+    current = _read(lease_path)
+    if current is None or current.get("token") != lease["token"]:
+        return False
+    current["expires_at"] = time.time() + lease_seconds
+    _write_atomic(lease_path, current)
+    return True
+
+
+def release(lease: dict, delay: float = 0.0):
+    """Give a task back to the queue, runnable again after `delay` seconds"""
+    task = dict(lease["task"])
+    task["attempts"] = task.get("attempts", 0) + 1
+    task["not_before"] = time.time() + delay
+    task_path = Path(lease["task_path"])
+    if task_path.exists():
+        _write_atomic(task_path, task)
+    _drop_lease(Path(lease["lease_path"]), lease["token"])
+
+
+def complete(lease: dict, result: dict):
+    """Record a task's result and remove it from the pending set"""
+    task_path = Path(lease["task_path"])
+    done_path = task_path.parent.parent / "done" / task_path.name
+    _write_atomic(done_path, {**lease["task"], "result": result,
+                              "worker": lease["worker"], "finished_at": time.time()})
+    try:
+        task_path.unlink()
+    except FileNotFoundError:
+        pass
+    _drop_lease(Path(lease["lease_path"]), lease["token"])
+
+
+def drop_pending(job_id: str) -> int:
+    """
+    Remove a job's unfinished tasks, e.g. when it is cancelled. Tasks that are
+    leased right now keep running until their worker notices the cancellation.
+    """
+    tasks_dir = QUEUE_DIR / job_id / "tasks"
+    dropped = 0
+    for task_file in (tasks_dir.glob("*.json") if tasks_dir.exists() else []):
+        try:
+            task_file.unlink()
+            dropped += 1
+        except FileNotFoundError:
+            pass
+    return dropped
+
+
+def is_drained(job_id: str) -> bool:
+    """True once every task of the job has a result"""
+    tasks_dir = QUEUE_DIR / job_id / "tasks"
+    return not tasks_dir.exists() or not any(tasks_dir.glob("*.json"))
+
+
+def queue_stats(job_id: str) -> dict:
+    job_dir = QUEUE_DIR / job_id
+    count = lambda sub: len(list((job_dir / sub).glob("*.json"))) if (job_dir / sub).exists() else 0
+    return {"pending": count("tasks"), "leased": count("leases"), "done": count("done")}
@@ -0,0 +1,170 @@
+"""
+Pre-flight reachability triage for the broker catalog.
+
+Before Chromium is spent on a broker, resolve its domain and fetch its search
+URL with plain HTTP, many brokers at a time. Results are cached per domain
+in `storage/reachability.json`: TRIAGE_TTL seconds for reachable brokers,
+TRIAGE_NEGATIVE_TTL for the rest, so a blip is soon checked again.
+
+Only a domain that does not resolve, or a search page answering 404/410 on
+two checks in a row, is "unreachable": discovery skips it, marking it so
+instead of timing out on it. Timeouts, refused connections, TLS errors,
+server errors and a first 404/410 are "degraded": scanned, but last.
+
+Bot-protection answers (401/403/429/503) count as reachable: a real browser
+usually gets through where a bare HTTP client is refused.
+"""
+
+import asyncio, os, socket, threading, time
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+from urllib.parse import quote_plus, urlparse
+
+from .politeness import normalize_domain
+from .session_archive import SESSION_ARCHIVE
+from .store import STORE_DIR, load_json, save_json, store_lock
+
+REACHABILITY_JSON = STORE_DIR / "reachability.json"
+TRIAGE_TTL = float(os.getenv("TRIAGE_TTL", str(6 * 3600)))
+TRIAGE_NEGATIVE_TTL = float(os.getenv("TRIAGE_NEGATIVE_TTL", str(30 * 60)))
+TRIAGE_CONCURRENCY = int(os.getenv("TRIAGE_CONCURRENCY", "64"))
+TRIAGE_TIMEOUT = float(os.getenv("TRIAGE_TIMEOUT", "8"))
+TRIAGE_DNS_TIMEOUT = float(os.getenv("TRIAGE_DNS_TIMEOUT", "3"))
+DNS_FANOUT = 4  # lookups are cheap: run this many per HTTP check slot
+
+GONE_STATUSES = {404, 410}
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/128.0 Safari/537.36"
+
+
+def triage_url(broker: dict) -> str:
+    """The URL discovery would open for this broker, with a neutral query filled in"""
+    url = broker.get("search_url") or f"https://{broker.get('domain', '')}"
+    return url.replace("{query}", quote_plus("John Smith"))
+
+
+def load_reachability() -> Dict[str, dict]:
+    return load_json(REACHABILITY_JSON, {})
+
+
+def fresh_entry(cache: Dict[str, dict], broker: dict, ttl: Optional[float] = None) -> Optional[dict]:
+    """
+    The broker's cached triage result, or None if it was never checked or has
+    expired. Without `ttl`, results other than "ok" expire after TRIAGE_NEGATIVE_TTL.
+    """
+    entry = cache.get(normalize_domain(broker.get("domain") or triage_url(broker)))
+    if not entry:
+        return None
+    if ttl is None:
+        ttl = TRIAGE_TTL if entry.get("status") == "ok" else TRIAGE_NEGATIVE_TTL
+    if time.time() - entry.get("checked_at", 0) < ttl:
+        return entry
+    return None
+
+
+async def _resolve(host: str):
+    """
+    getaddrinfo on a throwaway daemon thread. A lookup that hangs past its
+    timeout then ties up nothing but its own thread, where in an executor it
+    would hold a worker and delay the lookups queued behind it.
+    """
+    future = Future()
+    future.set_running_or_notify_cancel()  # a running future ignores the cancel from wait_for
+    def _lookup():
+        try:
+            future.set_result(socket.getaddrinfo(host, 443, type=socket.SOCK_STREAM))
+        except Exception as e:
+            future.set_exception(e)
+    threading.Thread(target=_lookup, name="triage-dns", daemon=True).start()
+    return await asyncio.wait_for(asyncio.wrap_future(future), TRIAGE_DNS_TIMEOUT)
+
+
+async def _check(client, broker: dict, dns_limit: asyncio.Semaphore, http_limit: asyncio.Semaphore,
+                 previous: Optional[dict] = None) -> dict:
+    """One broker's result; `previous` is its last cached one, fresh or not, to confirm a 404/410"""
+    url = triage_url(broker)
+    host = urlparse(url).hostname or ""
+    started = time.perf_counter()
+    entry = {"url": url, "checked_at": time.time()}
+    try:
+        async with dns_limit:
+            await _resolve(host)
+    except asyncio.TimeoutError:
+        return {**entry, "status": "degraded", "reason": "dns_timeout", "elapsed_ms": round((time.perf_counter() - started) * 1000)}
+    except (OSError, UnicodeError):
+        return {**entry, "status": "unreachable", "reason": "dns", "elapsed_ms": round((time.perf_counter() - started) * 1000)}
+    try:
+        async with http_limit:
+            async with client.stream("GET", url) as response:
+                code = response.status_code
+        if code in GONE_STATUSES:
+            gone_before = (previous or {}).get("http_status") in GONE_STATUSES
+            status, reason = "unreachable" if gone_before else "degraded", f"http_{code}"
+        elif code >= 500 and code != 503:
+            status, reason = "degraded", f"http_{code}"
+        else:
+            status, reason = "ok", None
+        entry.update({"http_status": code, "final_url": str(response.url)})
+    except Exception as e:
+        if "Timeout" in type(e).__name__:
+            reason = "timeout"
+        elif "SSL" in str(e) or "CERTIFICATE" in str(e):
+            reason = "tls"
+        else:
+            reason = "connect"
+        status = "degraded"
+    return {**entry, "status": status, "reason": reason, "elapsed_ms": round((time.perf_counter() - started) * 1000)}
+
+
+async def _triage(brokers: List[dict], concurrency: int, previous: Optional[Dict[str, dict]] = None) -> Dict[str, dict]:
+    import httpx
+    dns_limit, http_limit = asyncio.Semaphore(concurrency * DNS_FANOUT), asyncio.Semaphore(concurrency)
+    previous = previous or {}
+    results = {}
+
+    async def _one(client, broker):
+        domain = normalize_domain(broker.get("domain") or triage_url(broker))
+        results[domain] = await _check(client, broker, dns_limit, http_limit, previous.get(domain))
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=0)
+    async with httpx.AsyncClient(timeout=TRIAGE_TIMEOUT, follow_redirects=True, limits=limits,
+                                 headers={"User-Agent": USER_AGENT}) as client:
+        await asyncio.gather(*(_one(client, b) for b in brokers))
+    return results
+
+
+def triage_brokers(brokers: List[dict], force: bool = False, concurrency: int = TRIAGE_CONCURRENCY) -> Dict[str, dict]:
+    """
+    Check every broker whose cached result is missing or expired (all of them
+    with `force`), save the results, and return the whole updated cache.
+    Replayed sessions never touch the network, so nothing is checked then.
+    """
+    if SESSION_ARCHIVE.replaying:
+        return {}
+    cache = load_reachability()
+    seen, stale = set(), []
+    for broker in brokers:
+        domain = normalize_domain(broker.get("domain") or triage_url(broker))
+        if domain and domain not in seen and (force or fresh_entry(cache, broker) is None):
+            seen.add(domain)
+            stale.append(broker)
+    if not stale:
+        return cache
+    started = time.perf_counter()
+    results = asyncio.run(_triage(stale, max(1, concurrency), cache))
+    with store_lock():
+        cache = load_reachability()
+        cache.update(results)
+        save_json(REACHABILITY_JSON, cache)
+    unreachable = sum(1 for r in results.values() if r["status"] == "unreachable")
+    degraded = sum(1 for r in results.values() if r["status"] == "degraded")
+    print(f"🩺 Triaged {len(results)} brokers in {time.perf_counter() - started:.1f}s: "
+          f"{unreachable} unreachable, {degraded} degraded")
+    return cache
+
+
+def triage_summary(cache: Dict[str, dict]) -> dict:
+    counts = {}
+    for entry in cache.values():
+        key = entry["status"] if entry["status"] == "ok" else f"{entry['status']}:{entry.get('reason')}"
+        counts[key] = counts.get(key, 0) + 1
+    return counts
@@ -0,0 +1,151 @@
+"""
+Standalone worker that drains the shared task queue.
+
+    python -m backend.app.worker [--concurrency 3] [--job JOB_ID] [--exit-when-idle]
+
+Start as many of these as the machine (or several machines sharing the
+storage directory) can take; they claim broker tasks with leases and merge
+their results into the same job records the API serves. While a task runs
+its worker polls the job record, so cancelling the job in the API aborts the
+task's browser or LLM call within a few seconds.
+"""
+
+import argparse, os, threading, time
+
+from . import item_log, task_queue
+from .engine import (
+    RATE_LIMIT_RETRIES, EMPTY_PROFILE,
+    load_profile, evidence_dir_for, discover_broker, remove_broker, is_rate_limited,
+    record_discovery_item, record_removal_item, mark_running, mark_completed, mark_cancel_released,
+)
+from .cancellation import CancelToken
+from .politeness import POLITENESS
+from .store import FINDINGS_JSON, REMOVALS_JSON, load_json, update_job
+
+JOB_FILES = {"discovery": FINDINGS_JSON, "removal": REMOVALS_JSON}
+CANCEL_POLL_SECONDS = float(os.getenv("WORKER_CANCEL_POLL", "2"))
+
+
+def _job_cancelled(lease: dict) -> bool:
+    job = lease["job"]
+    record = load_json(JOB_FILES[job["kind"]], {}).get(job["job_id"])
+    return record is None or record.get("status") == "cancelled"
+
+
+def _heartbeat(lease: dict, stop: threading.Event, lease_seconds: float, cancel: CancelToken):
+    next_renewal = time.monotonic() + lease_seconds / 3
+    while not stop.wait(min(CANCEL_POLL_SECONDS, lease_seconds / 3)):
+        if not cancel.cancelled and _job_cancelled(lease):
+            print(f"🛑 Job {lease['job']['job_id']} cancelled, aborting task {lease['task']['task_id']}")
+            cancel.cancel()
+        if time.monotonic() >= next_renewal:
+            if not task_queue.renew(lease, lease_seconds):
+                print(f"⚠️ Lost lease on task {lease['task']['task_id']} of job {lease['job']['job_id']}")
+                return
+            next_renewal = time.monotonic() + lease_seconds / 3
+
+
+def run_task(lease: dict, cancel: CancelToken = None):
+    """Execute one leased broker task and merge its result into the job record"""
+    job, task = lease["job"], lease["task"]
+    job_id, kind = job["job_id"], job["kind"]
+    path = JOB_FILES[kind]
+    broker_id, broker = task["broker_id"], task["broker"]
+    cancel = cancel or CancelToken()
+
+    record = load_json(path, {}).get(job_id)
+    if record is None or record.get("status") in ("cancelled", "error"):
+        task_queue.complete(lease, {"skipped": (record or {}).get("status", "missing")})
+        return
+
+    mark_running(path, job_id)
+    profile = load_profile(job["payload"].get("profile_id"))
+
+    if kind == "discovery":
+        def _progress(job_record):
+            job_record["current_broker"] = min(job_record.get("total_brokers") or 1, item_log.items_done(job_record) + 1)
+            job_record["current_broker_name"] = broker.get("name", "Unknown")
+        update_job(path, job_id, _progress)
+        item = discover_broker(broker_id, broker, profile or dict(EMPTY_PROFILE), str(evidence_dir_for(job_id)),
+                               cancel=cancel)
+        if cancel.cancelled:
+            _abandon(lease, path)
+            return
+        if is_rate_limited(item) and task.get("attempts", 0) < RATE_LIMIT_RETRIES:
+            task_queue.release(lease, delay=item.get("retry_after", 0))
+            return
+        record_discovery_item(job_id, item)
+    else:
+        if profile is None:
+            item = {"broker_name": broker.get("name"), "broker_id": broker_id, "method": "error",
+                    "status": "error", "transcript": "Error: Profile not found", "evidence_path": None}
+        else:
+            item = remove_broker(broker_id, broker, profile, cancel=cancel)
+        if cancel.cancelled:
+            _abandon(lease, path)
+            return
+        record_removal_item(job_id, item)
+
+    task_queue.complete(lease, item)
+    if task_queue.is_drained(job_id):
+        mark_completed(path, job_id)
+        print(f"🏁 Job {job_id} drained")
+
+
+def _abandon(lease: dict, path):
+    """Drop a task cut short by cancellation; its partial result is not recorded"""
+    task_queue.complete(lease, {"skipped": "cancelled"})
+    mark_cancel_released(path, lease["job"]["job_id"])
+
+
+def _domain_ready(task: dict) -> bool:
+    return POLITENESS.ready_in(task.get("broker", {}).get("domain", "")) <= 0
+
+
+def worker_loop(worker_id: str, job_id=None, lease_seconds: float = task_queue.LEASE_SECONDS,
+                exit_when_idle: bool = False, poll_interval: float = 2.0):
+    while True:
+        lease = task_queue.claim(worker_id, lease_seconds, job_id=job_id, ready=_domain_ready)
+        if lease is None:
+            if exit_when_idle:
+                return
+            time.sleep(poll_interval)
+            continue
+        stop, cancel = threading.Event(), CancelToken()
+        beat = threading.Thread(target=_heartbeat, args=(lease, stop, lease_seconds, cancel), daemon=True)
+        beat.start()
+        try:
+            run_task(lease, cancel)
+        except Exception as e:
+            print(f"❌ Task {lease['task']['task_id']} of job {lease['job']['job_id']} failed: {e}")
+            task_queue.release(lease, delay=poll_interval)
+        finally:
+            stop.set()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drain discovery/removal tasks from the shared queue")
+    parser.add_argument("--concurrency", type=int, default=3, help="broker tasks to run in parallel in this process")
+    parser.add_argument("--job", dest="job_id", default=None, help="only work on this job")
+    parser.add_argument("--lease", type=float, default=task_queue.LEASE_SECONDS, help="lease duration in seconds")
+    parser.add_argument("--exit-when-idle", action="store_true", help="exit once no task can be claimed")
+    args = parser.parse_args(argv)
+
+    base_id = task_queue.default_worker_id()
+    print(f"👷 Worker {base_id} draining {task_queue.QUEUE_DIR} with concurrency {args.concurrency}")
+    threads = [
+        threading.Thread(target=worker_loop, daemon=True,
+                         args=(f"{base_id}:{n}", args.job_id, args.lease, args.exit_when_idle))
+        for n in range(max(1, args.concurrency))
+    ]
+    for t in threads:
+        t.start()
+    try:
+        for t in threads:
+            t.join()
+    except KeyboardInterrupt:
+        print("👋 Worker stopping; leased tasks will be reclaimed after their leases expire")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Persistent per-broker yield index.
+
+Every finished discovery item and every piece of user feedback (verified
+positive, false positive) is folded into `storage/yield_index.json`, keyed by
+domain and accumulated across all jobs. Discovery uses it to order brokers by
+expected yield per second and, in `skip_barren` mode, to skip brokers that
+have been scanned repeatedly without ever producing a result.
+
+Updates are queued and folded in by a background flusher, one read and one
+write of the index per batch rather than per broker; reads through
+`load_index` flush first, so they always see this process's updates.
+"""
+
+import atexit, os, threading, time
+from typing import Dict, List, Tuple
+
+from .politeness import normalize_domain
+from .session_archive import SESSION_ARCHIVE
+from .store import STORE_DIR, load_json, save_json, store_lock
+
+YIELD_INDEX_JSON = STORE_DIR / "yield_index.json"
+
+# Beta prior on the per-scan hit rate: one pseudo-hit in ten pseudo-scans, so
+# unscanned brokers rank above ones that have repeatedly come up empty.
+PRIOR_HITS = 1.0
+PRIOR_SCANS = 10.0
+DEFAULT_SECONDS = 60.0  # assumed scan duration for brokers with no history
+BARREN_MIN_SCANS = 3
+FLUSH_INTERVAL = float(os.getenv("YIELD_INDEX_FLUSH_INTERVAL", "1"))
+
+COUNTERS = ("scans", "found", "verified", "false_positives", "errors", "timeouts", "rate_limited", "skipped")
+
+
+def _empty() -> dict:
+    entry = {name: 0 for name in COUNTERS}
+    entry.update({"seconds": 0.0, "timed_scans": 0, "last_scanned": None})
+    return entry
+
+
+_pending = []  # (domain, fn) updates not yet written
+_pending_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_wake = threading.Event()
+_flusher = None
+
+
+def flush():
+    """Write queued updates to the index file in one read-modify-write"""
+    with _flush_lock:
+        with _pending_lock:
+            batch = _pending[:]
+            del _pending[:]
+        if not batch:
+            return
+        with store_lock():
+            index = load_json(YIELD_INDEX_JSON, {})
+            for domain, fn in batch:
+                entry = {**_empty(), **index.get(domain, {})}
+                fn(entry)
+                index[domain] = entry
+            save_json(YIELD_INDEX_JSON, index)
+
+
+def _run_flusher():
+    while True:
+        _wake.wait(FLUSH_INTERVAL)
+        _wake.clear()
+        try:
+            flush()
+        except Exception as e:
+            print(f"⚠️ Yield index flush failed: {e}")
+
+
+def _update(domain: str, fn):
+    global _flusher
+    domain = normalize_domain(domain)
+    if not domain:
+        return
+    with _pending_lock:
+        _pending.append((domain, fn))
+        if _flusher is None:
+            _flusher = threading.Thread(target=_run_flusher, name="yield-index-flush", daemon=True)
+            _flusher.start()
+            atexit.register(flush)
+
+
+def record_scan(item: dict):
+    """Fold one finished discovery item into its broker's history"""
+    if SESSION_ARCHIVE.replaying:  # replayed scans say nothing about the broker today
+        return
+    def _apply(entry):
+        if item.get("skipped"):
+            entry["skipped"] += 1
+            return
+        entry["scans"] += 1
+        entry["found"] += 1 if item.get("found") else 0
+        error = str(item.get("error") or "")
+        timed_out = "timeout" in error.lower() or bool(item.get("query_timeouts"))
+        if error == "rate_limited":
+            entry["rate_limited"] += 1
+        elif error and not timed_out:
+            entry["errors"] += 1
+        if timed_out:
+            entry["timeouts"] += 1
+        if item.get("duration_s"):
+            entry["seconds"] += float(item["duration_s"])
+            entry["timed_scans"] += 1
+        entry["last_scanned"] = time.time()
+    _update(item.get("domain") or "", _apply)
+
+
+def record_feedback(domain: str, kind: str):
+    """kind is "verified" or "false_positives" """
+    def _apply(entry):
+        entry[kind] += 1
+    _update(domain, _apply)
+
+
+def true_hits(entry: dict) -> float:
+    return max(entry.get("verified", 0), entry.get("found", 0) - entry.get("false_positives", 0))
+
+
+def hit_rate(entry: dict) -> float:
+    """Posterior mean probability that one scan of this broker finds the person"""
+    return (true_hits(entry) + PRIOR_HITS) / (entry.get("scans", 0) + PRIOR_SCANS)
+
+
+def avg_seconds(entry: dict) -> float:
+    timed = entry.get("timed_scans", 0)
+    return entry["seconds"] / timed if timed else DEFAULT_SECONDS
+
+
+def expected_yield_per_second(entry: dict) -> float:
+    # Scans that error or time out cost their time but cannot yield anything
+    scans = entry.get("scans", 0)
+    failures = entry.get("errors", 0) + entry.get("timeouts", 0)
+    usable = 1.0 - (failures / scans if scans else 0.0)
+    return hit_rate(entry) * usable / max(avg_seconds(entry), 1.0)
+
+
+def is_barren(entry: dict, min_scans: int = BARREN_MIN_SCANS) -> bool:
+    """Scanned at least `min_scans` times and never produced a true result"""
+    return entry.get("scans", 0) >= min_scans and true_hits(entry) == 0
+
+
+def load_index() -> Dict[str, dict]:
+    flush()
+    return load_json(YIELD_INDEX_JSON, {})
+
+
+def entry_for(index: Dict[str, dict], domain: str) -> dict:
+    """A domain's entry with every counter present (zeros if never scanned)"""
+    return {**_empty(), **index.get(normalize_domain(domain or ""), {})}
+
+
+def index_report() -> List[dict]:
+    """Index entries with derived metrics, best expected yield first"""
+    rows = []
+    for domain, entry in load_index().items():
+        entry = {**_empty(), **entry}
+        rows.append({
+            "domain": domain,
+            **entry,
+            "hit_rate": round(hit_rate(entry), 4),
+            "avg_seconds": round(avg_seconds(entry), 1),
+            "expected_yield_per_s": round(expected_yield_per_second(entry), 6),
+            "barren": is_barren(entry),
+        })
+    rows.sort(key=lambda r: r["expected_yield_per_s"], reverse=True)
+    return rows
+
+
+def plan_brokers(tasks: List[Tuple[int, dict]], order: str = "catalog",
+                 skip_barren: bool = False) -> Tuple[List[Tuple[int, dict]], List[Tuple[int, dict]]]:
+    """
+    Order and prune (broker_id, broker) tasks for a discovery run.
+    Returns (to_scan, skipped). order="yield" sorts by expected yield per
+    second, keeping catalog order among ties.
+    """
+    if order != "yield" and not skip_barren:
+        return list(tasks), []
+    index = load_index()
+    broker_entry = lambda b: entry_for(index, b.get("domain"))
+    to_scan, skipped = [], []
+    for task in tasks:
+        if skip_barren and is_barren(broker_entry(task[1])):
+            skipped.append(task)
+        else:
+            to_scan.append(task)
+    if order == "yield":
+        to_scan.sort(key=lambda t: expected_yield_per_second(broker_entry(t[1])), reverse=True)
+    return to_scan, skipped
@@ -0,0 +1,68 @@
+"""
+Time from DELETE to a discovery job releasing its workers.
+
+    python -m backend.benchmarks.cancel_latency [--runs 5] [--brokers 200] [--scan-seconds 30]
+
+Runs against the ASGI app in-process with httpx. search_broker is swapped for
+a stub that blocks for --scan-seconds per broker, the way a slow results page
+does, and aborts when the job's cancel token fires, the way closing the
+browser aborts a real query. Point STORAGE_DIR at a scratch directory.
+"""
+
+import argparse, asyncio, statistics, sys, time, types
+
+
+def _install_stub_search(scan_seconds: float):
+    stub = types.ModuleType("backend.app.discovery.search_playwright")
+
+    def search_broker(broker, pii, evidence_dir="/tmp", cancel=None):
+        if cancel is not None and cancel.wait(scan_seconds):
+            return {"found": False, "confidence": 0.0, "cancelled": True}
+        if cancel is None:
+            time.sleep(scan_seconds)
+        return {"found": False, "confidence": 0.0}
+
+    stub.search_broker = search_broker
+    sys.modules[stub.__name__] = stub
+
+
+async def run(runs: int, brokers: int):
+    import httpx
+    from ..app import main
+    from ..app.store import BROKERS_JSON, save_json
+
+    save_json(BROKERS_JSON, [{"name": f"Broker {i}", "domain": f"broker{i}.example"} for i in range(brokers)])
+    latencies = []
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(runs):
+            job_id = (await client.post("/discovery", params={"profile_id": "bench", "triage": False})).json()["job_id"]
+            await asyncio.sleep(0.5)  # let the workers pick up brokers
+            t0 = time.perf_counter()
+            r = await client.delete(f"/discovery/{job_id}")
+            assert r.status_code == 200, r.text
+            while True:
+                job = (await client.get(f"/discovery/{job_id}")).json()
+                if job.get("released_at"):
+                    break
+                await asyncio.sleep(0.01)
+            observed = (time.perf_counter() - t0) * 1000
+            latencies.append(job["cancel_latency_s"] * 1000)
+            print(f"job {job_id[:8]}  cancel_latency_s={job['cancel_latency_s']:.3f}  "
+                  f"observed by poller={observed:.1f} ms  items={len(job['items'])}")
+
+    print(f"cancel latency p50={statistics.median(latencies):.1f} ms  max={max(latencies):.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--brokers", type=int, default=200)
+    parser.add_argument("--scan-seconds", type=float, default=30)
+    args = parser.parse_args(argv)
+    _install_stub_search(args.scan_seconds)
+    asyncio.run(run(args.runs, args.brokers))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Raw-HTML scoring vs visible-text extraction + region scoring.
+
+    python -m backend.benchmarks.extraction [--repeat 3]
+
+Scores a small labelled corpus of synthetic broker pages both ways and
+reports bytes scored, time per page and match accuracy (found = hits >= 2,
+the search_broker threshold). The corpus covers the known false-hit sources:
+PII only in navigation/footer chrome, in inline script JSON, or in SVG/CSS.
+"""
+
+import argparse, time
+
+from ..app.discovery.extract import extract_regions, scored_bytes
+from ..app.discovery.scoring import score_page, score_regions
+
+PII = {
+    "names": ["Jordan Avery Example"],
+    "emails": ["jordan.example@example.com"],
+    "phones": ["(555) 010-2345"],
+    "addresses": [{"city": "Springfield", "state": "IL", "zip": "62701"}],
+}
+
+FILLER = ("<div class='result-card'><h3>Person record</h3><p>Possible relatives, past addresses "
+          "and phone numbers for people in Shelbyville, IN 46176.</p></div>\n") * 400
+BUNDLE = "<script>window.__APP__=" + "{\"chunk\":\"" + "x" * 60000 + "\"};</script>\n"
+STYLE = "<style>" + ".c{color:#123456}" * 3000 + "</style>\n"
+SVG = "<svg><path d='" + "M0 0L1 1" * 5000 + "'/></svg>\n"
+
+
+def page(main: str, nav: str = "", footer: str = "", head_extra: str = "") -> str:
+    return (f"<html><head><title>Search results</title>{STYLE}{head_extra}</head><body>"
+            f"<header>People search</header><nav>Home | Search {nav}</nav>"
+            f"<main>{SVG}{main}{FILLER}</main>{BUNDLE}<footer>Privacy | Terms {footer}</footer></body></html>")
+
+
+CORPUS = [
+    # (label, html, should_match)
+    ("match in results", page("<div>Jordan Avery Example, 41, Springfield IL 62701 (555) 010-2345</div>"), True),
+    ("email in results", page("<div>Contact: jordan.example@example.com Springfield, IL</div>"), True),
+    ("name only in nav", page("", nav="Recently viewed: Jordan Avery Example"), False),
+    ("name + phone in footer", page("", footer="Featured: Jordan Avery Example (555) 010-2345"), False),
+    ("pii in script JSON", page("", head_extra="<script>var recent={\"q\":\"Jordan Avery Example\","
+                                                "\"email\":\"jordan.example@example.com\"};</script>"), False),
+    ("query echoed in hidden input", page("<input type='hidden' value='Jordan Avery Example'>"
+                                          "<div hidden>jordan.example@example.com (555) 010-2345</div>"), False),
+    ("no results", page("<p>No results found. No matches for your search, try again.</p>"), False),
+]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    url = "https://broker.example/search?q=x"
+    totals = {"raw": [0, 0.0, 0], "regions": [0, 0.0, 0], "extract_s": 0.0}
+    print(f"{'case':<30}{'raw bytes':>10}{'text bytes':>11}{'raw hits':>9}{'text hits':>10}  expected")
+    for label, html, expected in CORPUS:
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            raw = score_page(html, url, PII)
+        t1 = time.perf_counter()
+        for _ in range(args.repeat):
+            regions = extract_regions(html)
+        t2 = time.perf_counter()
+        for _ in range(args.repeat):
+            text = score_regions(regions, url, PII)
+        t3 = time.perf_counter()
+
+        totals["raw"][0] += len(html.encode("utf-8"))
+        totals["raw"][1] += (t1 - t0) / args.repeat
+        totals["raw"][2] += (raw["hits"] >= 2) == expected
+        totals["regions"][0] += scored_bytes(regions)
+        totals["regions"][1] += (t3 - t2) / args.repeat
+        totals["regions"][2] += (text["hits"] >= 2) == expected
+        totals["extract_s"] += (t2 - t1) / args.repeat
+        print(f"{label:<30}{len(html):>10}{scored_bytes(regions):>11}{raw['hits']:>9}{text['hits']:>10}  {expected}")
+
+    n = len(CORPUS)
+    print()
+    print(f"raw HTML : {totals['raw'][0]:>9} bytes scored, {totals['raw'][1] / n * 1000:7.1f} ms/page scoring, "
+          f"accuracy {totals['raw'][2]}/{n}")
+    print(f"regions  : {totals['regions'][0]:>9} bytes scored, {totals['regions'][1] / n * 1000:7.1f} ms/page scoring "
+          f"(+{totals['extract_s'] / n * 1000:.1f} ms/page stdlib extraction; in-browser extraction replaces this), "
+          f"accuracy {totals['regions'][2]}/{n}")
+
+
+if __name__ == "__main__":
+    main()
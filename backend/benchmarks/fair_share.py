@@ -0,0 +1,73 @@
+"""
+Quick-scan turnaround while a full sweep is running.
+
+    python -m backend.benchmarks.fair_share [--sweep-brokers 300] [--scan-seconds 0.2]
+
+Runs against the ASGI app in-process with httpx. search_broker is swapped for
+a stub that takes --scan-seconds per broker. Starts an all_brokers sweep,
+then a quick_scan a moment later, and reports how long the quick scan took
+compared with running it on an idle pool. Point STORAGE_DIR at a scratch
+directory.
+"""
+
+import argparse, asyncio, sys, time, types
+
+
+def _install_stub_search(scan_seconds: float):
+    stub = types.ModuleType("backend.app.discovery.search_playwright")
+
+    def search_broker(broker, pii, evidence_dir="/tmp", cancel=None):
+        time.sleep(scan_seconds)
+        return {"found": False, "confidence": 0.0}
+
+    stub.search_broker = search_broker
+    sys.modules[stub.__name__] = stub
+
+
+async def _finish(client, job_id):
+    while (await client.get(f"/discovery/{job_id}")).json()["status"] not in ("completed", "cancelled"):
+        await asyncio.sleep(0.05)
+
+
+async def run(sweep_brokers: int):
+    import httpx
+    from ..app import main
+    from ..app.broker_profiles import BROKER_PROFILES
+    from ..app.store import BROKERS_JSON, save_json
+
+    quick = BROKER_PROFILES["quick_scan"]["brokers"]
+    catalog = [{"name": d, "domain": d} for d in quick]
+    catalog += [{"name": f"Broker {i}", "domain": f"broker{i}.example"} for i in range(sweep_brokers)]
+    save_json(BROKERS_JSON, catalog)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        t0 = time.perf_counter()
+        job = (await client.post("/discovery", params={"profile_id": "bench", "triage": False, "broker_profile": "quick_scan"})).json()["job_id"]
+        await _finish(client, job)
+        alone = time.perf_counter() - t0
+
+        sweep = (await client.post("/discovery", params={"profile_id": "bench", "triage": False})).json()["job_id"]
+        await asyncio.sleep(1.0)
+        t0 = time.perf_counter()
+        job = (await client.post("/discovery", params={"profile_id": "bench", "triage": False, "broker_profile": "quick_scan"})).json()["job_id"]
+        await _finish(client, job)
+        contended = time.perf_counter() - t0
+        sweep_progress = (await client.get(f"/discovery/{sweep}")).json()["progress"]
+        await client.delete(f"/discovery/{sweep}")
+
+    print(f"quick_scan alone:            {alone:6.2f} s")
+    print(f"quick_scan during a sweep:   {contended:6.2f} s  (sweep at {sweep_progress}% when it finished)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sweep-brokers", type=int, default=300)
+    parser.add_argument("--scan-seconds", type=float, default=0.2)
+    args = parser.parse_args(argv)
+    _install_stub_search(args.scan_seconds)
+    asyncio.run(run(args.sweep_brokers))
+
+
+if __name__ == "__main__":
+    main()
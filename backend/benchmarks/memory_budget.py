@@ -0,0 +1,75 @@
+"""
+Memory regression check for a full-catalog discovery scan.
+
+    python -m backend.benchmarks.memory_budget [--brokers 658] [--budget-mb 6]
+
+Runs an all_brokers scan against the ASGI app in-process, with search_broker
+swapped for a stub that returns instantly, so only the job machinery
+(items, job cache, persistence, status reads) is measured. Python
+allocations are traced with tracemalloc from just before the scan starts,
+and the script exits non-zero if the peak goes over --budget-mb. The job runs
+with memory_profile on, so its sampler's figures are printed too. Point STORAGE_DIR at a scratch
+directory.
+"""
+
+import argparse, asyncio, sys, time, tracemalloc, types
+
+
+def _install_stub_search():
+    stub = types.ModuleType("backend.app.discovery.search_playwright")
+
+    def search_broker(broker, pii, evidence_dir="/tmp", cancel=None):
+        found = hash(broker.get("domain")) % 10 == 0
+        return {"found": found, "confidence": 0.6 if found else 0.0,
+                "evidence_url": f"https://{broker.get('domain')}/results?q=" + "x" * 200 if found else "",
+                "notes": "max_hits: 0, queries_tried: 8, " + "n" * 1000, "query_timeouts": 0}
+
+    stub.search_broker = search_broker
+    sys.modules[stub.__name__] = stub
+
+
+async def run(brokers: int) -> dict:
+    import httpx
+    from ..app import main
+    from ..app.store import BROKERS_JSON, save_json
+
+    save_json(BROKERS_JSON, [{"name": f"Broker {i}", "domain": f"broker{i}.example"} for i in range(brokers)])
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get("/health")  # import and warm everything before measuring
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        job_id = (await client.post("/discovery", params={"profile_id": "bench", "triage": False,
+                                                          "memory_profile": True})).json()["job_id"]
+        while True:
+            job = (await client.get(f"/discovery/{job_id}", params={"limit": 1})).json()
+            if job["status"] in ("completed", "cancelled", "failed"):
+                break
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        main.FINDINGS.flush()
+    return {"elapsed_s": elapsed, "peak_mb": peak / 1024 / 1024, "items": job.get("total_items"),
+            "memory": job.get("memory")}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--brokers", type=int, default=658)
+    parser.add_argument("--budget-mb", type=float, default=6.0)
+    args = parser.parse_args(argv)
+    _install_stub_search()
+    result = asyncio.run(run(args.brokers))
+    print(f"{result['items']} items in {result['elapsed_s']:.1f}s, traced peak {result['peak_mb']:.2f} MB "
+          f"(budget {args.budget_mb:.1f} MB)")
+    if result["memory"]:
+        print(f"job memory sampler: {result['memory']}")
+    if result["peak_mb"] > args.budget_mb:
+        print("❌ over memory budget")
+        sys.exit(1)
+    print("✅ within memory budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Outbox delivery against a local SMTP stand-in.
+
+    python -m backend.benchmarks.outbox_send [--messages 200] [--latency-ms 20]
+
+Starts a minimal SMTP server in-process that waits --latency-ms before each
+reply, standing in for the network round trip to a real one (whose TLS and
+AUTH handshakes would make each new connection costlier still). It then
+sends the same drafts twice: once opening a connection per message, as a
+naive loop over smtplib would, and once through outbox.send_messages on one
+reused connection. The stand-in answers recipients containing "busy" with a
+451 the first time and "reject" with a 550, and drops the connection every
+--drop-every messages, so the retry and reconnect paths are exercised too.
+Point STORAGE_DIR at a scratch directory.
+"""
+
+import argparse, smtplib, socketserver, sys, threading, time
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def _reply(self, line: str):
+        time.sleep(self.server.latency)
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self._reply("220 stand-in ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip()
+            verb = command[:4].upper()
+            if verb in ("EHLO", "HELO"):
+                self._reply("250 stand-in")
+            elif verb == "MAIL":
+                self._reply("250 OK")
+            elif verb == "RCPT":
+                rcpt = command.lower()
+                with server.lock:
+                    first_busy = "busy" in rcpt and rcpt not in server.busy_seen
+                    server.busy_seen.add(rcpt)
+                if "reject" in rcpt:
+                    self._reply("550 no such user")
+                elif first_busy:
+                    self._reply("451 try again later")
+                else:
+                    self._reply("250 OK")
+            elif verb == "DATA":
+                self._reply("354 go ahead")
+                while self.rfile.readline() not in (b".\r\n", b".\n", b""):
+                    pass
+                with server.lock:
+                    server.delivered += 1
+                    drop = server.drop_every and server.delivered % server.drop_every == 0
+                if drop:
+                    return  # hang up without answering, like a server restarting
+                self._reply("250 queued")
+            elif verb == "QUIT":
+                self._reply("221 bye")
+                return
+            else:  # RSET, NOOP
+                self._reply("250 OK")
+
+
+class StandInServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency: float, drop_every: int = 0):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.latency, self.drop_every = latency, drop_every
+        self.lock = threading.Lock()
+        self.connections = self.delivered = 0
+        self.busy_seen = set()
+
+    def reset(self):
+        self.connections = self.delivered = 0
+        self.busy_seen = set()
+
+
+def _drafts(count: int):
+    from ..app import outbox
+    drafts = []
+    for i in range(count):
+        name = "busy" if i % 50 == 7 else "reject" if i % 100 == 13 else "privacy"
+        broker = {"name": f"Broker {i}", "domain": f"broker{i}.example", "email": f"{name}@broker{i}.example"}
+        drafts.append(outbox.add_draft(broker, {"emails": ["me@example.org"]}, "Data deletion request", "Please delete."))
+    return drafts
+
+
+def per_message(server: StandInServer, drafts) -> float:
+    from ..app.outbox import to_email
+    t0 = time.perf_counter()
+    for message in drafts:
+        try:
+            with smtplib.SMTP(*server.server_address, timeout=10) as smtp:
+                smtp.send_message(to_email(message))
+        except (smtplib.SMTPException, OSError):
+            pass
+    return time.perf_counter() - t0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--drop-every", type=int, default=120)
+    args = parser.parse_args(argv)
+    from ..app import outbox
+
+    server = StandInServer(args.latency_ms / 1000, args.drop_every)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    drafts = _drafts(args.messages)
+
+    naive_s = per_message(server, drafts)
+    naive_connections = server.connections
+    server.reset()
+
+    connection = outbox.SmtpConnection(host, port, starttls=False, timeout=10)
+    summary = outbox.send_messages([dict(m) for m in drafts], connection, rate=0, batch_size=0, backoff=0.01)
+    server.shutdown()
+
+    expected_failed = sum(1 for m in drafts if m["to"].startswith("reject"))
+    print(f"connection per message: {args.messages / naive_s:.0f} msg/s, {naive_connections} connections")
+    print(f"outbox, reused connection: {args.messages / summary['elapsed_s']:.0f} msg/s, "
+          f"{summary['connections']} connections, {summary['sent']} sent, {summary['failed']} failed, "
+          f"{summary['retried']} retries")
+    if summary["failed"] != expected_failed or summary["sent"] != args.messages - expected_failed:
+        print(f"❌ expected {args.messages - expected_failed} sent and {expected_failed} failed")
+        sys.exit(1)
+    print("✅ every message delivered or permanently refused")
+
+
+if __name__ == "__main__":
+    main()
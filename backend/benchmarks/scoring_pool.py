@@ -0,0 +1,104 @@
+"""
+API latency and scan throughput with page scoring in-thread vs in a process pool.
+
+    python -m backend.benchmarks.scoring_pool [--seconds 10] [--scan-threads 4] [--pool-workers 2]
+
+Simulated browser workers alternate a short network wait with scoring the
+extracted regions of a synthetic ~1.5 MB results page through
+score_regions_pooled, as search_broker does, while a client polls /health. With scoring
+in-thread the regex scans hold the GIL and API latency climbs; with the pool
+only the text is shipped and the API stays responsive.
+"""
+
+import argparse, statistics, threading, time
+
+from fastapi.testclient import TestClient
+
+from ..app.discovery import scoring
+from ..app.discovery.extract import extract_regions
+from ..app.main import app
+
+PII = {
+    "names": ["Jordan Avery Example", "Avery"],
+    "emails": ["jordan.example@example.com"],
+    "phones": ["(555) 010-2345"],
+    "addresses": [{"city": "Springfield", "state": "IL", "zip": "62701"}],
+}
+
+
+def synthetic_page(size_bytes: int = 1_500_000) -> str:
+    row = ("<div class='result-card'><h3>Person record</h3><p>Lives in Shelbyville, IL 62565. "
+           "Related people and addresses listed below, contact details available.</p></div>\n")
+    script = "<script>window.__DATA__ = {\"items\": [" + ",".join(["{\"k\": \"v\"}"] * 200) + "]};</script>\n"
+    body = []
+    while sum(len(b) for b in body) < size_bytes:
+        body.append(row * 20)
+        body.append(script)
+    body.insert(len(body) // 2, "<div class='result-card'>Jordan Avery Example, Springfield IL 62701, "
+                                "jordan.example@example.com, (555) 010-2345</div>")
+    return "<html><body><nav>menu</nav><main>" + "".join(body) + "</main><footer>privacy</footer></body></html>"
+
+
+def run(seconds: float, scan_threads: int, pool_workers: int, html: str) -> dict:
+    regions = extract_regions(html)  # what search_broker captures from the live page
+    scoring.shutdown_pool()
+    scoring.SCORING_POOL_WORKERS = pool_workers
+    if pool_workers:
+        scoring.score_regions_pooled({"main": ""}, "https://warmup.example", PII)  # spawn children up front
+
+    stop = threading.Event()
+    pages = [0]
+    pages_lock = threading.Lock()
+
+    def scan_worker():
+        while not stop.is_set():
+            time.sleep(0.05)  # navigation / network wait
+            scoring.score_regions_pooled(regions, "https://broker.example/search?q=x", PII)
+            with pages_lock:
+                pages[0] += 1
+
+    client = TestClient(app)
+    latencies = []
+
+    def api_client():
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            client.get("/health")
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    threads = [threading.Thread(target=scan_worker) for _ in range(scan_threads)]
+    threads.append(threading.Thread(target=api_client))
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    scoring.shutdown_pool()
+
+    latencies.sort()
+    return {
+        "api_p50_ms": round(statistics.median(latencies), 2),
+        "api_p99_ms": round(latencies[int(len(latencies) * 0.99) - 1], 2),
+        "api_rps": round(len(latencies) / seconds, 1),
+        "pages_per_s": round(pages[0] / seconds, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--scan-threads", type=int, default=4)
+    parser.add_argument("--pool-workers", type=int, default=2)
+    args = parser.parse_args(argv)
+
+    html = synthetic_page()
+    print(f"Synthetic page: {len(html) / 1e6:.2f} MB, {args.scan_threads} scan threads, {args.seconds:.0f}s per run")
+    for label, workers in (("pool disabled", 0), (f"pool enabled ({args.pool_workers} procs)", args.pool_workers)):
+        r = run(args.seconds, args.scan_threads, workers, html)
+        print(f"{label:<28} /health p50={r['api_p50_ms']}ms p99={r['api_p99_ms']}ms "
+              f"rps={r['api_rps']}  scored pages/s={r['pages_per_s']}")
+
+
+if __name__ == "__main__":
+    main()
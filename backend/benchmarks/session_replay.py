@@ -0,0 +1,108 @@
+"""
+Discovery throughput and verdicts, replayed from recorded broker sessions.
+
+    python -m backend.benchmarks.session_replay --profile pii.json [--catalog brokers.json]
+        [--workers 3] [--out run.json] [--baseline previous.json]
+
+Record the sessions once during a real scan (the app or `cli discover`) with
+SESSION_ARCHIVE=record. This scans every catalog broker that has a recorded
+search session, with search_broker served from SESSION_ARCHIVE_DIR and no
+network, and reports brokers per minute and each broker's verdict.
+REPLAY_TIME_SCALE sets how much of the recorded network time is kept. With
+--baseline (the --out file of an earlier run, e.g. on the previous commit)
+it prints the throughput change and every broker whose found/confidence
+differs, and exits 1 if any did. Run it with PIPELINE_LOOKAHEAD=0 and =2
+against the same archives, at REPLAY_TIME_SCALE=1, to measure what
+prefetching the next queries' pages buys (overlap_ratio is the share of
+navigation time hidden behind other work). A replay neither paces requests
+nor reads or writes domain health, the yield index or saved browser state,
+so the figures measure the code rather than the rate limiter, and live
+scheduling state is left as it was.
+"""
+
+import argparse, json, os, statistics, sys, time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+def run(brokers, pii, workers: int, evidence_dir: str) -> dict:
+    from ..app.discovery.prefetch import PIPELINE_LOOKAHEAD, add_nav_stats
+    from ..app.engine import discover_broker
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        items = list(pool.map(lambda task: discover_broker(task[0], task[1], pii, evidence_dir), brokers))
+    wall_s = time.perf_counter() - t0
+    durations = [item["duration_s"] for item in items if "duration_s" in item]
+    navigation = {}
+    for item in items:
+        navigation = add_nav_stats(navigation, item.get("navigation", {}))
+    return {
+        "brokers": len(items),
+        "workers": workers,
+        "wall_s": round(wall_s, 2),
+        "brokers_per_min": round(len(items) / wall_s * 60, 1) if wall_s else 0.0,
+        "broker_p50_s": statistics.median(durations) if durations else 0.0,
+        "lookahead": PIPELINE_LOOKAHEAD,
+        "overlap_ratio": navigation.get("overlap_ratio", 0.0),
+        "navigation": navigation,
+        "found": sum(1 for item in items if item["found"]),
+        "errors": sum(1 for item in items if item.get("error")),
+        "verdicts": {item["domain"]: {"found": item["found"], "confidence": item["confidence"],
+                                      **({"error": item["error"]} if item.get("error") else {})}
+                     for item in items},
+    }
+
+
+def compare(baseline: dict, current: dict) -> list:
+    change = (current["brokers_per_min"] / baseline["brokers_per_min"] - 1) * 100 if baseline["brokers_per_min"] else 0.0
+    print(f"throughput: {baseline['brokers_per_min']} -> {current['brokers_per_min']} brokers/min ({change:+.1f}%), "
+          f"overlap {baseline.get('overlap_ratio', 0.0):.0%} -> {current['overlap_ratio']:.0%}")
+    changed = []
+    for domain in sorted(set(baseline["verdicts"]) | set(current["verdicts"])):
+        before, after = baseline["verdicts"].get(domain), current["verdicts"].get(domain)
+        if before != after:
+            changed.append(domain)
+            print(f"  {domain}: {before} -> {after}")
+    return changed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--profile", required=True, help="PII profile JSON file the sessions were recorded with")
+    parser.add_argument("--profile-id", help="profile to use when the file holds a list")
+    parser.add_argument("--catalog", help="broker catalog (default storage/brokers.json)")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--out", help="write this run's results here")
+    parser.add_argument("--baseline", help="results of an earlier run to compare with")
+    args = parser.parse_args(argv)
+    os.environ["SESSION_ARCHIVE"] = "replay"
+    from ..app.cli import load_catalog, load_pii
+    from ..app.politeness import normalize_domain
+    from ..app.session_archive import SESSION_ARCHIVE
+    from ..app.store import BROKERS_JSON, STORE_DIR
+
+    catalog = load_catalog(Path(args.catalog or BROKERS_JSON))
+    pii = load_pii(Path(args.profile), args.profile_id)
+    brokers = [(i, b) for i, b in enumerate(catalog)
+               if SESSION_ARCHIVE.archives(normalize_domain(b.get("domain") or b.get("search_url") or ""), "search")]
+    if not brokers:
+        print(f"❌ no recorded search sessions for this catalog in {SESSION_ARCHIVE.root}")
+        sys.exit(2)
+    print(f"🔁 Replaying {len(brokers)} of {len(catalog)} brokers with {args.workers} workers", file=sys.stderr)
+    result = run(brokers, pii, args.workers, str(STORE_DIR / "evidence" / "replay"))
+    print(f"{result['brokers']} brokers in {result['wall_s']} s: {result['brokers_per_min']} brokers/min, "
+          f"p50 {result['broker_p50_s']} s per broker, lookahead {result['lookahead']}, "
+          f"overlap {result['overlap_ratio']:.0%}, {result['found']} found, {result['errors']} errors")
+    if args.out:
+        Path(args.out).write_text(json.dumps(result, indent=2))
+    if args.baseline:
+        changed = compare(json.loads(Path(args.baseline).read_text()), result)
+        if changed:
+            print(f"❌ {len(changed)} verdicts changed")
+            sys.exit(1)
+        print("✅ verdicts unchanged")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Status-polling latency while several discovery scans run.
+
+    python -m backend.benchmarks.status_polling [--scans 4] [--brokers 150] [--pollers 50] [--seconds 10]
+
+Runs against the ASGI app in-process with httpx. Scans are simulated:
+search_broker is swapped for a stub that waits like a browser would and
+returns a result, so the job machinery, cache and persistence run for real
+without Chromium. Point STORAGE_DIR at a scratch directory.
+"""
+
+import argparse, asyncio, random, statistics, sys, time, types
+
+
+def _install_stub_search():
+    stub = types.ModuleType("backend.app.discovery.search_playwright")
+
+    def search_broker(broker, pii, evidence_dir="/tmp", cancel=None):
+        time.sleep(random.uniform(0.02, 0.08))
+        return {"found": random.random() < 0.1, "confidence": 0.6}
+
+    stub.search_broker = search_broker
+    sys.modules[stub.__name__] = stub
+
+
+def _pct(values, q):
+    values = sorted(values)
+    return values[max(0, int(len(values) * q) - 1)]
+
+
+async def run(scans: int, brokers: int, pollers: int, seconds: float):
+    import httpx
+    from ..app import main
+    from ..app.store import BROKERS_JSON, save_json
+
+    save_json(BROKERS_JSON, [{"name": f"Broker {i}", "domain": f"broker{i}.example"} for i in range(brokers)])
+    latencies = {"status": [], "health": []}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        job_ids = [(await client.post("/discovery", params={"profile_id": "bench", "triage": False})).json()["job_id"] for _ in range(scans)]
+        deadline = time.perf_counter() + seconds
+
+        async def poller(n):
+            etag = None
+            while time.perf_counter() < deadline:
+                path = "/health" if n % 10 == 0 else f"/discovery/{random.choice(job_ids)}"
+                headers = {"If-None-Match": etag} if etag and n % 2 else {}
+                t0 = time.perf_counter()
+                r = await client.get(path, headers=headers)
+                latencies["health" if path == "/health" else "status"].append((time.perf_counter() - t0) * 1000)
+                etag = r.headers.get("etag")
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(poller(n) for n in range(pollers)))
+        done = [(await client.get(f"/discovery/{j}")).json()["progress"] for j in job_ids]
+
+    for name, values in latencies.items():
+        print(f"{name:<7} n={len(values):>6}  p50={statistics.median(values):6.2f} ms  "
+              f"p99={_pct(values, 0.99):7.2f} ms  max={max(values):7.2f} ms")
+    print(f"scan progress after {seconds:.0f}s: {done}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scans", type=int, default=4)
+    parser.add_argument("--brokers", type=int, default=150)
+    parser.add_argument("--pollers", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args(argv)
+    _install_stub_search()
+    asyncio.run(run(args.scans, args.brokers, args.pollers, args.seconds))
+
+
+if __name__ == "__main__":
+    main()
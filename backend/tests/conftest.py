@@ -0,0 +1,10 @@
+"""
+Run from the repository root with `python -m pytest backend/tests`.
+
+The app reads STORAGE_DIR when it is first imported, so point it at a
+scratch directory before any test module imports it.
+"""
+
+import os, tempfile
+
+os.environ.setdefault("STORAGE_DIR", tempfile.mkdtemp(prefix="pdr-tests-"))
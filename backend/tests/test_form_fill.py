@@ -0,0 +1,15 @@
+from backend.app.removal.form_fill import fill_values, format_address
+
+
+def test_address_is_filled_as_one_line():
+    pii = {"names": ["Jane Q Doe"], "addresses": [{"street": "1 Main St", "city": "Springfield", "state": "IL",
+                                                   "zip": "62701", "country": "US"}]}
+    values = fill_values(pii)
+    assert values["address"] == "1 Main St, Springfield, IL 62701"
+    assert (values["first_name"], values["last_name"]) == ("Jane", "Doe")
+
+
+def test_partial_and_missing_addresses():
+    assert format_address({"city": "Springfield", "postal": "62701"}) == "Springfield, 62701"
+    assert format_address("1 Main St") == "1 Main St"
+    assert fill_values({})["address"] == ""
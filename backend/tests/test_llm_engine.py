@@ -0,0 +1,19 @@
+import threading, time
+
+from backend.app import llm_engine
+from backend.app.cancellation import CancelToken
+
+
+def test_cancel_stops_waiting_for_openai(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    release = threading.Event()
+    monkeypatch.setattr(llm_engine, "_post_openai", lambda *args: release.wait(5) and "late")
+    token = CancelToken()
+    threading.Timer(0.1, token.cancel).start()
+    started = time.monotonic()
+    try:
+        out = llm_engine.run_openai("prompt", cancel=token)
+    finally:
+        release.set()
+    assert time.monotonic() - started < 2
+    assert llm_engine.llm_failed(out)
@@ -0,0 +1,55 @@
+"""
+The in-process scan from benchmarks/memory_budget.py, at a size that runs in
+a second, plus a check that status reads don't do disk I/O on the event loop.
+"""
+
+import asyncio, threading
+
+import httpx
+import pytest
+
+from backend.benchmarks import memory_budget
+
+BROKERS = 300
+BUDGET_MB = 6.0
+
+
+@pytest.fixture(scope="module")
+def scan():
+    memory_budget._install_stub_search()
+    return asyncio.run(memory_budget.run(BROKERS))
+
+
+def test_full_scan_stays_within_memory_budget(scan):
+    assert scan["items"] == BROKERS
+    assert scan["peak_mb"] < BUDGET_MB
+
+
+def test_status_reads_load_items_off_the_event_loop(scan, monkeypatch):
+    from backend.app import item_log, main
+    from backend.app.store import REMOVALS_JSON
+
+    job_id = next(iter(main.FINDINGS.all()))
+    main.REMOVALS.create("removal-read", {"status": "completed", "profile_id": "bench", "items_done": 0})
+    item_log.append(REMOVALS_JSON, "removal-read", {"broker_id": 0, "status": "drafted"})
+
+    threads = []
+    real = item_log.iter_job_items_json
+
+    def _recording(*args):
+        for chunk in real(*args):
+            threads.append(threading.current_thread())
+            yield chunk
+
+    monkeypatch.setattr(item_log, "iter_job_items_json", _recording)
+
+    async def _read():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+            found = await client.get(f"/discovery/{job_id}")
+            removal = await client.get("/removals/removal-read")
+        return threading.current_thread(), found, removal
+
+    loop_thread, found, removal = asyncio.run(_read())
+    assert len(found.json()["items"]) == BROKERS
+    assert removal.json()["items"] == [{"broker_id": 0, "status": "drafted"}]
+    assert len(threads) >= 2 and loop_thread not in threads
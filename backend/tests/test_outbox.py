@@ -0,0 +1,116 @@
+"""Outbox delivery against the in-process SMTP stand-in from benchmarks/outbox_send.py"""
+
+import threading, time
+
+import pytest
+
+from backend.app import outbox
+from backend.benchmarks.outbox_send import StandInServer
+
+
+@pytest.fixture
+def server():
+    server = StandInServer(latency=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _connection(server):
+    host, port = server.server_address
+    return outbox.SmtpConnection(host, port, starttls=False, timeout=5)
+
+
+def _draft(name: str, i: int = 0) -> dict:
+    broker = {"name": f"Broker {i}", "domain": f"broker{i}.example", "email": f"{name}@broker{i}.example"}
+    return outbox.add_draft(broker, {"emails": ["me@example.org"]}, "Data deletion request", "Please delete.")
+
+
+def _send(server, messages, **kwargs):
+    kwargs = {"rate": 0, "batch_size": 0, "backoff": 0.01, **kwargs}
+    return outbox.send_messages(messages, _connection(server), **kwargs)
+
+
+def test_sent_messages_are_marked_sent(server):
+    drafts = [_draft("privacy", i) for i in range(3)]
+    assert all(outbox.get_message(m["id"])["status"] == "draft" for m in drafts)
+    summary = _send(server, drafts)
+    assert (summary["sent"], summary["failed"], summary["connections"]) == (3, 0, 1)
+    for m in drafts:
+        stored = outbox.get_message(m["id"])
+        assert (stored["status"], stored["attempts"], stored["error"]) == ("sent", 1, None)
+        assert stored["sent_at"]
+
+
+def test_transient_refusal_is_retried(server):
+    message = _draft("busy")
+    summary = _send(server, [message])
+    assert (summary["sent"], summary["retried"]) == (1, 1)
+    stored = outbox.get_message(message["id"])
+    assert (stored["status"], stored["attempts"]) == ("sent", 2)
+
+
+def test_permanent_refusal_fails_without_retry(server):
+    message = _draft("reject")
+    summary = _send(server, [message])
+    assert (summary["failed"], summary["retried"]) == (1, 0)
+    stored = outbox.get_message(message["id"])
+    assert (stored["status"], stored["attempts"]) == ("failed", 1)
+    assert "550" in stored["error"]
+
+
+class _Forgetful(set):
+    def add(self, item):  # the stand-in never remembers a recipient, so it always answers 451
+        pass
+
+
+def test_transient_refusal_fails_once_retries_run_out(server):
+    server.busy_seen = _Forgetful()
+    message = _draft("busy")
+    summary = _send(server, [message], retries=2)
+    assert (summary["failed"], summary["retried"]) == (1, 2)
+    stored = outbox.get_message(message["id"])
+    assert (stored["status"], stored["attempts"]) == ("failed", 3)
+
+
+def test_dropped_connection_reconnects(server):
+    server.drop_every = 2
+    drafts = [_draft("privacy", i) for i in range(4)]
+    summary = _send(server, drafts)
+    assert summary["sent"] == 4 and summary["failed"] == 0
+    assert summary["connections"] > 1 and summary["retried"] >= 1
+
+
+def _timed_send(server, messages, **kwargs):
+    t0 = time.monotonic()
+    summary = _send(server, messages, **kwargs)
+    return summary, time.monotonic() - t0
+
+
+def test_rate_cap_spaces_sends(server):
+    summary, elapsed = _timed_send(server, [_draft("privacy", i) for i in range(5)], rate=20)
+    assert summary["sent"] == 5
+    assert elapsed >= 4 / 20  # 4 gaps of 1/20 s between 5 sends
+
+
+def test_batch_pause(server):
+    summary, elapsed = _timed_send(server, [_draft("privacy", i) for i in range(5)], batch_size=2, batch_pause=0.1)
+    assert summary["sent"] == 5
+    assert elapsed >= 2 * 0.1  # after the 2nd and 4th message
+
+
+def test_unreachable_server_raises():
+    connection = outbox.SmtpConnection("127.0.0.1", 1, starttls=False, timeout=1)
+    with pytest.raises(outbox.OutboxError):
+        outbox.send_messages([_draft("privacy")], connection, rate=0, retries=1, backoff=0.01)
+
+
+def test_failed_llm_output_is_not_queued(monkeypatch):
+    from backend.app.removal.connectors import email_generic
+
+    monkeypatch.setattr(email_generic, "smart_llm", lambda prompt, cancel=None: "[OpenAI error] read timed out")
+    before = {m["id"] for m in outbox.iter_messages()}
+    result = email_generic.EmailGeneric({"name": "Broker", "domain": "broker.example"}, {}).submit()
+    assert result["status"] == "error" and "outbox_id" not in result
+    assert {m["id"] for m in outbox.iter_messages()} == before
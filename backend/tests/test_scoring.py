@@ -0,0 +1,19 @@
+from backend.app.discovery import scoring
+from backend.app.discovery.extract import extract_regions
+
+PII = {"names": ["Jordan Avery Example"], "emails": ["jordan.example@example.com"], "phones": [], "addresses": []}
+PAGE = "<html><body><main>Search results: Jordan Avery Example, jordan.example@example.com</main></body></html>"
+
+
+def test_pool_scores_like_the_thread_in_spawned_children(monkeypatch):
+    url = "https://broker.example/search?q=jordan"
+    regions = extract_regions(PAGE)
+    expected = scoring.score_regions(regions, url, PII)
+    assert expected["hits"] > 0
+    monkeypatch.setattr(scoring, "SCORING_POOL_WORKERS", 1)
+    try:
+        assert scoring.score_regions_pooled(regions, url, PII) == expected
+        assert scoring._pool._mp_context.get_start_method() == "spawn"
+    finally:
+        scoring.shutdown_pool()
+    assert scoring._pool is None
@@ -0,0 +1,30 @@
+import json, time
+
+from backend.app import task_queue
+
+
+def _expired_lease(path, token="old"):
+    path.write_text(json.dumps({"worker": "gone", "token": token, "expires_at": time.time() - 1}))
+
+
+def test_expired_lease_is_stolen_once(tmp_path):
+    lease_path = tmp_path / "000000.json"
+    _expired_lease(lease_path)
+    token = task_queue._try_lease(lease_path, "a", 60)
+    assert token and json.loads(lease_path.read_text())["token"] == token
+    assert task_queue._try_lease(lease_path, "b", 60) is None
+    assert [p.name for p in tmp_path.iterdir()] == ["000000.json"]
+
+
+def test_late_stealer_puts_a_fresh_lease_back(tmp_path, monkeypatch):
+    """B judged the old lease expired, but A stole it first; B's rename must not take A's lease"""
+    lease_path = tmp_path / "000000.json"
+    _expired_lease(lease_path)
+    stale_view = task_queue._read(lease_path)
+    a_token = task_queue._try_lease(lease_path, "a", 60)
+    # B read the record before A's steal
+    monkeypatch.setattr(task_queue, "_read", lambda path: stale_view if path == lease_path else json.loads(path.read_text()))
+    assert task_queue._try_lease(lease_path, "b", 60) is None
+    monkeypatch.undo()
+    assert json.loads(lease_path.read_text())["token"] == a_token
+    assert [p.name for p in tmp_path.iterdir()] == ["000000.json"]
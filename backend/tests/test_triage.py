@@ -0,0 +1,53 @@
+import asyncio, time
+
+import httpx
+
+from backend.app import triage
+
+BROKER = {"domain": "people.example", "search_url": "https://people.example/search?q={query}"}
+
+
+def _check(handler, previous=None):
+    async def _run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await triage._check(client, BROKER, asyncio.Semaphore(1), asyncio.Semaphore(1), previous)
+    return asyncio.run(_run())
+
+
+def _resolves(monkeypatch):
+    async def _resolve(host):
+        return []
+    monkeypatch.setattr(triage, "_resolve", _resolve)
+
+
+def test_timeouts_and_connect_errors_are_degraded(monkeypatch):
+    _resolves(monkeypatch)
+    def _timeout(request):
+        raise httpx.ReadTimeout("slow", request=request)
+    def _refused(request):
+        raise httpx.ConnectError("refused", request=request)
+    assert _check(_timeout)["status"] == "degraded"
+    assert _check(_refused)["status"] == "degraded"
+
+
+def test_a_gone_page_is_unreachable_only_when_seen_twice(monkeypatch):
+    _resolves(monkeypatch)
+    gone = lambda request: httpx.Response(404)
+    first = _check(gone)
+    assert (first["status"], first["reason"]) == ("degraded", "http_404")
+    assert _check(gone, previous=first)["status"] == "unreachable"
+
+
+def test_dns_failure_is_unreachable(monkeypatch):
+    async def _resolve(host):
+        raise OSError("Name or service not known")
+    monkeypatch.setattr(triage, "_resolve", _resolve)
+    entry = _check(lambda request: httpx.Response(200))
+    assert (entry["status"], entry["reason"]) == ("unreachable", "dns")
+
+
+def test_negative_results_expire_sooner():
+    checked_at = time.time() - triage.TRIAGE_NEGATIVE_TTL - 1
+    domain = triage.normalize_domain(BROKER["domain"])
+    assert triage.fresh_entry({domain: {"status": "ok", "checked_at": checked_at}}, BROKER)
+    assert triage.fresh_entry({domain: {"status": "degraded", "checked_at": checked_at}}, BROKER) is None